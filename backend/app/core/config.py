@@ -9,9 +9,41 @@ class Settings(BaseSettings):
     DEBUG: bool = True
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WARM_UP_ON_STARTUP: bool = False  # create heavy clients before serving instead of on first use
     
-    # OpenAI
-    OPENAI_API_KEY: str
+    # OpenAI (checked when the LLM client is first used)
+    OPENAI_API_KEY: str = ""
+    LLM_MAX_CONCURRENCY: int = 8  # calls in flight per worker; others wait for a slot
+    LLM_BACKGROUND_RESERVED_SLOTS: int = 2  # slots bulk jobs (re-grading) leave to requests
+    LLM_MAX_RETRIES: int = 2  # on connection, rate-limit and 5xx errors
+    LLM_RETRY_BACKOFF_MS: int = 500  # doubled on each retry
+    LLM_STRUCTURED_REPAIR_REQUESTS: int = 1  # follow-up calls for missing fields or items
+    LLM_TIMEOUT_SECONDS: float = 30.0  # per upstream request to the last target of a route
+    LLM_ROUTES_PATH: str = "./llm_routes.json"  # task -> provider/model targets; built-in routes if missing
+    LLM_ROUTES_CHECK_SECONDS: float = 5.0  # how often the routes file is checked for changes
+    
+    # Hedged requests: a duplicate is sent once a call has run longer than this
+    # percentile of recent calls with the same max_tokens
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_DELAY_MS: int = 500  # never hedge sooner than this
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # latencies needed before hedging
+    LLM_HEDGE_WINDOW: int = 200  # latencies kept per max_tokens
+    LLM_HEDGE_MAX_IN_FLIGHT: int = 4  # hedges running at once per worker
+    
+    # Circuit breaker: while open, questions, scores and feedback use local fallbacks
+    LLM_BREAKER_WINDOW_SECONDS: float = 60.0
+    LLM_BREAKER_MIN_CALLS: int = 10  # calls in the window before the breaker can trip
+    LLM_BREAKER_FAILURE_RATE: float = 0.5  # share of errors and slow calls that trips it
+    LLM_BREAKER_SLOW_MS: int = 15000  # a successful call slower than this counts as failed
+    LLM_BREAKER_OPEN_SECONDS: float = 30.0  # before one probe call is let through
+    
+    # LLM token budgets (0 = unlimited); past the economy threshold questions and scores
+    # fall back to templates and heuristics and feedback is requested with fewer tokens
+    LLM_SESSION_TOKEN_BUDGET: int = 0
+    LLM_DAILY_TOKEN_BUDGET: int = 0  # per candidate per day
+    LLM_ECONOMY_THRESHOLD: float = 0.8  # fraction of a budget used before economy mode
+    LLM_ECONOMY_MAX_TOKENS: int = 600  # feedback max_tokens in economy mode
     
     # CORS
     ALLOWED_ORIGINS: List[str] = ["http://localhost:3000"]
@@ -25,6 +57,96 @@ class Settings(BaseSettings):
     COLLECTION_NAME: str = "career_twin_profiles"
     RESUME_UPLOAD_PATH: str = "./data/resumes"
     INTERVIEW_LOGS_PATH: str = "./data/interviews"
+    INTERVIEW_LOG_SEGMENT_MAX_BYTES: int = 67108864  # rotate segments at 64MB
+    INTERVIEW_LOG_BATCH_SIZE: int = 256
+    INTERVIEW_LOG_FLUSH_INTERVAL_MS: int = 200
+    INTERVIEW_LOG_QUEUE_SIZE: int = 10000
+    
+    # Write-behind queue for vector database writes
+    VECTOR_WRITE_BATCH_SIZE: int = 64
+    VECTOR_WRITE_FLUSH_INTERVAL_MS: int = 500
+    VECTOR_WRITE_QUEUE_SIZE: int = 1000  # candidates waiting to be written
+    VECTOR_WRITE_ENQUEUE_TIMEOUT_MS: int = 50  # wait for room before rejecting with 503
+    VECTOR_WRITE_MAX_ATTEMPTS: int = 5  # per candidate before the write is dropped and logged
+    VECTOR_WRITE_RETRY_BACKOFF_MS: int = 500  # doubled on each failed attempt
+    
+    # Columnar analytics export of completed sessions
+    ANALYTICS_ENABLED: bool = False
+    ANALYTICS_PATH: str = "./data/analytics"
+    ANALYTICS_FLUSH_ROWS: int = 5000
+    ANALYTICS_FLUSH_INTERVAL_SECONDS: int = 300
+    
+    # Bulk re-grading of stored interview logs (python -m app.services.regrade)
+    REGRADE_PATH: str = "./data/regrade"  # checkpoints
+    REGRADE_CONCURRENCY: int = 4  # sessions graded at once
+    REGRADE_CHECKPOINT_EVERY: int = 20  # sessions between durable checkpoints
+    # The job runs in its own process, so it is paced rather than sharing the server's slots
+    REGRADE_MAX_CALLS_PER_MINUTE: int = 120  # 0 disables the cap
+    REGRADE_RATE_LIMIT_BACKOFF_SECONDS: float = 5.0  # pause after a 429, doubled while they continue
+    REGRADE_RATE_LIMIT_BACKOFF_MAX_SECONDS: float = 300.0
+    
+    # Storage backend for profiles, sessions and feedback: "memory" or "sqlite"
+    STORAGE_BACKEND: str = "memory"
+    SQLITE_PATH: str = "./data/career_twin.db"
+    SQLITE_POOL_SIZE: int = 8
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # also bounds waits for a pooled connection; past it requests get 503
+    
+    # Hot caches in front of storage (bytes of serialized entries)
+    HOT_CACHE_PROFILE_MAX_BYTES: int = 33554432  # 32MB
+    HOT_CACHE_SESSION_MAX_BYTES: int = 67108864  # 64MB
+    HOT_CACHE_FEEDBACK_MAX_BYTES: int = 16777216  # 16MB
+    SPILL_PATH: str = "./data/spill"
+    
+    # Durable job queue for requests sent with "Prefer: respond-async"
+    JOBS_DB_PATH: str = "./data/jobs.db"
+    JOB_WORKERS_CREATE_PROFILE: int = 2  # threads per process
+    JOB_WORKERS_COMPLETE_INTERVIEW: int = 4
+    JOB_MAX_QUEUED: int = 200  # per job type; further submissions get 503
+    JOB_LEASE_SECONDS: int = 300  # a job still running after this is claimed again
+    JOB_MAX_ATTEMPTS: int = 2
+    JOB_DEDUP_SECONDS: int = 600  # identical submissions within this return the same job
+    JOB_RETENTION_SECONDS: int = 86400  # finished jobs and their results are kept this long
+    JOB_POLL_SECONDS: float = 1.0  # for jobs submitted by other processes
+    
+    # Cohort percentile sketches (one file per worker, merged on read)
+    COHORT_SKETCH_PATH: str = "./data/cohort"
+    COHORT_REFRESH_SECONDS: float = 5.0  # how often other workers' sketches are reloaded
+    COHORT_MIN_SAMPLES: int = 10  # sessions in a role before percentiles are reported
+    COHORT_PERSIST_SECONDS: float = 2.0  # how often this worker's sketches are written when changed
+    
+    # Rendered bodies of the polled read endpoints, revalidated with ETags
+    RESPONSE_CACHE_MAX_BYTES: int = 16777216  # 16MB
+    
+    # Speculative question pre-generation
+    QUESTION_PREFETCH_ENABLED: bool = False
+    QUESTION_PREFETCH_MAX_ROLES: int = 3  # roles pre-generated per profile
+    QUESTION_PREFETCH_MAX_ENTRIES: int = 500
+    QUESTION_PREFETCH_TTL_SECONDS: int = 3600
+    QUESTION_PREFETCH_DAILY_BUDGET: int = 200  # question sets (3 LLM calls each) per day
+    
+    # Adaptive follow-up prefetch
+    FOLLOW_UP_PREFETCH_MIN_CHARS: int = 80
+    FOLLOW_UP_REUSE_SIMILARITY: float = 0.75  # share of a snapshot's words a later draft must keep
+    FOLLOW_UP_MAX_PREFETCHES: int = 3  # per question
+    FOLLOW_UP_MAX_ENTRIES: int = 1000
+    FOLLOW_UP_PREFETCH_WORKERS: int = 4
+    
+    # Map-reduce feedback: per-answer critiques are computed as answers arrive
+    # and combined with the scores by one compact reduce call
+    FEEDBACK_CRITIQUE_WORKERS: int = 4
+    FEEDBACK_CRITIQUE_MAX_TOKENS: int = 250
+    FEEDBACK_CRITIQUE_CACHE_MAX_BYTES: int = 8388608  # 8MB
+    FEEDBACK_EXCERPT_CHARS: int = 400  # answer text sent to the reduce step when it has no critique
+    FEEDBACK_REDUCE_ATTEMPTS: int = 2
+    
+    # Conversational interview mode; history beyond the recent turns is folded into
+    # a rolling summary so each turn's prompt stays under the context budget
+    CONVERSATION_MAX_QUESTIONS: int = 10
+    CONVERSATION_CONTEXT_TOKENS: int = 2000  # summary + recent turns sent per turn
+    CONVERSATION_RECENT_TURNS: int = 3  # question/answer pairs always sent verbatim
+    CONVERSATION_SUMMARY_MAX_TOKENS: int = 300
+    CONVERSATION_QUESTION_MAX_TOKENS: int = 200
+    CONVERSATION_SUMMARY_WORKERS: int = 2
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,148 @@
+﻿"""Lazily created services and startup timing.
+
+Heavy clients (Chroma, OpenAI, SQLite pool) and libraries (pdfplumber,
+PyPDF2, pandas) are registered here and created on first use, or up front by
+the FastAPI lifespan warm-up when WARM_UP_ON_STARTUP is set.
+
+Report import and init time per component, failing when importing app.main
+exceeds the budget:
+
+    python -m app.core.container --warm-up --budget-ms 800
+"""
+import argparse
+import importlib
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+class LazyService:
+    """Stand-in that creates the named service the first time it is used"""
+
+    __slots__ = ("_container", "_name")
+
+    def __init__(self, container: "ServiceContainer", name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._container.get(self._name), item)
+
+    def __setattr__(self, item: str, value: Any):
+        setattr(self._container.get(self._name), item, value)
+
+    def __repr__(self) -> str:
+        state = "ready" if self._container.initialized(self._name) else "lazy"
+        return f"<LazyService {self._name} ({state})>"
+
+class ServiceContainer:
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._timings: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+        self._warming_up = False
+
+    def register(self, name: str, factory: Callable[[], Any]) -> LazyService:
+        """Register a factory and return a proxy that builds the service on first use"""
+        self._factories[name] = factory
+        return LazyService(self, name)
+
+    def register_import(self, name: str, target: str) -> LazyService:
+        """Register an object that lives in a module too heavy to import eagerly,
+        given as "package.module:attribute" (or just "package.module")"""
+        module_name, _, attribute = target.partition(":")
+
+        def factory():
+            module = importlib.import_module(module_name)
+            return getattr(module, attribute) if attribute else module
+
+        return self.register(name, factory)
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._timings[name] = {
+                    "init_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "trigger": "warm_up" if self._warming_up else "first_use"
+                }
+            return self._instances[name]
+
+    def initialized(self, name: str) -> bool:
+        return name in self._instances
+
+    def warm_up(self, names: Optional[List[str]] = None):
+        """Create services ahead of the first request"""
+        with self._lock:
+            self._warming_up = True
+            try:
+                for name in names or list(self._factories):
+                    self.get(name)
+            finally:
+                self._warming_up = False
+
+    def record(self, name: str, started: float):
+        """Record a startup step measured outside the container (e.g. module imports)"""
+        self._timings[name] = {
+            "init_ms": round((time.perf_counter() - started) * 1000, 2),
+            "trigger": "import"
+        }
+
+    def timings(self) -> Dict:
+        return {
+            "components": dict(self._timings),
+            "pending": [name for name in self._factories if name not in self._instances]
+        }
+
+services = ServiceContainer()
+
+APP_MODULES = [
+    "app.core.config",
+    "app.models.schemas",
+    "app.utils.llm_client",
+    "app.models.hot_cache",
+    "app.models.repository",
+    "app.models.interview_log",
+    "app.models.database",
+    "app.services.interview_simulator",
+    "app.services.resume_parser",
+    "app.services.evaluation_engine",
+    "app.services.feedback_generator",
+    "app.services.question_cache",
+    "app.services.follow_up_prefetcher",
+    "app.main"
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup timing report")
+    parser.add_argument("--warm-up", action="store_true", help="also time every registered service")
+    parser.add_argument("--budget-ms", type=float, help="fail if importing app.main takes longer")
+    args = parser.parse_args()
+
+    total_started = time.perf_counter()
+    print(f"{'component':40} {'ms':>10}")
+    for module in APP_MODULES:
+        started = time.perf_counter()
+        importlib.import_module(module)
+        print(f"{'import ' + module:40} {(time.perf_counter() - started) * 1000:>10.1f}")
+    import_ms = (time.perf_counter() - total_started) * 1000
+    print(f"{'total import':40} {import_ms:>10.1f}")
+
+    if args.warm_up:
+        # Run as a script this module is __main__; the app registered with the imported copy
+        from app.core.container import services as app_services
+        app_services.warm_up()
+        for name, timing in app_services.timings()["components"].items():
+            if timing["trigger"] == "warm_up":
+                print(f"{'init ' + name:40} {timing['init_ms']:>10.1f}")
+
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f"Startup budget exceeded: {import_ms:.1f}ms > {args.budget_ms:.1f}ms")
+        sys.exit(1)
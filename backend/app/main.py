@@ -1,27 +1,79 @@
-﻿from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+﻿import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, BackgroundTasks, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Match
+from typing import Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+import hashlib
 import uuid
-from datetime import datetime
+from datetime import datetime, date
 import os
 
 from app.core.config import settings
+from app.core.container import services
 from app.models.schemas import (
     ResumeData, InterviewQuestion, InterviewAnswer, 
     InterviewSession, FeedbackReport, EvaluationScore,
-    CareerTwinProfile, ProgressMetrics
+    CareerTwinProfile, ConversationState, ProgressMetrics
 )
-from app.models.database import vector_db, file_storage
-from app.services.resume_parser import resume_parser
+from app.models.database import file_storage
+from app.models.vector_writer import vector_writer, VectorQueueFull
+from app.models.repository import repository, StorageBusy
+from app.models.interview_log import interview_log
+from app.models.job_queue import job_queue, JobQueueFull
+from app.services.resume_parser import resume_parser, ResumeParseFailed
 from app.services.interview_simulator import interview_simulator
-from app.services.evaluation_engine import evaluation_engine
+from app.services.evaluation_engine import evaluation_engine, SCORING_VERSION
 from app.services.feedback_generator import feedback_generator
+from app.services.question_cache import question_cache
+from app.services.follow_up_prefetcher import follow_up_prefetcher
+from app.services.cohort_stats import cohort_stats
+from app.services.conversation import conversational_interviewer
+from app.services.interview_channel import (
+    InterviewChannel, channel_registry, CLOSE_NOT_FOUND, CLOSE_REPLACED
+)
+from app.utils.metrics import metrics, current_endpoint, current_trace, server_timing
+from app.utils.usage import track_usage
+from app.utils.serialization import FastJSONResponse, to_data
+from app.utils.http_cache import response_cache
+from app.utils.structured_output import structured_output
+from app.utils.llm_resilience import resilience_stats
+from app.utils.llm_router import llm_router
+from app.utils.roles import AVAILABLE_ROLES
+
+# pandas/pyarrow are only needed once analytics is enabled
+analytics_store = services.register_import("analytics_store", "app.services.analytics:analytics_store")
+
+services.record("app.main imports", _import_started)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.WARM_UP_ON_STARTUP:
+        warm_up = ["repository", "llm_client", "vector_db", "pdf_libraries"]
+        if settings.ANALYTICS_ENABLED:
+            warm_up.append("analytics_store")
+        await run_in_threadpool(services.warm_up, warm_up)
+    job_queue.start()
+    yield
+    job_queue.close()
+    cohort_stats.close()
+    vector_writer.close()
+    interview_log.close()
+    if services.initialized("analytics_store"):
+        analytics_store.flush()
+    if services.initialized("repository"):
+        repository.close()
 
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    description="AI-powered Career Twin - Digital Interview Simulator"
+    description="AI-powered Career Twin - Digital Interview Simulator",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS - Allow all origins
@@ -31,11 +83,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
 
-profiles_store = {}
-sessions_store = {}
-feedback_store = {}
+# Polled read endpoints: profiles and progress change, so clients revalidate every
+# time; feedback is written once per session and the role list only changes on deploy
+CACHE_REVALIDATE = "private, no-cache"
+CACHE_FEEDBACK = "private, max-age=3600"
+CACHE_ROLES = "public, max-age=86400"
+
+metrics.gauge("vector_write_queue_depth", "Profiles waiting to be written to the vector database",
+              lambda: vector_writer.stats()["queue_depth"])
+metrics.gauge("interview_log_pending", "Interview logs queued but not yet durable",
+              lambda: interview_log.stats()["pending"])
+
+def _route_template(request: Request) -> str:
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def record_timing(request: Request, call_next):
+    """Per-endpoint latency histograms; send X-Trace: 1 to get the span breakdown
+    back in a Server-Timing header"""
+    endpoint = _route_template(request)
+    endpoint_token = current_endpoint.set(endpoint)
+    trace = [] if request.headers.get("x-trace") == "1" else None
+    trace_token = current_trace.set(trace)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe("request_duration_seconds", elapsed,
+                        endpoint=endpoint, method=request.method, status=status)
+        current_endpoint.reset(endpoint_token)
+        current_trace.reset(trace_token)
+
+    if trace is not None:
+        response.headers["Server-Timing"] = server_timing(trace, elapsed)
+    return response
+
+@app.exception_handler(StorageBusy)
+async def storage_busy(request: Request, exc: StorageBusy):
+    # Sync routes run in the threadpool, so a long wait on SQLite holds a worker
+    # thread for at most the busy timeout and then sheds the request
+    return FastJSONResponse({"detail": "Storage is busy, please retry shortly"},
+                            status_code=503, headers={"Retry-After": "1"})
 
 @app.get("/")
 async def root():
@@ -45,110 +143,282 @@ async def root():
         "status": "running"
     }
 
+@app.get("/health")
+async def health():
+    """Liveness check; creates none of the heavy services"""
+    return {"status": "ok"}
+
+def create_profile_from_resume(candidate_id: str, file_path: str,
+                               target_roles: str) -> Tuple[Dict, CareerTwinProfile]:
+    """Parse a saved resume and store the profile. Returns the create response
+    and the profile."""
+    text = resume_parser.extract_text_from_pdf(file_path)
+    with track_usage(candidate_id):
+        resume_data = resume_parser.parse_with_llm(text)
+    embeddings = resume_parser.create_profile_embedding(resume_data)
+    roles_list = [r.strip() for r in target_roles.split(',')]
+    
+    profile = CareerTwinProfile(
+        candidate_id=candidate_id,
+        name=resume_data.name or "Unknown",
+        resume_data=resume_data,
+        target_roles=roles_list,
+        skill_embeddings=embeddings,
+        created_at=datetime.now(),
+        updated_at=datetime.now()
+    )
+    
+    vector_writer.add_profile(
+        candidate_id=candidate_id,
+        embeddings=embeddings,
+        metadata=_vector_metadata(profile)
+    )
+    repository.save_profile(profile)
+    
+    return {
+        "success": True,
+        "candidate_id": candidate_id,
+        "name": profile.name,
+        "skills_count": len(resume_data.skills),
+        "experience_count": len(resume_data.experience),
+        "projects_count": len(resume_data.projects),
+        "message": "Profile created successfully"
+    }, profile
+
+def _vector_metadata(profile: CareerTwinProfile) -> Dict:
+    return {
+        "name": profile.name,
+        "skills": ','.join(profile.resume_data.skills),
+        "roles": ','.join(profile.target_roles)
+    }
+
+def update_profile_from_resume(profile: CareerTwinProfile, file_path: str,
+                               target_roles: Optional[str]) -> Tuple[Dict, CareerTwinProfile]:
+    """Merge a re-uploaded resume into a stored profile (loaded with its large
+    fields). Only changed sections are re-parsed, and the embedding is recomputed
+    only when the text it is computed from changed."""
+    text = resume_parser.extract_text_from_pdf(file_path)
+    previous = profile.resume_data
+    with track_usage(profile.candidate_id):
+        # Raises ResumeParseFailed before anything is stored
+        resume_data, changed = resume_parser.update_with_llm(previous, text)
+    roles_list = [r.strip() for r in target_roles.split(',')] if target_roles else profile.target_roles
+    
+    reembedded = (
+        profile.skill_embeddings is None
+        or resume_parser.profile_text(resume_data) != resume_parser.profile_text(previous)
+    )
+    updated = profile.model_copy(update={
+        "name": resume_data.name or "Unknown",
+        "resume_data": resume_data,
+        "target_roles": roles_list,
+        "skill_embeddings": (
+            resume_parser.create_profile_embedding(resume_data) if reembedded else profile.skill_embeddings
+        ),
+        "updated_at": datetime.now()
+    })
+    
+    if reembedded or _vector_metadata(updated) != _vector_metadata(profile):
+        vector_writer.update_profile(
+            candidate_id=updated.candidate_id,
+            embeddings=updated.skill_embeddings,
+            metadata=_vector_metadata(updated)
+        )
+    repository.save_profile(updated)
+    
+    return {
+        "success": True,
+        "candidate_id": updated.candidate_id,
+        "name": updated.name,
+        "changed_sections": changed,
+        "reembedded": reembedded,
+        "skills_count": len(resume_data.skills),
+        "experience_count": len(resume_data.experience),
+        "projects_count": len(resume_data.projects),
+        "message": "Profile updated successfully" if changed or roles_list != profile.target_roles
+                   else "Profile unchanged"
+    }, updated
+
+def _respond_async(request: Request) -> bool:
+    """RFC 7240: the client asked for 202 Accepted and a job to poll"""
+    return "respond-async" in request.headers.get("prefer", "").lower()
+
+def _job_accepted(job: Dict, created: bool) -> FastJSONResponse:
+    return FastJSONResponse(
+        {
+            "success": True,
+            **job,
+            "deduplicated": not created,
+            "status_url": f"/api/jobs/{job['job_id']}",
+            "result_url": f"/api/jobs/{job['job_id']}/result"
+        },
+        status_code=202,
+        headers={"Location": f"/api/jobs/{job['job_id']}", "Retry-After": "2"}
+    )
+
 @app.post("/api/profile/create")
 async def create_profile(
+    request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     target_roles: str = Form(...)
 ):
+    """Send "Prefer: respond-async" to get 202 and a job id instead of waiting"""
     try:
         if not file.filename.endswith('.pdf'):
             raise HTTPException(400, "Only PDF files are supported")
         
-        candidate_id = str(uuid.uuid4())
         content = await file.read()
-        file_path = file_storage.save_resume(candidate_id, content, file.filename)
-        text = resume_parser.extract_text_from_pdf(file_path)
-        resume_data = resume_parser.parse_with_llm(text)
-        embeddings = resume_parser.create_profile_embedding(resume_data)
-        roles_list = [r.strip() for r in target_roles.split(',')]
         
-        profile = CareerTwinProfile(
-            candidate_id=candidate_id,
-            name=resume_data.name or "Unknown",
-            resume_data=resume_data,
-            target_roles=roles_list,
-            skill_embeddings=embeddings,
-            created_at=datetime.now(),
-            updated_at=datetime.now()
-        )
+        if _respond_async(request):
+            dedup_key = "create_profile:" + hashlib.sha256(content + target_roles.encode()).hexdigest()
+            job = await run_in_threadpool(job_queue.find_duplicate, dedup_key)
+            if job is not None:
+                return _job_accepted(job, created=False)
+            
+            candidate_id = str(uuid.uuid4())
+            file_path = await run_in_threadpool(file_storage.save_resume, candidate_id, content, file.filename)
+            job, created = await run_in_threadpool(
+                job_queue.submit,
+                "create_profile",
+                {"candidate_id": candidate_id, "file_path": file_path, "target_roles": target_roles},
+                dedup_key=dedup_key
+            )
+            return _job_accepted(job, created)
         
-        profiles_store[candidate_id] = profile
-        vector_db.add_profile(
-            candidate_id=candidate_id,
-            embeddings=embeddings,
-            metadata={
-                "name": profile.name,
-                "skills": ','.join(resume_data.skills),
-                "roles": ','.join(roles_list)
-            }
-        )
+        candidate_id = str(uuid.uuid4())
+        file_path = await run_in_threadpool(file_storage.save_resume, candidate_id, content, file.filename)
+        result, profile = await run_in_threadpool(create_profile_from_resume, candidate_id, file_path, target_roles)
         
-        return {
-            "success": True,
-            "candidate_id": candidate_id,
-            "name": profile.name,
-            "skills_count": len(resume_data.skills),
-            "experience_count": len(resume_data.experience),
-            "projects_count": len(resume_data.projects),
-            "message": "Profile created successfully"
-        }
+        if settings.QUESTION_PREFETCH_ENABLED:
+            background_tasks.add_task(
+                _prefetch_questions, candidate_id, profile.target_roles, profile.resume_data
+            )
         
+        return FastJSONResponse(result)
+        
+    except (HTTPException, StorageBusy):
+        raise
+    except (VectorQueueFull, JobQueueFull):
+        raise HTTPException(503, "Too many profiles being created, please retry shortly",
+                            headers={"Retry-After": "1"})
     except Exception as e:
         print(f"Error in create_profile: {e}")
         raise HTTPException(500, f"Error creating profile: {str(e)}")
 
+def _prefetch_questions(candidate_id: str, roles: List[str], resume_data: ResumeData):
+    with track_usage(candidate_id):
+        question_cache.prefetch(candidate_id, roles, resume_data)
+
+@app.put("/api/profile/{candidate_id}")
+async def update_profile(
+    candidate_id: str,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    target_roles: Optional[str] = Form(None)
+):
+    """Re-upload a resume for an existing profile. Sessions and history stay
+    with the candidate_id; target_roles is kept unless given."""
+    try:
+        if not file.filename.endswith('.pdf'):
+            raise HTTPException(400, "Only PDF files are supported")
+        
+        profile = await run_in_threadpool(repository.get_profile, candidate_id, include_large_fields=True)
+        if profile is None:
+            raise HTTPException(404, "Profile not found")
+        
+        content = await file.read()
+        file_path = await run_in_threadpool(file_storage.save_resume, candidate_id, content, file.filename)
+        result, updated = await run_in_threadpool(update_profile_from_resume, profile, file_path, target_roles)
+        
+        if result["changed_sections"] or updated.target_roles != profile.target_roles:
+            # Questions pre-generated from the old resume or roles no longer fit
+            question_cache.invalidate(candidate_id)
+            if settings.QUESTION_PREFETCH_ENABLED:
+                background_tasks.add_task(
+                    _prefetch_questions, candidate_id, updated.target_roles, updated.resume_data
+                )
+        
+        return FastJSONResponse(result)
+        
+    except (HTTPException, StorageBusy):
+        raise
+    except VectorQueueFull:
+        raise HTTPException(503, "Too many profiles being updated, please retry shortly",
+                            headers={"Retry-After": "1"})
+    except ResumeParseFailed:
+        raise HTTPException(503, "The resume could not be parsed right now; the profile is unchanged",
+                            headers={"Retry-After": "30"})
+    except Exception as e:
+        print(f"Error in update_profile: {e}")
+        raise HTTPException(500, f"Error updating profile: {str(e)}")
+
 @app.get("/api/profile/{candidate_id}")
-async def get_profile(candidate_id: str):
-    if candidate_id not in profiles_store:
-        raise HTTPException(404, "Profile not found")
+def get_profile(candidate_id: str, request: Request):
+    def build():
+        profile = repository.get_profile(candidate_id)
+        if profile is None:
+            raise HTTPException(404, "Profile not found")
+        
+        return {
+            "candidate_id": profile.candidate_id,
+            "name": profile.name,
+            "skills": profile.resume_data.skills,
+            "experience": profile.resume_data.experience,
+            "education": profile.resume_data.education,
+            "projects": profile.resume_data.projects,
+            "summary": profile.resume_data.summary,
+            "target_roles": profile.target_roles
+        }
     
-    profile = profiles_store[candidate_id]
-    return {
-        "candidate_id": profile.candidate_id,
-        "name": profile.name,
-        "skills": profile.resume_data.skills,
-        "experience": profile.resume_data.experience,
-        "education": profile.resume_data.education,
-        "projects": profile.resume_data.projects,
-        "summary": profile.resume_data.summary,
-        "target_roles": profile.target_roles
-    }
+    return response_cache.respond(
+        request, f"profile:{candidate_id}",
+        repository.entity_version("profile", candidate_id), build, CACHE_REVALIDATE
+    )
 
 @app.post("/api/interview/start")
-async def start_interview(
+def start_interview(
     candidate_id: str = Form(...),
     role: str = Form(...)
 ):
     try:
-        if candidate_id not in profiles_store:
+        profile = repository.get_profile(candidate_id)
+        if profile is None:
             raise HTTPException(404, "Profile not found")
         
-        profile = profiles_store[candidate_id]
-        questions = interview_simulator.generate_role_specific_questions(
-            role=role,
-            resume_data=profile.resume_data,
-            num_hr=3,
-            num_technical=4,
-            num_behavioral=3
-        )
-        
         session_id = str(uuid.uuid4())
         session = InterviewSession(
             session_id=session_id,
             candidate_id=candidate_id,
             role=role,
-            questions=questions,
+            questions=[],
             started_at=datetime.now(),
             status="in_progress"
         )
         
-        sessions_store[session_id] = session
+        questions = None
+        if settings.QUESTION_PREFETCH_ENABLED:
+            questions = question_cache.take(candidate_id, role)
         
-        return {
+        if questions is None:
+            with track_usage(candidate_id, session):
+                questions = interview_simulator.generate_role_specific_questions(
+                    role=role,
+                    resume_data=profile.resume_data,
+                    num_hr=3,
+                    num_technical=4,
+                    num_behavioral=3
+                )
+        
+        session.questions = questions
+        repository.save_session(session)
+        
+        return FastJSONResponse({
             "success": True,
             "session_id": session_id,
             "role": role,
             "total_questions": len(questions),
+            "usage": to_data(session.usage),
             "questions": [
                 {
                     "question_id": q.question_id,
@@ -158,22 +428,24 @@ async def start_interview(
                 }
                 for q in questions
             ]
-        }
+        })
         
+    except (HTTPException, StorageBusy):
+        raise
     except Exception as e:
         raise HTTPException(500, f"Error starting interview: {str(e)}")
 
 @app.post("/api/interview/answer")
-async def submit_answer(
+def submit_answer(
     session_id: str = Form(...),
     question_id: str = Form(...),
     answer: str = Form(...)
 ):
     try:
-        if session_id not in sessions_store:
+        session = repository.get_session(session_id)
+        if session is None:
             raise HTTPException(404, "Session not found")
         
-        session = sessions_store[session_id]
         question = next((q for q in session.questions if q.question_id == question_id), None)
         if not question:
             raise HTTPException(404, "Question not found")
@@ -185,33 +457,208 @@ async def submit_answer(
             category=question.category
         )
         
-        session.answers.append(answer_obj)
-        all_answered = len(session.answers) >= len(session.questions)
+        answered = repository.add_answer(session_id, answer_obj)
+        all_answered = answered >= len(session.questions)
         
-        return {
+        # The critique finishes after this request; it counts towards the daily budget only
+        with track_usage(session.candidate_id):
+            feedback_generator.schedule_critique(answer_obj, session.role)
+        
+        return FastJSONResponse({
             "success": True,
-            "answered": len(session.answers),
+            "answered": answered,
             "total": len(session.questions),
             "completed": all_answered,
             "message": "Answer submitted successfully"
-        }
+        })
         
+    except (HTTPException, StorageBusy):
+        raise
     except Exception as e:
         raise HTTPException(500, f"Error submitting answer: {str(e)}")
 
-@app.post("/api/interview/complete")
-async def complete_interview(session_id: str = Form(...)):
+@app.post("/api/interview/answer/draft")
+def submit_answer_draft(
+    session_id: str = Form(...),
+    question_id: str = Form(...),
+    partial_answer: str = Form(...)
+):
+    session = repository.get_session(session_id)
+    if session is None:
+        raise HTTPException(404, "Session not found")
+    
+    question = next((q for q in session.questions if q.question_id == question_id), None)
+    if not question:
+        raise HTTPException(404, "Question not found")
+    
+    # Prefetch calls finish after this request; they count towards the daily budget only
+    with track_usage(session.candidate_id):
+        prefetching = follow_up_prefetcher.snapshot(
+            session_id=session_id,
+            question_id=question_id,
+            question=question.question,
+            role=session.role,
+            partial_answer=partial_answer
+        )
+    
+    return FastJSONResponse({
+        "success": True,
+        "prefetching": prefetching
+    })
+
+@app.post("/api/interview/follow-up")
+def get_follow_up(
+    session_id: str = Form(...),
+    question_id: str = Form(...)
+):
     try:
-        if session_id not in sessions_store:
+        session = repository.get_session(session_id)
+        if session is None:
             raise HTTPException(404, "Session not found")
         
-        session = sessions_store[session_id]
-        profile = profiles_store[session.candidate_id]
+        if session.status == "completed":
+            raise HTTPException(400, "Interview already completed")
+        
+        existing = next((q for q in session.questions if q.parent_question_id == question_id), None)
+        answer = next((a for a in reversed(session.answers) if a.question_id == question_id), None)
+        if existing is None and not answer:
+            raise HTTPException(400, "Submit an answer before requesting a follow-up")
+        
+        total_questions = len(session.questions)
+        if existing is None:
+            with track_usage(session.candidate_id, session) as scope:
+                generated = follow_up_prefetcher.resolve(
+                    session_id,
+                    question_id,
+                    answer.question,
+                    session.role,
+                    answer.answer
+                )
+            generated.parent_question_id = question_id
+            # A concurrent request (e.g. a double click) may have stored a follow-up
+            # for this question while this one was generated; both return that one
+            existing = repository.add_question(session_id, generated, scope.usage)
+            total_questions += 1
+        
+        return FastJSONResponse({
+            "success": True,
+            "total_questions": total_questions,
+            "question": {
+                "question_id": existing.question_id,
+                "question": existing.question,
+                "category": existing.category,
+                "difficulty": existing.difficulty,
+                "parent_question_id": existing.parent_question_id
+            }
+        })
+        
+    except (HTTPException, StorageBusy):
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Error generating follow-up: {str(e)}")
+
+@app.post("/api/interview/conversation/start")
+def start_conversation(
+    candidate_id: str = Form(...),
+    role: str = Form(...)
+):
+    try:
+        profile = repository.get_profile(candidate_id)
+        if profile is None:
+            raise HTTPException(404, "Profile not found")
+        
+        session = InterviewSession(
+            session_id=str(uuid.uuid4()),
+            candidate_id=candidate_id,
+            role=role,
+            questions=[],
+            started_at=datetime.now(),
+            status="in_progress",
+            conversation=ConversationState(max_questions=settings.CONVERSATION_MAX_QUESTIONS)
+        )
+        question, turn = conversational_interviewer.next_question(session, profile.resume_data)
+        repository.save_session(session)
         
+        return FastJSONResponse({
+            "success": True,
+            "session_id": session.session_id,
+            "role": role,
+            "max_questions": session.conversation.max_questions,
+            "question": to_data(question, include=["question_id", "question", "category", "difficulty"]),
+            "turn": to_data(turn)
+        })
+        
+    except (HTTPException, StorageBusy):
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Error starting conversation: {str(e)}")
+
+@app.post("/api/interview/conversation/reply")
+def reply_conversation(
+    session_id: str = Form(...),
+    question_id: str = Form(...),
+    answer: str = Form(...)
+):
+    """Answer the latest question; returns the next one until max_questions are answered,
+    then complete the interview with /api/interview/complete"""
+    try:
+        session = repository.get_session(session_id)
+        if session is None:
+            raise HTTPException(404, "Session not found")
+        if session.conversation is None:
+            raise HTTPException(400, "Not a conversational session")
+        if session.status == "completed":
+            raise HTTPException(400, "Interview already completed")
+        
+        question = session.questions[-1]
+        if question.question_id != question_id or any(a.question_id == question_id for a in session.answers):
+            raise HTTPException(409, "Only the latest unanswered question can be answered")
+        
+        answer_obj = InterviewAnswer(
+            question_id=question_id,
+            question=question.question,
+            answer=answer,
+            category=question.category
+        )
+        answered = repository.add_answer(session_id, answer_obj)
+        session = repository.get_session(session_id)
+        with track_usage(session.candidate_id):
+            feedback_generator.schedule_critique(answer_obj, session.role)
+        done = answered >= session.conversation.max_questions
+        
+        next_question = turn = None
+        if not done:
+            profile = repository.get_profile(session.candidate_id)
+            next_question, turn = conversational_interviewer.next_question(session, profile.resume_data)
+            repository.save_session(session)
+        
+        return FastJSONResponse({
+            "success": True,
+            "answered": answered,
+            "done": done,
+            "question": to_data(next_question, include=["question_id", "question", "category", "difficulty"])
+                        if next_question else None,
+            "turn": to_data(turn) if turn else None
+        })
+        
+    except (HTTPException, StorageBusy):
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Error continuing conversation: {str(e)}")
+
+def complete_session(session: InterviewSession,
+                     scored: Optional[Dict[str, Dict[str, float]]] = None) -> Tuple[Dict, Dict]:
+    """Evaluate a session, store its feedback and log it. Returns the complete
+    response and the interview log record."""
+    session_id = session.session_id
+    profile = repository.get_profile(session.candidate_id)
+    
+    with track_usage(session.candidate_id, session):
         evaluation = evaluation_engine.evaluate_session(
             answers=session.answers,
             resume_data=profile.resume_data,
-            role=session.role
+            role=session.role,
+            scored=scored
         )
         
         feedback = feedback_generator.generate_comprehensive_feedback(
@@ -221,80 +668,231 @@ async def complete_interview(session_id: str = Form(...)):
             evaluation=evaluation,
             resume_data=profile.resume_data
         )
+    
+    session.completed_at = datetime.now()
+    session.status = "completed"
+    follow_up_prefetcher.discard_session(session_id)
+    conversational_interviewer.discard_session(session_id)
+    repository.save_session(session)
+    repository.save_feedback(session_id, feedback)
+    cohort_stats.add_evaluation(session.role, evaluation)
+    
+    session_data = {
+        "session_id": session_id,
+        "candidate_id": session.candidate_id,
+        "role": session.role,
+        "started_at": str(session.started_at),
+        "completed_at": str(session.completed_at),
+        "questions": [to_data(q) for q in session.questions],
+        "answers": [to_data(a) for a in session.answers],
+        "evaluation": to_data(evaluation),
+        "scoring_version": SCORING_VERSION,
+        "feedback": to_data(feedback),
+        "usage": to_data(session.usage),
+        "conversation": to_data(session.conversation) if session.conversation else None
+    }
+    file_storage.save_interview_log(session_id, session_data)
+    
+    return completion_response(session, profile.resume_data, evaluation, feedback), session_data
+
+def completion_response(session: InterviewSession, resume_data: ResumeData,
+                        evaluation: EvaluationScore, feedback: FeedbackReport) -> Dict:
+    """Body of /api/interview/complete for a completed session"""
+    readiness_score = evaluation_engine.calculate_role_readiness(
+        evaluation=evaluation,
+        resume_data=resume_data,
+        role=session.role
+    )
+    return {
+        "success": True,
+        "session_id": session.session_id,
+        "evaluation": to_data(evaluation, exclude={"answer_scores"}),
+        "readiness_score": readiness_score,
+        "strengths": feedback.strengths,
+        "weaknesses": feedback.weaknesses,
+        "skill_gaps": feedback.skill_gaps,
+        "recommendations": feedback.recommendations,
+        "improvement_roadmap": feedback.improvement_roadmap,
+        "usage": to_data(session.usage),
+        "cohort": cohort_stats.compare(session.role, evaluation)
+    }
+
+def stored_completion(session: InterviewSession) -> Optional[Dict]:
+    """The completion response rebuilt from the session's interview log and
+    feedback; None if they are not stored"""
+    log = file_storage.load_interview_log(session.session_id)
+    feedback = repository.get_feedback(session.session_id)
+    if not log or not log.get("evaluation") or feedback is None:
+        return None
+    profile = repository.get_profile(session.candidate_id)
+    return completion_response(session, profile.resume_data, EvaluationScore(**log["evaluation"]), feedback)
+
+@app.post("/api/interview/complete")
+def complete_interview(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    session_id: str = Form(...)
+):
+    """Send "Prefer: respond-async" to get 202 and a job id instead of waiting"""
+    try:
+        session = repository.get_session(session_id)
+        if session is None:
+            raise HTTPException(404, "Session not found")
         
-        readiness_score = evaluation_engine.calculate_role_readiness(
-            evaluation=evaluation,
-            resume_data=profile.resume_data,
-            role=session.role
-        )
+        # A retried async submission gets the job that is completing (or completed) the session
+        dedup_key = f"complete_interview:{session_id}"
+        if _respond_async(request):
+            job = job_queue.find_duplicate(dedup_key)
+            if job is not None:
+                return _job_accepted(job, created=False)
         
-        session.completed_at = datetime.now()
-        session.status = "completed"
-        feedback_store[session_id] = feedback
+        if session.status == "completed":
+            raise HTTPException(400, "Interview already completed")
         
-        session_data = {
-            "session_id": session_id,
-            "candidate_id": session.candidate_id,
-            "role": session.role,
-            "started_at": str(session.started_at),
-            "completed_at": str(session.completed_at),
-            "questions": [q.dict() for q in session.questions],
-            "answers": [a.dict() for a in session.answers],
-            "evaluation": evaluation.dict(),
-            "feedback": feedback.dict()
-        }
-        file_storage.save_interview_log(session_id, session_data)
+        if _respond_async(request):
+            job, created = job_queue.submit("complete_interview", {"session_id": session_id}, dedup_key=dedup_key)
+            return _job_accepted(job, created)
+        
+        result, session_data = complete_session(session)
+        if settings.ANALYTICS_ENABLED:
+            background_tasks.add_task(analytics_store.add_session, session_data)
+        
+        return FastJSONResponse(result)
+        
+    except (HTTPException, StorageBusy):
+        raise
+    except JobQueueFull:
+        raise HTTPException(503, "Too many interviews being completed, please retry shortly",
+                            headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(500, f"Error completing interview: {str(e)}")
+
+async def _complete_live_session(session: InterviewSession, scored: Dict[str, Dict[str, float]]) -> Dict:
+    result, session_data = await run_in_threadpool(complete_session, session, scored)
+    if settings.ANALYTICS_ENABLED:
+        await run_in_threadpool(analytics_store.add_session, session_data)
+    return result
+
+@app.websocket("/ws/interview/{session_id}")
+async def interview_socket(websocket: WebSocket, session_id: str):
+    """Answer and complete an interview over one connection; see app/services/interview_channel.py"""
+    current_endpoint.set("/ws/interview/{session_id}")
+    await websocket.accept()
+    session = await run_in_threadpool(repository.get_session, session_id)
+    if session is None:
+        await websocket.close(code=CLOSE_NOT_FOUND, reason="Session not found")
+        return
+    profile = await run_in_threadpool(repository.get_profile, session.candidate_id)
+    
+    channel = InterviewChannel(websocket, session, profile.resume_data, _complete_live_session)
+    previous = channel_registry.open(channel)
+    if previous is not None:
+        await previous.websocket.close(code=CLOSE_REPLACED, reason="Replaced by a newer connection")
+    try:
+        await channel.run()
+    finally:
+        channel_registry.close(channel)
+
+def _create_profile_job(payload: Dict) -> Dict:
+    result, profile = create_profile_from_resume(
+        payload["candidate_id"], payload["file_path"], payload["target_roles"]
+    )
+    if settings.QUESTION_PREFETCH_ENABLED:
+        _prefetch_questions(profile.candidate_id, profile.target_roles, profile.resume_data)
+    return result
+
+def _complete_interview_job(payload: Dict) -> Dict:
+    session = repository.get_session(payload["session_id"])
+    if session is None:
+        raise HTTPException(404, "Session not found")
+    if session.status == "completed":
+        # An earlier attempt completed the session but its lease ran out before
+        # the job was marked finished
+        result = stored_completion(session)
+        if result is None:
+            raise HTTPException(400, "Interview already completed")
+        return result
+    
+    result, session_data = complete_session(session)
+    if settings.ANALYTICS_ENABLED:
+        analytics_store.add_session(session_data)
+    return result
+
+job_queue.register("create_profile", _create_profile_job, settings.JOB_WORKERS_CREATE_PROFILE)
+job_queue.register("complete_interview", _complete_interview_job, settings.JOB_WORKERS_COMPLETE_INTERVIEW)
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """The job's response once it succeeded; 202 while it is queued or running,
+    and the job's own error status if it failed"""
+    job, result = job_queue.result(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    if job["status"] == "succeeded":
+        return FastJSONResponse(result)
+    if job["status"] in ("queued", "running"):
+        return FastJSONResponse(job, status_code=202, headers={"Retry-After": "2"})
+    if job["status"] == "cancelled":
+        raise HTTPException(409, "Job was cancelled")
+    raise HTTPException(job["error"]["status"], job["error"]["detail"])
+
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued job; a job that already started runs to the end"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    if job["status"] != "cancelled":
+        raise HTTPException(409, f"Job is {job['status']} and can no longer be cancelled")
+    return job
+
+@app.get("/api/feedback/{session_id}")
+def get_feedback(session_id: str, request: Request):
+    def build():
+        feedback = repository.get_feedback(session_id)
+        if feedback is None:
+            raise HTTPException(404, "Feedback not found")
+        
+        session = repository.get_session(session_id)
         
         return {
-            "success": True,
             "session_id": session_id,
-            "evaluation": {
-                "communication_clarity": evaluation.communication_clarity,
-                "technical_accuracy": evaluation.technical_accuracy,
-                "confidence_score": evaluation.confidence_score,
-                "relevance_score": evaluation.relevance_score,
-                "overall_score": evaluation.overall_score
-            },
-            "readiness_score": readiness_score,
+            "role": session.role,
+            "completed_at": str(session.completed_at),
+            "evaluation": to_data(feedback.evaluation),
             "strengths": feedback.strengths,
             "weaknesses": feedback.weaknesses,
             "skill_gaps": feedback.skill_gaps,
             "recommendations": feedback.recommendations,
             "improvement_roadmap": feedback.improvement_roadmap
         }
-        
-    except Exception as e:
-        raise HTTPException(500, f"Error completing interview: {str(e)}")
-
-@app.get("/api/feedback/{session_id}")
-async def get_feedback(session_id: str):
-    if session_id not in feedback_store:
-        raise HTTPException(404, "Feedback not found")
-    
-    feedback = feedback_store[session_id]
-    session = sessions_store[session_id]
     
-    return {
-        "session_id": session_id,
-        "role": session.role,
-        "completed_at": str(session.completed_at),
-        "evaluation": feedback.evaluation.dict(),
-        "strengths": feedback.strengths,
-        "weaknesses": feedback.weaknesses,
-        "skill_gaps": feedback.skill_gaps,
-        "recommendations": feedback.recommendations,
-        "improvement_roadmap": feedback.improvement_roadmap
-    }
+    return response_cache.respond(
+        request, f"feedback:{session_id}",
+        repository.entity_version("feedback", session_id), build, CACHE_FEEDBACK
+    )
 
 @app.get("/api/progress/{candidate_id}")
-async def get_progress(candidate_id: str):
-    if candidate_id not in profiles_store:
+def get_progress(candidate_id: str, request: Request):
+    # Other candidates' sessions move the cohort percentiles too
+    return response_cache.respond(
+        request, f"progress:{candidate_id}",
+        (repository.entity_version("progress", candidate_id), cohort_stats.generation()),
+        lambda: _build_progress(candidate_id), CACHE_REVALIDATE
+    )
+
+def _build_progress(candidate_id: str) -> dict:
+    if not repository.has_profile(candidate_id):
         raise HTTPException(404, "Profile not found")
     
-    candidate_sessions = [
-        s for s in sessions_store.values() 
-        if s.candidate_id == candidate_id and s.status == "completed"
-    ]
+    candidate_sessions = repository.list_completed_sessions(candidate_id)
     
     if not candidate_sessions:
         return {
@@ -303,10 +901,15 @@ async def get_progress(candidate_id: str):
             "message": "No completed sessions yet"
         }
     
+    feedback_by_session = repository.list_feedback(candidate_id)
     scores_by_date = []
+    latest_by_role = {}
     for session in candidate_sessions:
-        if session.session_id in feedback_store:
-            feedback = feedback_store[session.session_id]
+        if session.session_id in feedback_by_session:
+            feedback = feedback_by_session[session.session_id]
+            latest = latest_by_role.get(session.role)
+            if latest is None or session.completed_at > latest[0]:
+                latest_by_role[session.role] = (session.completed_at, feedback.evaluation)
             scores_by_date.append({
                 "date": str(session.completed_at),
                 "role": session.role,
@@ -329,22 +932,96 @@ async def get_progress(candidate_id: str):
         "total_sessions": len(candidate_sessions),
         "current_readiness_score": round(avg_current, 2),
         "session_history": scores_by_date,
-        "roles_practiced": list(set(s.role for s in candidate_sessions))
+        "roles_practiced": list(set(s.role for s in candidate_sessions)),
+        # Latest session in each role against everyone practicing that role
+        "cohort": {
+            role: cohort_stats.compare(role, evaluation)
+            for role, (_, evaluation) in latest_by_role.items()
+        }
     }
 
+@app.get("/api/usage/{candidate_id}")
+def get_usage(candidate_id: str):
+    if not repository.has_profile(candidate_id):
+        raise HTTPException(404, "Profile not found")
+    
+    today = repository.get_daily_usage(candidate_id, date.today().isoformat())
+    daily_budget = settings.LLM_DAILY_TOKEN_BUDGET
+    return FastJSONResponse({
+        "candidate_id": candidate_id,
+        "today": to_data(today),
+        "total_tokens": today.total_tokens,
+        "daily_token_budget": daily_budget or None,
+        "session_token_budget": settings.LLM_SESSION_TOKEN_BUDGET or None,
+        "economy_mode": bool(daily_budget) and today.total_tokens >= daily_budget * settings.LLM_ECONOMY_THRESHOLD
+    })
+
 @app.get("/api/roles")
-async def get_available_roles():
-    return {
-        "roles": [
-            "Software Engineer",
-            "ML Engineer",
-            "Data Analyst",
-            "Frontend Developer",
-            "Backend Developer",
-            "Full Stack Developer",
-            "DevOps Engineer",
-            "Product Manager",
-            "Data Scientist",
-            "Cloud Architect"
-        ]
-    }
+async def get_available_roles(request: Request):
+    return response_cache.respond(
+        request, "roles", 0, lambda: {"roles": AVAILABLE_ROLES}, CACHE_ROLES
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/stats/response-cache")
+async def get_response_cache_stats():
+    return response_cache.stats()
+
+@app.get("/api/stats/jobs")
+def get_job_stats():
+    return job_queue.stats()
+
+@app.get("/api/stats/interview-channels")
+async def get_interview_channel_stats():
+    return channel_registry.stats()
+
+@app.get("/api/stats/llm")
+async def get_llm_stats():
+    return resilience_stats()
+
+@app.get("/api/stats/llm-routes")
+async def get_llm_route_stats():
+    return llm_router.stats()
+
+@app.get("/api/stats/structured-output")
+async def get_structured_output_stats():
+    return structured_output.stats()
+
+@app.get("/api/stats/feedback")
+async def get_feedback_stats():
+    return feedback_generator.stats()
+
+@app.get("/api/stats/conversation")
+async def get_conversation_stats():
+    return conversational_interviewer.stats()
+
+@app.get("/api/stats/cohort")
+async def get_cohort_stats():
+    return cohort_stats.stats()
+
+@app.get("/api/stats/question-cache")
+async def get_question_cache_stats():
+    return question_cache.stats()
+
+@app.get("/api/stats/follow-up")
+async def get_follow_up_stats():
+    return follow_up_prefetcher.stats()
+
+@app.get("/api/stats/storage")
+def get_storage_stats():
+    return repository.stats()
+
+@app.get("/api/stats/startup")
+async def get_startup_stats():
+    return services.timings()
+
+@app.get("/api/stats/vector-writes")
+async def get_vector_write_stats():
+    return vector_writer.stats()
+
+@app.get("/api/stats/interview-log")
+async def get_interview_log_stats():
+    return interview_log.stats()
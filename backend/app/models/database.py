@@ -4,12 +4,16 @@ os.environ['ANONYMIZED_TELEMETRY'] = 'False'
 import json
 from datetime import datetime
 from typing import List, Dict, Optional
-import chromadb
-from chromadb.config import Settings as ChromaSettings
 from app.core.config import settings
+from app.core.container import services
+from app.models.interview_log import interview_log
+from app.utils.metrics import span
 
 class VectorDatabase:
     def __init__(self):
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        
         self.client = chromadb.PersistentClient(
             path=settings.VECTOR_DB_PATH,
             settings=ChromaSettings(
@@ -23,31 +27,45 @@ class VectorDatabase:
     
     def add_profile(self, candidate_id: str, embeddings: List[float], metadata: Dict):
         """Add candidate profile to vector database"""
-        self.collection.add(
-            ids=[candidate_id],
-            embeddings=[embeddings],
-            metadatas=[metadata]
-        )
+        with span("vector_db_add"):
+            self.collection.add(
+                ids=[candidate_id],
+                embeddings=[embeddings],
+                metadatas=[metadata]
+            )
     
     def get_profile(self, candidate_id: str):
         """Retrieve candidate profile"""
-        results = self.collection.get(ids=[candidate_id])
+        with span("vector_db_get"):
+            results = self.collection.get(ids=[candidate_id])
         return results
     
     def update_profile(self, candidate_id: str, embeddings: List[float], metadata: Dict):
         """Update existing profile"""
-        self.collection.update(
-            ids=[candidate_id],
-            embeddings=[embeddings],
-            metadatas=[metadata]
-        )
+        with span("vector_db_update"):
+            self.collection.update(
+                ids=[candidate_id],
+                embeddings=[embeddings],
+                metadatas=[metadata]
+            )
+    
+    def upsert_profiles(self, candidate_ids: List[str], embeddings: List[List[float]],
+                        metadatas: List[Dict]):
+        """Add or replace several profiles in one call"""
+        with span("vector_db_upsert", profiles=len(candidate_ids)):
+            self.collection.upsert(
+                ids=candidate_ids,
+                embeddings=embeddings,
+                metadatas=metadatas
+            )
     
     def search_similar_profiles(self, query_embeddings: List[float], n_results: int = 5):
         """Find similar candidate profiles"""
-        results = self.collection.query(
-            query_embeddings=[query_embeddings],
-            n_results=n_results
-        )
+        with span("vector_db_query"):
+            results = self.collection.query(
+                query_embeddings=[query_embeddings],
+                n_results=n_results
+            )
         return results
 
 class FileStorage:
@@ -61,23 +79,31 @@ class FileStorage:
         return filepath
     
     @staticmethod
-    def save_interview_log(session_id: str, data: Dict) -> str:
-        """Save interview session data"""
-        os.makedirs(settings.INTERVIEW_LOGS_PATH, exist_ok=True)
-        filepath = os.path.join(settings.INTERVIEW_LOGS_PATH, f"{session_id}.json")
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2, default=str)
-        return filepath
+    def save_interview_log(session_id: str, data: Dict):
+        """Queue interview session data for the segmented log writer"""
+        with span("interview_log_append"):
+            interview_log.append(session_id, data.get("candidate_id"), data)
     
     @staticmethod
     def load_interview_log(session_id: str) -> Optional[Dict]:
         """Load interview session data"""
+        data = interview_log.get(session_id)
+        if data is not None:
+            return data
+        
+        # Legacy one-file-per-session log not yet migrated
         filepath = os.path.join(settings.INTERVIEW_LOGS_PATH, f"{session_id}.json")
         if os.path.exists(filepath):
             with open(filepath, 'r') as f:
                 return json.load(f)
         return None
+    
+    @staticmethod
+    def list_interview_logs(candidate_id: str) -> List[Dict]:
+        """Load every logged session of a candidate"""
+        logs = [interview_log.get(sid) for sid in interview_log.session_ids_for_candidate(candidate_id)]
+        return [log for log in logs if log is not None]
 
 # Initialize databases
-vector_db = VectorDatabase()
+vector_db = services.register("vector_db", VectorDatabase)
 file_storage = FileStorage()
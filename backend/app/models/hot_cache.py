@@ -0,0 +1,140 @@
+﻿import os
+import re
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+class SpillStore:
+    """Compact on-disk blob store (one zlib-compressed file per key)"""
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def _filepath(self, key: str) -> str:
+        if not re.fullmatch(r"[A-Za-z0-9._-]{1,128}", key):
+            key = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.path, f"{key}.z")
+
+    def put(self, key: str, data: bytes):
+        filepath = self._filepath(key)
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(data, 6))
+        os.replace(tmp_path, filepath)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._filepath(key), 'rb') as f:
+                return zlib.decompress(f.read())
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._filepath(key))
+        except FileNotFoundError:
+            pass
+
+class HotCache:
+    """LRU cache bounded by the serialized size of its entries rather than their count.
+
+    Evicted entries are written to the optional SpillStore and loaded back lazily
+    on the next get, so a spilling cache never loses data.
+    """
+
+    def __init__(self, name: str, max_bytes: int, encode: Callable[[Any], bytes],
+                 decode: Callable[[bytes], Any], spill: Optional[SpillStore] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.encode = encode
+        self.decode = decode
+        self.spill = spill
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "spills": 0,
+            "spill_loads": 0
+        }
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, (value, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._counters["evictions"] += 1
+            if self.spill is not None:
+                self.spill.put(key, self.encode(value))
+                self._counters["spills"] += 1
+
+    def put(self, key: str, value: Any):
+        """Insert or refresh an entry; call again after mutating a cached value"""
+        encoded = self.encode(value)
+        size = len(encoded)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+
+            if size > self.max_bytes:
+                # Too large to ever stay hot; keep it only on disk
+                if self.spill is not None:
+                    self.spill.put(key, encoded)
+                    self._counters["spills"] += 1
+                return
+
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+
+            self._counters["misses"] += 1
+            if self.spill is None:
+                return None
+
+            data = self.spill.get(key)
+            if data is None:
+                return None
+
+            self._counters["spill_loads"] += 1
+            value = self.decode(data)
+            if len(data) > self.max_bytes:
+                # Like put: inserting it would evict everything else, so it stays on disk
+                return value
+            self.spill.delete(key)
+            self._entries[key] = (value, len(data))
+            self._bytes += len(data)
+            self._evict()
+            return value
+
+    def pop(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+            if self.spill is not None:
+                self.spill.delete(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                **self._counters
+            }
@@ -0,0 +1,579 @@
+﻿"""Append-only, compressed, segmented storage for completed interview logs.
+
+Each record is ``<u32 length><u32 crc32><zlib(JSON)>``. Every segment
+``seg-<writer>-<seq>.log`` has a sidecar ``.idx`` with one tab-separated line
+per record (session_id, candidate_id, offset, length, written_at_ns). The
+in-memory index built from those lines gives O(1) lookups by session_id and
+candidate_id. A later record for the same session supersedes earlier ones.
+
+Records are appended by a background writer thread that batches them and
+fsyncs the segment, then the index, once per batch. A batch that fails to
+write is cut off the segment, which is sealed, and retried in a new segment
+with a back-off; until then the logs stay readable from memory and flush()
+raises InterviewLogWriteError. Several workers can share the directory: each
+writes its own segments, and readers pick up other writers' index lines on a
+lookup miss.
+
+    python -m app.models.interview_log migrate [--delete]
+    python -m app.models.interview_log compact
+    python -m app.models.interview_log stats
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.utils.metrics import span
+from app.utils.serialization import dumps, loads
+
+HEADER = struct.Struct("<II")
+SEALED_MARKER = "#sealed\n"
+# Back-off between attempts to write a failed batch (seconds)
+RETRY_DELAY_MIN = 0.5
+RETRY_DELAY_MAX = 30.0
+
+class InterviewLogWriteError(IOError):
+    """Queued logs could not be written; they are kept in memory and retried"""
+
+class SegmentedInterviewLog:
+
+    def __init__(self, path: str, segment_max_bytes: int, batch_size: int,
+                 flush_interval: float, queue_size: int, refresh_interval: float = 1.0):
+        self.path = path
+        self.segment_max_bytes = segment_max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+
+        self._writer_id = f"{time.time_ns()}-{os.getpid()}"
+        self._segment_seq = 0
+        self._segment_file = None
+        self._index_file = None
+        self._segment_name: Optional[str] = None
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._pending: Dict[str, Dict] = {}
+        # Items of the last batch that failed to write, retried by the writer
+        self._failed: List[Tuple[str, Optional[str], Dict, Optional[int]]] = []
+        self._retry_delay = RETRY_DELAY_MIN
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+
+        # session_id -> (segment name, offset, length, written_at_ns)
+        self._by_session: Dict[str, Tuple[str, int, int, int]] = {}
+        self._by_candidate: Dict[str, Set[str]] = {}
+        self._index_offsets: Dict[str, int] = {}
+        self._last_refresh = 0.0
+        self._loaded = False
+
+        self._counters = {
+            "appended": 0,
+            "batches": 0,
+            "fsyncs": 0,
+            "rotations": 0,
+            "bytes_written": 0,
+            "write_errors": 0
+        }
+
+    # ---- index -------------------------------------------------------------
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.log")
+
+    def _index_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.idx")
+
+    def _index_entry(self, segment: str, line: str):
+        session_id, candidate_id, offset, length, written_at = line.rstrip("\n").split("\t")
+        entry = (segment, int(offset), int(length), int(written_at))
+        current = self._by_session.get(session_id)
+        if current is None or current[3] <= entry[3]:
+            self._by_session[session_id] = entry
+        self._by_candidate.setdefault(candidate_id, set()).add(session_id)
+
+    def _read_index_tail(self, segment: str):
+        index_path = self._index_path(segment)
+        offset = self._index_offsets.get(segment, 0)
+        try:
+            with open(index_path, 'r') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # partially written line; pick it up next refresh
+                    offset += len(line)
+                    if line.startswith("#"):
+                        continue
+                    self._index_entry(segment, line)
+        except FileNotFoundError:
+            self._rebuild_index(segment)
+            return
+        self._index_offsets[segment] = offset
+
+    def _rebuild_index(self, segment: str):
+        """Recreate a missing .idx by scanning its segment"""
+        lines = []
+        try:
+            for offset, length, record in self._scan_segment(segment):
+                lines.append(f"{record['session_id']}\t{record.get('candidate_id') or ''}\t"
+                             f"{offset}\t{length}\t{record.get('written_at_ns', 0)}\n")
+        except FileNotFoundError:
+            return  # removed by a concurrent compaction
+        with open(self._index_path(segment), 'w') as f:
+            f.writelines(lines)
+        self._index_offsets.pop(segment, None)
+        self._read_index_tail(segment)
+
+    def _segments(self) -> List[str]:
+        return sorted(
+            os.path.basename(p)[:-4]
+            for p in glob.glob(os.path.join(self.path, "seg-*.log"))
+        )
+
+    def refresh(self, force: bool = False):
+        """Pick up index lines written since the last refresh (including other workers')"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._loaded and now - self._last_refresh < self.refresh_interval:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            for segment in self._segments():
+                self._read_index_tail(segment)
+            self._last_refresh = now
+            self._loaded = True
+
+    def _reload(self):
+        with self._lock:
+            self._by_session.clear()
+            self._by_candidate.clear()
+            self._index_offsets.clear()
+            self.refresh(force=True)
+
+    # ---- reading -----------------------------------------------------------
+
+    @staticmethod
+    def _read_at(f, segment: str, offset: int) -> Dict:
+        f.seek(offset)
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"Truncated interview log record in {segment} at {offset}")
+        length, crc = HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            raise ValueError(f"Corrupt interview log record in {segment} at {offset}")
+        return loads(zlib.decompress(payload))
+
+    def _read_record(self, segment: str, offset: int) -> Dict:
+        with open(self._segment_path(segment), 'rb') as f:
+            return self._read_at(f, segment, offset)
+
+    def _read_indexed(self, live: Dict[str, Tuple[str, int, int, int]],
+                      segments: Optional[Set[str]] = None) -> Iterator[Dict]:
+        """Records the index points at, in segment order, opening each segment once"""
+        entries = sorted(
+            (entry[0], entry[1]) for entry in live.values()
+            if segments is None or entry[0] in segments
+        )
+        f = None
+        current = None
+        try:
+            for segment, offset in entries:
+                if segment != current:
+                    if f is not None:
+                        f.close()
+                    f = open(self._segment_path(segment), 'rb')
+                    current = segment
+                yield self._read_at(f, segment, offset)
+        finally:
+            if f is not None:
+                f.close()
+
+    def _scan_segment(self, segment: str) -> Iterator[Tuple[int, int, Dict]]:
+        """Every valid record of a segment. Past a torn or corrupt record the scan
+        resyncs on the next offset whose header, checksum and payload check out."""
+        with open(self._segment_path(segment), 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + HEADER.size <= len(data):
+            length, crc = HEADER.unpack_from(data, offset)
+            end = offset + HEADER.size + length
+            record = None
+            if length and end <= len(data):
+                payload = data[offset + HEADER.size:end]
+                if zlib.crc32(payload) == crc:
+                    try:
+                        record = loads(zlib.decompress(payload))
+                    except (zlib.error, ValueError):
+                        record = None
+            if not isinstance(record, dict) or "session_id" not in record:
+                offset += 1
+                continue
+            yield offset, length, record
+            offset = end
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Latest log for a session (including ones still queued for writing)"""
+        with self._lock:
+            if session_id in self._pending:
+                return self._pending[session_id]
+            self.refresh()
+            entry = self._by_session.get(session_id)
+
+        if entry is None:
+            return None
+
+        try:
+            return self._read_record(entry[0], entry[1])["data"]
+        except FileNotFoundError:
+            # Segment was compacted away by another process
+            self._reload()
+            entry = self._by_session.get(session_id)
+            return self._read_record(entry[0], entry[1])["data"] if entry else None
+
+    def session_ids_for_candidate(self, candidate_id: str) -> List[str]:
+        with self._lock:
+            self.refresh()
+            session_ids = set(self._by_candidate.get(candidate_id, set()))
+            session_ids.update(
+                sid for sid, data in self._pending.items()
+                if data.get("candidate_id") == candidate_id
+            )
+        return sorted(session_ids)
+
+    def iter_logs(self) -> Iterator[Dict]:
+        """Latest log of every session, in segment order"""
+        self.refresh(force=True)
+        with self._lock:
+            live = dict(self._by_session)
+        for record in self._read_indexed(live):
+            yield record["data"]
+
+    # ---- writing -----------------------------------------------------------
+
+    def _ensure_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(
+                target=self._run_writer, name="interview-log-writer", daemon=True
+            )
+            self._writer.start()
+
+    def append(self, session_id: str, candidate_id: Optional[str], data: Dict):
+        """Queue a session log for the background writer"""
+        with self._lock:
+            self._pending[session_id] = data
+            self._ensure_writer()
+        self._queue.put((session_id, candidate_id, data, None))
+
+    def _open_segment(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._segment_seq += 1
+        self._segment_name = f"seg-{self._writer_id}-{self._segment_seq:06d}"
+        self._segment_file = open(self._segment_path(self._segment_name), 'ab')
+        self._index_file = open(self._index_path(self._segment_name), 'a')
+
+    def _seal_segment(self):
+        if self._segment_file is None:
+            return
+        self._index_file.write(SEALED_MARKER)
+        self._index_file.flush()
+        os.fsync(self._index_file.fileno())
+        self._segment_file.close()
+        self._index_file.close()
+        self._segment_file = None
+        self._index_file = None
+        self._segment_name = None
+
+    def _abandon_segment(self, segment_size: int, index_size: int):
+        """Cut a failed batch off the active segment and its index, then seal it so
+        the retry goes to a new segment. If the cut fails, the segment is only
+        closed: nothing is appended after the torn record, and it stays unsealed
+        so compaction leaves it alone."""
+        name = self._segment_name
+        for f in (self._segment_file, self._index_file):
+            try:
+                f.close()  # may fail again flushing the buffer; the truncate below drops it
+            except OSError:
+                pass
+        self._segment_file = None
+        self._index_file = None
+        self._segment_name = None
+        try:
+            os.truncate(self._segment_path(name), segment_size)
+            os.truncate(self._index_path(name), index_size)
+            with open(self._index_path(name), 'a') as f:
+                f.write(SEALED_MARKER)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"Could not cut the failed batch off {name}: {e}")
+
+    def _write_batch(self, batch: List[Tuple[str, Optional[str], Dict, Optional[int]]]):
+        if self._segment_file is None:
+            self._open_segment()
+
+        index_lines = []
+        start = offset = self._segment_file.tell()
+        index_start = self._index_file.tell()
+        try:
+            offset = self._append_records(batch, index_lines, offset)
+        except Exception:
+            self._abandon_segment(start, index_start)
+            raise
+
+        with self._lock:
+            for line in index_lines:
+                self._index_entry(self._segment_name, line)
+            self._index_offsets[self._segment_name] = self._index_file.tell()
+            for session_id, _, data, _ in batch:
+                if self._pending.get(session_id) is data:
+                    del self._pending[session_id]
+            self._counters["appended"] += len(batch)
+            self._counters["batches"] += 1
+            self._counters["fsyncs"] += 2
+            self._counters["bytes_written"] += offset - start
+
+        if offset >= self.segment_max_bytes:
+            self._seal_segment()
+            with self._lock:
+                self._counters["rotations"] += 1
+
+    def _append_records(self, batch: List[Tuple[str, Optional[str], Dict, Optional[int]]],
+                        index_lines: List[str], offset: int) -> int:
+        """Write a batch to the active segment and index; returns the new end offset"""
+        for session_id, candidate_id, data, written_at in batch:
+            # Compaction keeps the original timestamp so it never supersedes newer appends
+            written_at = written_at or time.time_ns()
+            record = {
+                "session_id": session_id,
+                "candidate_id": candidate_id,
+                "written_at_ns": written_at,
+                "data": data
+            }
+            payload = zlib.compress(dumps(record), 6)
+            self._segment_file.write(HEADER.pack(len(payload), zlib.crc32(payload)))
+            self._segment_file.write(payload)
+            index_lines.append(
+                f"{session_id}\t{candidate_id or ''}\t{offset}\t{len(payload)}\t{written_at}\n"
+            )
+            offset += HEADER.size + len(payload)
+
+        # The index is only written once the data is durable, and is fsynced too so
+        # a crash cannot leave durable records that no lookup finds
+        self._segment_file.flush()
+        os.fsync(self._segment_file.fileno())
+        self._index_file.writelines(index_lines)
+        self._index_file.flush()
+        os.fsync(self._index_file.fileno())
+        return offset
+
+    def _run_writer(self):
+        while True:
+            taken = []
+            stop = False
+            try:
+                # Failed records are retried after the back-off even if nothing new arrives
+                item = self._queue.get(timeout=self._retry_delay if self._failed else None)
+                if item is None:
+                    stop = True
+                else:
+                    taken.append(item)
+            except queue.Empty:
+                pass
+
+            deadline = time.monotonic() + self.flush_interval
+            while taken and not stop and len(self._failed) + len(taken) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    next_item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if next_item is None:
+                    stop = True
+                    break
+                taken.append(next_item)
+
+            batch = self._failed + taken
+            if batch:
+                try:
+                    with span("interview_log_write", records=len(batch)):
+                        self._write_batch(batch)
+                    failed = []
+                    self._retry_delay = RETRY_DELAY_MIN
+                except Exception as e:
+                    print(f"Error writing interview log batch of {len(batch)}, retrying in "
+                          f"{self._retry_delay:.1f}s: {e}")
+                    failed = batch  # still served from _pending meanwhile
+                    with self._lock:
+                        self._counters["write_errors"] += 1
+                    if self._failed:
+                        self._retry_delay = min(self._retry_delay * 2, RETRY_DELAY_MAX)
+                # Set before task_done so flush() sees the outcome
+                with self._lock:
+                    self._failed = failed
+            for _ in range(len(taken) + (1 if stop else 0)):
+                self._queue.task_done()
+
+            if stop:
+                self._seal_segment()
+                return
+
+    def flush(self):
+        """Block until everything queued so far was written; raises
+        InterviewLogWriteError if some of it could not be"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+        with self._lock:
+            failed = [item[0] for item in self._failed]
+        if failed:
+            raise InterviewLogWriteError(
+                f"{len(failed)} interview logs could not be written yet (retrying): {', '.join(failed[:5])}"
+            )
+
+    def close(self):
+        """Flush queued logs and seal the active segment"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._writer = None
+        with self._lock:
+            failed = [item[0] for item in self._failed]
+        if failed:
+            print(f"{len(failed)} interview logs could not be written and are lost: {', '.join(failed)}")
+
+    # ---- maintenance -------------------------------------------------------
+
+    def _is_sealed(self, segment: str) -> bool:
+        try:
+            with open(self._index_path(segment), 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - len(SEALED_MARKER)))
+                return f.read().decode() == SEALED_MARKER
+        except FileNotFoundError:
+            return False
+
+    def compact(self) -> Dict:
+        """Rewrite sealed segments keeping only the latest record per session and
+        merging them into segments of up to segment_max_bytes"""
+        self.refresh(force=True)
+        sealed = [s for s in self._segments() if self._is_sealed(s) and s != self._segment_name]
+        if not sealed:
+            return {"segments_in": 0, "segments_out": 0, "records_dropped": 0}
+
+        with self._lock:
+            live = dict(self._by_session)
+
+        compactor = SegmentedInterviewLog(
+            self.path, self.segment_max_bytes, self.batch_size,
+            self.flush_interval, queue_size=1
+        )
+        compactor._writer_id = f"{time.time_ns()}-{os.getpid()}-compact"
+
+        # Records are copied by their index entries rather than by scanning, so a
+        # corrupt record cannot hide the ones after it; a record that cannot be
+        # read aborts the compaction before anything is deleted
+        kept = 0
+        batch = []
+        for record in self._read_indexed(live, set(sealed)):
+            batch.append((
+                record["session_id"], record.get("candidate_id"),
+                record["data"], record.get("written_at_ns")
+            ))
+            kept += 1
+            if len(batch) >= self.batch_size:
+                compactor._write_batch(batch)
+                batch = []
+        if batch:
+            compactor._write_batch(batch)
+        compactor._seal_segment()
+
+        indexed = 0
+        for segment in sealed:
+            with open(self._index_path(segment), 'r') as f:
+                indexed += sum(1 for line in f if not line.startswith("#"))
+        dropped = indexed - kept
+
+        for segment in sealed:
+            os.remove(self._segment_path(segment))
+            os.remove(self._index_path(segment))
+        self._reload()
+
+        return {
+            "segments_in": len(sealed),
+            "segments_out": compactor._segment_seq,
+            "records_kept": kept,
+            "records_dropped": dropped
+        }
+
+    def stats(self) -> Dict:
+        self.refresh()
+        with self._lock:
+            return {
+                "sessions": len(self._by_session),
+                "candidates": len(self._by_candidate),
+                "segments": len(self._index_offsets),
+                "pending": len(self._pending),
+                "queue_depth": self._queue.qsize(),
+                **self._counters
+            }
+
+interview_log = SegmentedInterviewLog(
+    path=settings.INTERVIEW_LOGS_PATH,
+    segment_max_bytes=settings.INTERVIEW_LOG_SEGMENT_MAX_BYTES,
+    batch_size=settings.INTERVIEW_LOG_BATCH_SIZE,
+    flush_interval=settings.INTERVIEW_LOG_FLUSH_INTERVAL_MS / 1000,
+    queue_size=settings.INTERVIEW_LOG_QUEUE_SIZE
+)
+
+def migrate_json_logs(log: SegmentedInterviewLog, delete: bool = False) -> Dict:
+    """Import legacy one-file-per-session JSON logs into the segmented log"""
+    log.refresh(force=True)
+    imported = skipped = failed = 0
+    paths = sorted(glob.glob(os.path.join(log.path, "*.json")))
+
+    for filepath in paths:
+        session_id = os.path.basename(filepath)[:-5]
+        if session_id in log._by_session:
+            skipped += 1
+            continue
+        try:
+            with open(filepath, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Skipping {filepath}: {e}")
+            failed += 1
+            continue
+        log.append(data.get("session_id", session_id), data.get("candidate_id"), data)
+        imported += 1
+
+    log.flush()
+    if delete:
+        for filepath in paths:
+            if os.path.basename(filepath)[:-5] in log._by_session:
+                os.remove(filepath)
+
+    return {"imported": imported, "skipped": skipped, "failed": failed}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interview log maintenance")
+    parser.add_argument("command", choices=["migrate", "compact", "stats"])
+    parser.add_argument("--delete", action="store_true",
+                        help="remove legacy JSON files once imported (migrate only)")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        result = migrate_json_logs(interview_log, delete=args.delete)
+    elif args.command == "compact":
+        result = interview_log.compact()
+    else:
+        result = interview_log.stats()
+
+    interview_log.close()
+    print(json.dumps(result, indent=2))
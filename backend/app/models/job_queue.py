@@ -0,0 +1,378 @@
+﻿"""Durable local job queue for the slow endpoints.
+
+Jobs are rows in a SQLite database at JOBS_DB_PATH, so queued work survives a
+restart and every worker process shares one queue. Each process runs a fixed
+number of threads per registered job type. A thread claims the oldest queued
+job of its type with a single UPDATE ... RETURNING, so two processes never run
+the same job. While a handler runs, a heartbeat thread renews the job's lease
+every third of JOB_LEASE_SECONDS, so a job whose lease ran out belonged to a
+process that died; it is claimed again, up to JOB_MAX_ATTEMPTS attempts. A
+worker whose lease was taken over does not record its outcome.
+
+A submission with the same dedup key as a queued, running or recently
+succeeded job returns that job instead of queueing another. Once
+JOB_MAX_QUEUED jobs of a type are waiting, submit raises JobQueueFull.
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.models.repository import SQLitePool
+from app.utils.metrics import metrics, current_endpoint
+from app.utils.serialization import dumps, loads
+
+JobHandler = Callable[[Dict], Dict]
+
+ACTIVE = ("queued", "running")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    dedup_key TEXT,
+    status TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    result BLOB,
+    error_status INTEGER,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (job_type, status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, created_at);
+"""
+
+_FIND_DUPLICATE = """
+SELECT * FROM jobs
+WHERE dedup_key = ? AND (status IN ('queued', 'running') OR (status = 'succeeded' AND created_at >= ?))
+ORDER BY created_at DESC LIMIT 1
+"""
+
+_EXPIRE = """
+UPDATE jobs SET status = 'failed', error_status = 500,
+    error = 'The worker running this job stopped', finished_at = :now
+WHERE job_type = :job_type AND status = 'running' AND started_at < :expired AND attempts >= :max_attempts
+"""
+
+_CLAIM = """
+UPDATE jobs SET status = 'running', started_at = :now, attempts = attempts + 1, worker = :worker
+WHERE job_id = (
+    SELECT job_id FROM jobs
+    WHERE job_type = :job_type AND (status = 'queued' OR (status = 'running' AND started_at < :expired))
+    ORDER BY created_at LIMIT 1
+)
+RETURNING job_id, payload
+"""
+
+_FINISH = """
+UPDATE jobs SET status = ?, result = ?, error_status = ?, error = ?, finished_at = ?
+WHERE job_id = ? AND worker = ? AND status = 'running'
+"""
+
+_RENEW = """
+UPDATE jobs SET started_at = ?
+WHERE job_id = ? AND worker = ? AND status = 'running'
+"""
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs of a type are waiting"""
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(value).isoformat(timespec="seconds") if value else None
+
+class JobQueue:
+
+    def __init__(self, path: str, busy_timeout_ms: int, max_queued: int, lease_seconds: float,
+                 max_attempts: int, dedup_seconds: float, retention_seconds: float, poll_interval: float):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.dedup_seconds = dedup_seconds
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+
+        self._pool: Optional[SQLitePool] = None
+        self._handlers: Dict[str, Tuple[JobHandler, int]] = {}
+        self._wakeups: Dict[str, threading.Event] = {}
+        self._threads: List[threading.Thread] = []
+        # job_id -> worker of the jobs this process is running, for the heartbeat
+        self._running: Dict[str, str] = {}
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+
+        self._counters = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "rejected": 0,
+            "cancelled": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "lease_lost": 0
+        }
+
+    @property
+    def pool(self) -> SQLitePool:
+        with self._lock:
+            if self._pool is None:
+                pool = SQLitePool(self.path, size=4, busy_timeout_ms=self.busy_timeout_ms)
+                with pool.transaction() as conn:
+                    for statement in SCHEMA.split(";"):
+                        if statement.strip():
+                            conn.execute(statement)
+                self._pool = pool
+            return self._pool
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def register(self, job_type: str, handler: JobHandler, concurrency: int):
+        """Run jobs of job_type with handler on concurrency threads per process. The
+        handler returns the JSON result; an exception with a status_code (such as
+        HTTPException) is stored with that status, any other one as a 500."""
+        self._handlers[job_type] = (handler, concurrency)
+        self._wakeups[job_type] = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for job_type, (_, concurrency) in self._handlers.items():
+                for index in range(concurrency):
+                    thread = threading.Thread(
+                        target=self._run_worker, args=(job_type,),
+                        name=f"job-{job_type}-{index}", daemon=True
+                    )
+                    thread.start()
+                    self._threads.append(thread)
+            if self._threads:
+                heartbeat = threading.Thread(target=self._run_heartbeat, name="job-heartbeat", daemon=True)
+                heartbeat.start()
+                self._threads.append(heartbeat)
+
+    # ---- submission ----------------------------------------------------------
+
+    def find_duplicate(self, dedup_key: str) -> Optional[Dict]:
+        """The active or recently succeeded job submitted with dedup_key"""
+        with self.pool.connection() as conn:
+            row = conn.execute(_FIND_DUPLICATE, (dedup_key, time.time() - self.dedup_seconds)).fetchone()
+            if row is None:
+                return None
+            self._count("deduplicated")
+            return self._job_from_row(row, conn)
+
+    def submit(self, job_type: str, payload: Dict, dedup_key: Optional[str] = None) -> Tuple[Dict, bool]:
+        """Queue a job; returns (job, created). created is False when an identical
+        submission is queued, running or recently succeeded. Raises JobQueueFull."""
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type {job_type}")
+        now = time.time()
+        with self.pool.transaction() as conn:
+            if dedup_key is not None:
+                row = conn.execute(_FIND_DUPLICATE, (dedup_key, now - self.dedup_seconds)).fetchone()
+                if row is not None:
+                    self._count("deduplicated")
+                    return self._job_from_row(row, conn), False
+
+            queued = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE job_type = ? AND status = 'queued'", (job_type,)
+            ).fetchone()[0]
+            if queued >= self.max_queued:
+                self._count("rejected")
+                raise JobQueueFull(f"{queued} {job_type} jobs are waiting")
+
+            job_id = str(uuid.uuid4())
+            conn.execute(
+                "INSERT INTO jobs (job_id, job_type, dedup_key, status, payload, created_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, job_type, dedup_key, dumps(payload), now)
+            )
+        self._count("submitted")
+        self._wakeups[job_type].set()
+        return self.get(job_id), True
+
+    # ---- status --------------------------------------------------------------
+
+    def _job_from_row(self, row, conn=None) -> Dict:
+        job = {
+            "job_id": row["job_id"],
+            "job_type": row["job_type"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created_at": _timestamp(row["created_at"]),
+            "started_at": _timestamp(row["started_at"]),
+            "finished_at": _timestamp(row["finished_at"]),
+            "error": {"status": row["error_status"], "detail": row["error"]} if row["error_status"] else None
+        }
+        if row["status"] == "queued" and conn is not None:
+            job["queue_position"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE job_type = ? AND status = 'queued' AND created_at < ?",
+                (row["job_type"], row["created_at"])
+            ).fetchone()[0]
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return self._job_from_row(row, conn) if row is not None else None
+
+    def result(self, job_id: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """(job, result); the result is set once the job succeeded"""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None, None
+            job = self._job_from_row(row, conn)
+        return job, loads(row["result"]) if row["status"] == "succeeded" else None
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a queued job. Running and finished jobs are returned unchanged."""
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+        if cursor.rowcount:
+            self._count("cancelled")
+        return self.get(job_id)
+
+    # ---- workers -------------------------------------------------------------
+
+    def _claim(self, job_type: str, worker: str) -> Optional[Tuple[str, Dict]]:
+        now = time.time()
+        params = {
+            "job_type": job_type,
+            "now": now,
+            "expired": now - self.lease_seconds,
+            "max_attempts": self.max_attempts,
+            "worker": worker
+        }
+        with self.pool.transaction() as conn:
+            conn.execute(_EXPIRE, params)
+            row = conn.execute(_CLAIM, params).fetchone()
+        return (row["job_id"], loads(row["payload"])) if row is not None else None
+
+    def _finish(self, job_id: str, worker: str, result: Optional[Dict], error_status: Optional[int] = None,
+                error: Optional[str] = None):
+        status = "succeeded" if error_status is None else "failed"
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(_FINISH, (
+                status, dumps(result) if result is not None else None, error_status, error,
+                time.time(), job_id, worker
+            ))
+        if cursor.rowcount:
+            self._count(status)
+        else:
+            # The lease expired and another worker claimed the job (or it was expired)
+            print(f"Job {job_id} was taken over by another worker; its {status} outcome is dropped")
+            self._count("lease_lost")
+
+    def _run_heartbeat(self):
+        """Renew the lease of every job this process is running"""
+        interval = self.lease_seconds / 3
+        while not self._stopping.wait(interval):
+            with self._lock:
+                running = list(self._running.items())
+            if not running:
+                continue
+            try:
+                now = time.time()
+                with self.pool.transaction() as conn:
+                    conn.executemany(_RENEW, [(now, job_id, worker) for job_id, worker in running])
+            except Exception as e:
+                print(f"Error renewing job leases: {e}")
+
+    def _purge(self):
+        if time.monotonic() - self._purged_at < 60:
+            return
+        self._purged_at = time.monotonic()
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND created_at < ?",
+                (time.time() - self.retention_seconds,)
+            )
+
+    def _run_worker(self, job_type: str):
+        handler, _ = self._handlers[job_type]
+        wakeup = self._wakeups[job_type]
+        worker = f"{os.getpid()}-{threading.current_thread().name}"
+        current_endpoint.set(f"job:{job_type}")
+
+        while not self._stopping.is_set():
+            try:
+                claimed = self._claim(job_type, worker)
+                if claimed is None:
+                    self._purge()
+                    wakeup.wait(self.poll_interval)
+                    wakeup.clear()
+                    continue
+            except Exception as e:
+                print(f"Error claiming {job_type} job: {e}")
+                self._stopping.wait(self.poll_interval)
+                continue
+
+            job_id, payload = claimed
+            started = time.perf_counter()
+            with self._lock:
+                self._running[job_id] = worker
+            try:
+                result = handler(payload)
+                self._finish(job_id, worker, result)
+            except Exception as e:
+                status = getattr(e, "status_code", 500)
+                if status >= 500:
+                    print(f"Error running {job_type} job {job_id}: {e}")
+                try:
+                    self._finish(job_id, worker, None, status, str(getattr(e, "detail", e)))
+                except Exception as finish_error:
+                    print(f"Error recording {job_type} job {job_id}: {finish_error}")
+            finally:
+                with self._lock:
+                    self._running.pop(job_id, None)
+            metrics.observe("job_duration_seconds", time.perf_counter() - started, job_type=job_type)
+
+    def stats(self) -> Dict:
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT job_type, status, COUNT(*) AS jobs FROM jobs GROUP BY job_type, status"
+            ).fetchall()
+        types = {
+            job_type: {"workers": concurrency}
+            for job_type, (_, concurrency) in self._handlers.items()
+        }
+        for row in rows:
+            types.setdefault(row["job_type"], {})[row["status"]] = row["jobs"]
+        with self._lock:
+            counters = dict(self._counters)
+        return {"types": types, **counters}
+
+    def close(self):
+        self._stopping.set()
+        for wakeup in self._wakeups.values():
+            wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        if self._pool is not None:
+            self._pool.close()
+
+metrics.histogram("job_duration_seconds", "Time spent running a queued job by type")
+
+job_queue = JobQueue(
+    path=settings.JOBS_DB_PATH,
+    busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS,
+    max_queued=settings.JOB_MAX_QUEUED,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    dedup_seconds=settings.JOB_DEDUP_SECONDS,
+    retention_seconds=settings.JOB_RETENTION_SECONDS,
+    poll_interval=settings.JOB_POLL_SECONDS
+)
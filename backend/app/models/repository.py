@@ -0,0 +1,665 @@
+﻿import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.container import services
+from app.models.hot_cache import HotCache, SpillStore
+from app.models.schemas import (
+    CareerTwinProfile, InterviewSession, InterviewAnswer,
+    InterviewQuestion, FeedbackReport, LLMUsage, ConversationState
+)
+from app.utils.serialization import dumps, loads, to_data
+
+def _encode_model(model) -> bytes:
+    return model.model_dump_json().encode()
+
+def _encode_embeddings(embeddings: Optional[List[float]]) -> Optional[bytes]:
+    if embeddings is None:
+        return None
+    return array('d', embeddings).tobytes()
+
+def _decode_embeddings(blob: Optional[bytes]) -> Optional[List[float]]:
+    if blob is None:
+        return None
+    values = array('d')
+    values.frombytes(blob)
+    return values.tolist()
+
+def _strip_large_fields(profile: CareerTwinProfile) -> CareerTwinProfile:
+    """Copy of the profile without raw_text and embeddings, the bulk of its size"""
+    return profile.model_copy(update={
+        "resume_data": profile.resume_data.model_copy(update={"raw_text": ""}),
+        "skill_embeddings": None
+    })
+
+class InMemoryRepository:
+    """Process-local storage (single worker, lost on restart).
+
+    Profiles, sessions and feedback live in byte-bounded hot caches; cold entries
+    spill to a per-process directory under SPILL_PATH. Resume raw_text and
+    embeddings are never kept in memory and are read back only when a caller
+    asks for them.
+    """
+
+    def __init__(self, spill_path: str, profile_max_bytes: int,
+                 session_max_bytes: int, feedback_max_bytes: int):
+        os.makedirs(spill_path, exist_ok=True)
+        self.spill_path = tempfile.mkdtemp(prefix=f"worker-{os.getpid()}-", dir=spill_path)
+
+        self._profiles = HotCache(
+            "profiles", profile_max_bytes, _encode_model,
+            CareerTwinProfile.model_validate_json,
+            SpillStore(os.path.join(self.spill_path, "profiles"))
+        )
+        self._sessions = HotCache(
+            "sessions", session_max_bytes, _encode_model,
+            InterviewSession.model_validate_json,
+            SpillStore(os.path.join(self.spill_path, "sessions"))
+        )
+        self._feedback = HotCache(
+            "feedback", feedback_max_bytes, _encode_model,
+            FeedbackReport.model_validate_json,
+            SpillStore(os.path.join(self.spill_path, "feedback"))
+        )
+        self._large_fields = SpillStore(os.path.join(self.spill_path, "profile_fields"))
+
+        # Small id indexes so lookups never have to scan spilled entries
+        self._profile_ids = set()
+        self._candidate_sessions: Dict[str, List[str]] = {}
+        self._candidate_feedback: Dict[str, List[str]] = {}
+
+        # day -> candidate_id -> usage; only the current day is kept
+        self._daily_usage: Dict[str, Dict[str, LLMUsage]] = {}
+        self._usage_lock = threading.Lock()
+
+        # (kind, entity_id) -> version, bumped on every write that changes a read endpoint
+        self._versions: Dict[tuple, int] = {}
+        self._versions_lock = threading.Lock()
+
+        # Serializes read-modify-write of a stored session (add_answer, add_question)
+        self._sessions_lock = threading.Lock()
+
+    def _bump(self, kind: str, entity_id: str):
+        with self._versions_lock:
+            self._versions[(kind, entity_id)] = self._versions.get((kind, entity_id), 0) + 1
+
+    def entity_version(self, kind: str, entity_id: str) -> int:
+        """Version of a profile, feedback or candidate progress; 0 if never written"""
+        return self._versions.get((kind, entity_id), 0)
+
+    def save_profile(self, profile: CareerTwinProfile):
+        self._large_fields.put(f"{profile.candidate_id}.raw_text", profile.resume_data.raw_text.encode())
+        if profile.skill_embeddings is not None:
+            self._large_fields.put(f"{profile.candidate_id}.embeddings", _encode_embeddings(profile.skill_embeddings))
+        else:
+            self._large_fields.delete(f"{profile.candidate_id}.embeddings")
+
+        self._profiles.put(profile.candidate_id, _strip_large_fields(profile))
+        self._profile_ids.add(profile.candidate_id)
+        self._bump("profile", profile.candidate_id)
+
+    def get_profile(self, candidate_id: str,
+                    include_large_fields: bool = False) -> Optional[CareerTwinProfile]:
+        profile = self._profiles.get(candidate_id)
+        if profile is None or not include_large_fields:
+            return profile
+
+        raw_text = self._large_fields.get(f"{candidate_id}.raw_text")
+        return profile.model_copy(update={
+            "resume_data": profile.resume_data.model_copy(update={
+                "raw_text": raw_text.decode() if raw_text else ""
+            }),
+            "skill_embeddings": _decode_embeddings(self._large_fields.get(f"{candidate_id}.embeddings"))
+        })
+
+    def has_profile(self, candidate_id: str) -> bool:
+        return candidate_id in self._profile_ids
+
+    def save_session(self, session: InterviewSession):
+        session_ids = self._candidate_sessions.setdefault(session.candidate_id, [])
+        if session.session_id not in session_ids:
+            session_ids.append(session.session_id)
+        self._sessions.put(session.session_id, session)
+        if session.status == "completed":
+            self._bump("progress", session.candidate_id)
+
+    def get_session(self, session_id: str) -> Optional[InterviewSession]:
+        return self._sessions.get(session_id)
+
+    def add_answer(self, session_id: str, answer: InterviewAnswer) -> int:
+        """Append an answer and return the session's answer count"""
+        with self._sessions_lock:
+            session = self._sessions.get(session_id)
+            session.answers.append(answer)
+            self._sessions.put(session_id, session)
+            return len(session.answers)
+
+    def add_question(self, session_id: str, question: InterviewQuestion,
+                     usage: Optional[LLMUsage] = None) -> InterviewQuestion:
+        """Append a follow-up unless its parent already has one; returns the stored
+        follow-up. usage (spent generating it) is added to the session either way."""
+        with self._sessions_lock:
+            session = self._sessions.get(session_id)
+            stored = next((q for q in session.questions if question.parent_question_id is not None
+                           and q.parent_question_id == question.parent_question_id), None)
+            if stored is None:
+                session.questions.append(question)
+                stored = question
+            if usage is not None:
+                session.usage = session.usage + usage
+            self._sessions.put(session_id, session)
+            return stored
+
+    def list_completed_sessions(self, candidate_id: str) -> List[InterviewSession]:
+        sessions = [self._sessions.get(sid) for sid in self._candidate_sessions.get(candidate_id, [])]
+        return [s for s in sessions if s is not None and s.status == "completed"]
+
+    def save_feedback(self, session_id: str, feedback: FeedbackReport):
+        session_ids = self._candidate_feedback.setdefault(feedback.candidate_id, [])
+        if session_id not in session_ids:
+            session_ids.append(session_id)
+        self._feedback.put(session_id, feedback)
+        self._bump("feedback", session_id)
+        self._bump("progress", feedback.candidate_id)
+
+    def get_feedback(self, session_id: str) -> Optional[FeedbackReport]:
+        return self._feedback.get(session_id)
+
+    def list_feedback(self, candidate_id: str) -> Dict[str, FeedbackReport]:
+        feedback = {sid: self._feedback.get(sid) for sid in self._candidate_feedback.get(candidate_id, [])}
+        return {sid: f for sid, f in feedback.items() if f is not None}
+
+    def add_daily_usage(self, candidate_id: str, day: str, usage: LLMUsage):
+        with self._usage_lock:
+            for old_day in [d for d in self._daily_usage if d < day]:
+                del self._daily_usage[old_day]
+            candidates = self._daily_usage.setdefault(day, {})
+            candidates[candidate_id] = candidates.get(candidate_id, LLMUsage()) + usage
+
+    def get_daily_usage(self, candidate_id: str, day: str) -> LLMUsage:
+        with self._usage_lock:
+            return self._daily_usage.get(day, {}).get(candidate_id, LLMUsage())
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "memory",
+            "profiles": self._profiles.stats(),
+            "sessions": self._sessions.stats(),
+            "feedback": self._feedback.stats()
+        }
+
+    def close(self):
+        shutil.rmtree(self.spill_path, ignore_errors=True)
+
+class StorageBusy(Exception):
+    """No connection or write lock became free within the busy timeout"""
+    status_code = 503  # for job handlers, which store an exception's status_code
+
+class SQLitePool:
+    """Fixed-size pool of WAL-mode SQLite connections shared across threads.
+    Waiting for a free connection, or for the write lock, is bounded by
+    busy_timeout_ms and then raises StorageBusy."""
+
+    def __init__(self, path: str, size: int, busy_timeout_ms: int):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._pool.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,  # explicit BEGIN/COMMIT
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._pool.get(timeout=self.busy_timeout_ms / 1000)
+        except queue.Empty:
+            raise StorageBusy(f"No SQLite connection free within {self.busy_timeout_ms}ms") from None
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction; takes the write lock up front so concurrent
+        writers in other workers wait on busy_timeout instead of deadlocking"""
+        with self.connection() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e) or "busy" in str(e):
+                    raise StorageBusy(f"SQLite write lock not free within {self.busy_timeout_ms}ms") from e
+                raise
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    candidate_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    raw_text TEXT NOT NULL,
+    skill_embeddings BLOB,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    candidate_id TEXT NOT NULL REFERENCES profiles(candidate_id),
+    role TEXT NOT NULL,
+    status TEXT NOT NULL,
+    questions TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    completed_at TEXT,
+    usage TEXT,
+    conversation TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_candidate_status ON sessions(candidate_id, status);
+
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL REFERENCES sessions(session_id),
+    question_id TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    category TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_session ON answers(session_id, id);
+
+CREATE TABLE IF NOT EXISTS feedback (
+    session_id TEXT PRIMARY KEY REFERENCES sessions(session_id),
+    candidate_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_candidate ON feedback(candidate_id);
+
+CREATE TABLE IF NOT EXISTS llm_usage (
+    candidate_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_ms REAL NOT NULL,
+    retries INTEGER NOT NULL,
+    economy_calls INTEGER NOT NULL,
+    PRIMARY KEY (candidate_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS entity_versions (
+    kind TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (kind, entity_id)
+);
+"""
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = [
+    ("sessions", "usage", "ALTER TABLE sessions ADD COLUMN usage TEXT"),
+    ("sessions", "conversation", "ALTER TABLE sessions ADD COLUMN conversation TEXT"),
+]
+
+# Statements are kept as module constants so every connection's statement cache
+# reuses the same prepared statement for each query
+_UPSERT_PROFILE = """
+INSERT INTO profiles (candidate_id, name, data, raw_text, skill_embeddings, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(candidate_id) DO UPDATE SET
+    name = excluded.name,
+    data = excluded.data,
+    raw_text = excluded.raw_text,
+    skill_embeddings = excluded.skill_embeddings,
+    updated_at = excluded.updated_at
+"""
+_SELECT_PROFILE = "SELECT data FROM profiles WHERE candidate_id = ?"
+_SELECT_PROFILE_FULL = "SELECT data, raw_text, skill_embeddings FROM profiles WHERE candidate_id = ?"
+_PROFILE_EXISTS = "SELECT 1 FROM profiles WHERE candidate_id = ?"
+_UPSERT_SESSION = """
+INSERT INTO sessions (session_id, candidate_id, role, status, questions, started_at, completed_at, usage, conversation)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(session_id) DO UPDATE SET
+    status = excluded.status,
+    questions = excluded.questions,
+    completed_at = excluded.completed_at,
+    usage = excluded.usage,
+    conversation = excluded.conversation
+"""
+_SELECT_SESSION = """
+SELECT session_id, candidate_id, role, status, questions, started_at, completed_at, usage, conversation
+FROM sessions WHERE session_id = ?
+"""
+_SELECT_COMPLETED_SESSIONS = """
+SELECT session_id, candidate_id, role, status, questions, started_at, completed_at, usage, conversation
+FROM sessions WHERE candidate_id = ? AND status = 'completed'
+"""
+_INSERT_ANSWER = """
+INSERT INTO answers (session_id, question_id, question, answer, category)
+VALUES (?, ?, ?, ?, ?)
+"""
+_COUNT_ANSWERS = "SELECT COUNT(*) FROM answers WHERE session_id = ?"
+_SELECT_SESSION_QUESTIONS = "SELECT questions, usage FROM sessions WHERE session_id = ?"
+_UPDATE_SESSION_QUESTIONS = "UPDATE sessions SET questions = ?, usage = ? WHERE session_id = ?"
+_SELECT_ANSWERS = """
+SELECT question_id, question, answer, category FROM answers
+WHERE session_id = ? ORDER BY id
+"""
+_SELECT_CANDIDATE_ANSWERS = """
+SELECT a.session_id, a.question_id, a.question, a.answer, a.category
+FROM answers a JOIN sessions s ON s.session_id = a.session_id
+WHERE s.candidate_id = ? AND s.status = 'completed'
+ORDER BY a.id
+"""
+_UPSERT_FEEDBACK = """
+INSERT INTO feedback (session_id, candidate_id, data) VALUES (?, ?, ?)
+ON CONFLICT(session_id) DO UPDATE SET data = excluded.data
+"""
+_SELECT_FEEDBACK = "SELECT data FROM feedback WHERE session_id = ?"
+_SELECT_CANDIDATE_FEEDBACK = "SELECT session_id, data FROM feedback WHERE candidate_id = ?"
+_ADD_USAGE = """
+INSERT INTO llm_usage (candidate_id, day, calls, prompt_tokens, completion_tokens, latency_ms, retries, economy_calls)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(candidate_id, day) DO UPDATE SET
+    calls = calls + excluded.calls,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    latency_ms = latency_ms + excluded.latency_ms,
+    retries = retries + excluded.retries,
+    economy_calls = economy_calls + excluded.economy_calls
+"""
+_SELECT_USAGE = """
+SELECT calls, prompt_tokens, completion_tokens, latency_ms, retries, economy_calls
+FROM llm_usage WHERE candidate_id = ? AND day = ?
+"""
+_BUMP_VERSION = """
+INSERT INTO entity_versions (kind, entity_id, version) VALUES (?, ?, 1)
+ON CONFLICT(kind, entity_id) DO UPDATE SET version = version + 1
+"""
+_SELECT_VERSION = "SELECT version FROM entity_versions WHERE kind = ? AND entity_id = ?"
+
+class SQLiteRepository:
+    """SQLite (WAL) storage shared by every worker on the host.
+
+    Completed sessions and feedback never change once written, so they are
+    served from byte-bounded hot caches that need no cross-worker invalidation.
+    """
+
+    def __init__(self, path: str, pool_size: int, busy_timeout_ms: int,
+                 session_max_bytes: int, feedback_max_bytes: int):
+        self.pool = SQLitePool(path, pool_size, busy_timeout_ms)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            for table, column, statement in MIGRATIONS:
+                columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    try:
+                        conn.execute(statement)
+                    except sqlite3.OperationalError as e:
+                        # Another worker added it first
+                        print(f"Skipping migration of {table}.{column}: {e}")
+
+        self._completed_sessions = HotCache(
+            "completed_sessions", session_max_bytes, _encode_model,
+            InterviewSession.model_validate_json
+        )
+        self._feedback = HotCache(
+            "feedback", feedback_max_bytes, _encode_model,
+            FeedbackReport.model_validate_json
+        )
+
+    def save_profile(self, profile: CareerTwinProfile):
+        # raw_text and embeddings get their own columns so the JSON blob stays small
+        data = profile.model_dump_json(exclude={
+            "skill_embeddings": True,
+            "resume_data": {"raw_text"}
+        })
+        with self.pool.transaction() as conn:
+            conn.execute(_UPSERT_PROFILE, (
+                profile.candidate_id,
+                profile.name,
+                data,
+                profile.resume_data.raw_text,
+                _encode_embeddings(profile.skill_embeddings),
+                profile.created_at.isoformat(),
+                profile.updated_at.isoformat()
+            ))
+            conn.execute(_BUMP_VERSION, ("profile", profile.candidate_id))
+
+    def get_profile(self, candidate_id: str,
+                    include_large_fields: bool = False) -> Optional[CareerTwinProfile]:
+        query = _SELECT_PROFILE_FULL if include_large_fields else _SELECT_PROFILE
+        with self.pool.connection() as conn:
+            row = conn.execute(query, (candidate_id,)).fetchone()
+        if row is None:
+            return None
+
+        data = loads(row["data"])
+        if include_large_fields:
+            data["resume_data"]["raw_text"] = row["raw_text"]
+            data["skill_embeddings"] = _decode_embeddings(row["skill_embeddings"])
+        else:
+            data["resume_data"]["raw_text"] = ""
+        return CareerTwinProfile.model_validate(data)
+
+    def has_profile(self, candidate_id: str) -> bool:
+        with self.pool.connection() as conn:
+            return conn.execute(_PROFILE_EXISTS, (candidate_id,)).fetchone() is not None
+
+    @staticmethod
+    def _session_from_row(row: sqlite3.Row, answers: List[InterviewAnswer]) -> InterviewSession:
+        return InterviewSession(
+            session_id=row["session_id"],
+            candidate_id=row["candidate_id"],
+            role=row["role"],
+            status=row["status"],
+            questions=[InterviewQuestion(**q) for q in loads(row["questions"])],
+            answers=answers,
+            started_at=datetime.fromisoformat(row["started_at"]),
+            completed_at=datetime.fromisoformat(row["completed_at"]) if row["completed_at"] else None,
+            usage=LLMUsage.model_validate_json(row["usage"]) if row["usage"] else LLMUsage(),
+            conversation=(
+                ConversationState.model_validate_json(row["conversation"]) if row["conversation"] else None
+            )
+        )
+
+    def save_session(self, session: InterviewSession):
+        """Upsert session metadata and questions; answers go through add_answer"""
+        questions = dumps([to_data(q) for q in session.questions]).decode()
+        with self.pool.transaction() as conn:
+            conn.execute(_UPSERT_SESSION, (
+                session.session_id,
+                session.candidate_id,
+                session.role,
+                session.status,
+                questions,
+                session.started_at.isoformat(),
+                session.completed_at.isoformat() if session.completed_at else None,
+                session.usage.model_dump_json(),
+                session.conversation.model_dump_json() if session.conversation else None
+            ))
+            if session.status == "completed":
+                conn.execute(_BUMP_VERSION, ("progress", session.candidate_id))
+        if session.status == "completed":
+            self._completed_sessions.put(session.session_id, session)
+
+    def get_session(self, session_id: str) -> Optional[InterviewSession]:
+        cached = self._completed_sessions.get(session_id)
+        if cached is not None:
+            return cached
+
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_SESSION, (session_id,)).fetchone()
+            if row is None:
+                return None
+            answers = [
+                InterviewAnswer(**dict(a))
+                for a in conn.execute(_SELECT_ANSWERS, (session_id,)).fetchall()
+            ]
+
+        session = self._session_from_row(row, answers)
+        if session.status == "completed":
+            self._completed_sessions.put(session_id, session)
+        return session
+
+    def add_answer(self, session_id: str, answer: InterviewAnswer) -> int:
+        """Append an answer and return the session's answer count"""
+        with self.pool.transaction() as conn:
+            conn.execute(_INSERT_ANSWER, (
+                session_id, answer.question_id, answer.question, answer.answer, answer.category
+            ))
+            return conn.execute(_COUNT_ANSWERS, (session_id,)).fetchone()[0]
+
+    def add_question(self, session_id: str, question: InterviewQuestion,
+                     usage: Optional[LLMUsage] = None) -> InterviewQuestion:
+        """Append a follow-up unless its parent already has one; returns the stored
+        follow-up. usage (spent generating it) is added to the session either way."""
+        with self.pool.transaction() as conn:
+            row = conn.execute(_SELECT_SESSION_QUESTIONS, (session_id,)).fetchone()
+            questions = [InterviewQuestion(**q) for q in loads(row["questions"])]
+            stored = next((q for q in questions if question.parent_question_id is not None
+                           and q.parent_question_id == question.parent_question_id), None)
+            if stored is None:
+                questions.append(question)
+                stored = question
+            session_usage = LLMUsage.model_validate_json(row["usage"]) if row["usage"] else LLMUsage()
+            if usage is not None:
+                session_usage = session_usage + usage
+            conn.execute(_UPDATE_SESSION_QUESTIONS, (
+                dumps([to_data(q) for q in questions]).decode(),
+                session_usage.model_dump_json(),
+                session_id
+            ))
+            return stored
+
+    def list_completed_sessions(self, candidate_id: str) -> List[InterviewSession]:
+        with self.pool.connection() as conn:
+            rows = conn.execute(_SELECT_COMPLETED_SESSIONS, (candidate_id,)).fetchall()
+            answer_rows = conn.execute(_SELECT_CANDIDATE_ANSWERS, (candidate_id,)).fetchall()
+
+        answers_by_session: Dict[str, List[InterviewAnswer]] = {}
+        for a in answer_rows:
+            answers_by_session.setdefault(a["session_id"], []).append(InterviewAnswer(
+                question_id=a["question_id"],
+                question=a["question"],
+                answer=a["answer"],
+                category=a["category"]
+            ))
+
+        return [
+            self._session_from_row(row, answers_by_session.get(row["session_id"], []))
+            for row in rows
+        ]
+
+    def save_feedback(self, session_id: str, feedback: FeedbackReport):
+        with self.pool.transaction() as conn:
+            conn.execute(_UPSERT_FEEDBACK, (
+                session_id, feedback.candidate_id, feedback.model_dump_json()
+            ))
+            conn.execute(_BUMP_VERSION, ("feedback", session_id))
+            conn.execute(_BUMP_VERSION, ("progress", feedback.candidate_id))
+        self._feedback.put(session_id, feedback)
+
+    def get_feedback(self, session_id: str) -> Optional[FeedbackReport]:
+        cached = self._feedback.get(session_id)
+        if cached is not None:
+            return cached
+
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_FEEDBACK, (session_id,)).fetchone()
+        if row is None:
+            return None
+
+        feedback = FeedbackReport.model_validate_json(row["data"])
+        self._feedback.put(session_id, feedback)
+        return feedback
+
+    def list_feedback(self, candidate_id: str) -> Dict[str, FeedbackReport]:
+        with self.pool.connection() as conn:
+            rows = conn.execute(_SELECT_CANDIDATE_FEEDBACK, (candidate_id,)).fetchall()
+        return {
+            row["session_id"]: FeedbackReport.model_validate_json(row["data"])
+            for row in rows
+        }
+
+    def add_daily_usage(self, candidate_id: str, day: str, usage: LLMUsage):
+        with self.pool.transaction() as conn:
+            conn.execute(_ADD_USAGE, (
+                candidate_id, day, usage.calls, usage.prompt_tokens, usage.completion_tokens,
+                usage.latency_ms, usage.retries, usage.economy_calls
+            ))
+
+    def get_daily_usage(self, candidate_id: str, day: str) -> LLMUsage:
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_USAGE, (candidate_id, day)).fetchone()
+        return LLMUsage(**dict(row)) if row is not None else LLMUsage()
+
+    def entity_version(self, kind: str, entity_id: str) -> int:
+        """Version of a profile, feedback or candidate progress; 0 if never written.
+        Bumped in the writing transaction, so every worker sees the change."""
+        with self.pool.connection() as conn:
+            row = conn.execute(_SELECT_VERSION, (kind, entity_id)).fetchone()
+        return row[0] if row is not None else 0
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "sqlite",
+            "completed_sessions": self._completed_sessions.stats(),
+            "feedback": self._feedback.stats()
+        }
+
+    def close(self):
+        self.pool.close()
+
+def create_repository():
+    """Build the storage backend selected by STORAGE_BACKEND"""
+    if settings.STORAGE_BACKEND == "sqlite":
+        return SQLiteRepository(
+            path=settings.SQLITE_PATH,
+            pool_size=settings.SQLITE_POOL_SIZE,
+            busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS,
+            session_max_bytes=settings.HOT_CACHE_SESSION_MAX_BYTES,
+            feedback_max_bytes=settings.HOT_CACHE_FEEDBACK_MAX_BYTES
+        )
+    if settings.STORAGE_BACKEND == "memory":
+        return InMemoryRepository(
+            spill_path=settings.SPILL_PATH,
+            profile_max_bytes=settings.HOT_CACHE_PROFILE_MAX_BYTES,
+            session_max_bytes=settings.HOT_CACHE_SESSION_MAX_BYTES,
+            feedback_max_bytes=settings.HOT_CACHE_FEEDBACK_MAX_BYTES
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+
+repository = services.register("repository", create_repository)
@@ -1,4 +1,4 @@
-﻿from pydantic import BaseModel, Field
+﻿from pydantic import BaseModel, Field, field_validator
 from typing import List, Dict, Optional
 from datetime import datetime
 
@@ -16,8 +16,9 @@ class ResumeData(BaseModel):
 class InterviewQuestion(BaseModel):
     question_id: str
     question: str
-    category: str  # hr, technical, behavioral
+    category: str  # hr, technical, behavioral, follow_up, conversational
     difficulty: str  # easy, medium, hard
+    parent_question_id: Optional[str] = None  # set on follow-up questions
 
 class InterviewAnswer(BaseModel):
     question_id: str
@@ -31,7 +32,15 @@ class EvaluationScore(BaseModel):
     confidence_score: float = Field(..., ge=0, le=100)
     relevance_score: float = Field(..., ge=0, le=100)
     overall_score: float = Field(..., ge=0, le=100)
+    # Per-answer scores keyed by question_id
+    answer_scores: Dict[str, Dict[str, float]] = {}
     
+class AnswerCritique(BaseModel):
+    """Short critique of one answer; the input of the feedback reduce step"""
+    summary: str
+    strengths: List[str] = []
+    weaknesses: List[str] = []
+
 class FeedbackReport(BaseModel):
     candidate_id: str
     timestamp: datetime
@@ -52,6 +61,37 @@ class CareerTwinProfile(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class LLMUsage(BaseModel):
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: float = 0.0  # upstream time, excluding waits for a concurrency slot
+    retries: int = 0
+    economy_calls: int = 0  # LLM calls skipped or shortened because a budget was nearly used
+    
+    def __add__(self, other: "LLMUsage") -> "LLMUsage":
+        totals = {name: getattr(self, name) + getattr(other, name) for name in LLMUsage.model_fields}
+        totals["latency_ms"] = round(totals["latency_ms"], 2)
+        return LLMUsage(**totals)
+    
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+class ConversationTurn(BaseModel):
+    question_id: str
+    latency_ms: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    context_tokens: int = 0  # estimated size of the history sent with the turn
+    summarized_turns: int = 0  # earlier turns the history covered with a summary
+
+class ConversationState(BaseModel):
+    max_questions: int
+    summary: str = ""  # rolling summary of the turns before the recent ones
+    summarized_turns: int = 0  # question/answer pairs folded into the summary
+    turns: List[ConversationTurn] = []
+
 class InterviewSession(BaseModel):
     session_id: str
     candidate_id: str
@@ -61,6 +101,8 @@ class InterviewSession(BaseModel):
     started_at: datetime
     completed_at: Optional[datetime] = None
     status: str = "in_progress"  # in_progress, completed
+    usage: LLMUsage = Field(default_factory=LLMUsage)
+    conversation: Optional[ConversationState] = None  # set in conversational mode
 
 class ProgressMetrics(BaseModel):
     candidate_id: str
@@ -68,3 +110,42 @@ class ProgressMetrics(BaseModel):
     improvement_trend: Dict[str, List[float]]
     current_readiness_score: float
     target_role_compatibility: Dict[str, float]
+
+# Shapes the LLM is asked to return, validated by app/utils/structured_output.py
+
+class ParsedResume(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    skills: List[str] = []
+    experience: List[Dict] = []
+    education: List[Dict] = []
+    projects: List[Dict] = []
+    summary: Optional[str] = None
+    
+    @field_validator("skills", "experience", "education", "projects", mode="before")
+    @classmethod
+    def _null_as_empty(cls, value):
+        return [] if value is None else value
+
+class GeneratedQuestion(BaseModel):
+    question: str = Field(..., min_length=1)
+    difficulty: str = "medium"
+
+class AnswerScores(BaseModel):
+    communication_clarity: float
+    technical_accuracy: float
+    confidence: float
+    relevance: float
+    
+    @field_validator("*")
+    @classmethod
+    def _clamp(cls, value: float) -> float:
+        return max(0.0, min(100.0, value))
+
+class FeedbackContent(BaseModel):
+    strengths: List[str]
+    weaknesses: List[str]
+    skill_gaps: List[str]
+    recommendations: List[str]
+    improvement_roadmap: Dict[str, List[str]]
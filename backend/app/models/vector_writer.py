@@ -0,0 +1,261 @@
+﻿"""Write-behind queue for profile embeddings.
+
+Profile adds and updates are queued and written by a background thread as one
+Chroma ``upsert`` per batch, flushed when VECTOR_WRITE_BATCH_SIZE candidates
+are waiting or VECTOR_WRITE_FLUSH_INTERVAL_MS has passed. Repeated writes for
+a candidate that is still queued replace the queued write instead of taking
+another slot. Reads of a queued candidate are served from the queue.
+
+A failed batch is retried one candidate at a time. Candidates that still fail
+stay queued and are written again after a back-off that doubles per attempt;
+after VECTOR_WRITE_MAX_ATTEMPTS the write is dropped and logged. flush()
+waits for retries too.
+"""
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.models.database import vector_db
+
+class VectorQueueFull(Exception):
+    """Raised when the write queue stays full for longer than the enqueue timeout"""
+
+class VectorWriteBehind:
+
+    def __init__(self, batch_size: int, flush_interval: float, queue_size: int,
+                 enqueue_timeout: float, max_attempts: int, retry_backoff: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+        # candidate_id -> (embeddings, metadata) not yet written
+        self._pending: Dict[str, tuple] = {}
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        # Failed writes: candidate_id -> failed attempts, and (writer thread only)
+        # candidate_id -> when to retry. A retried candidate keeps its queue task
+        # until it is written or dropped, so flush() waits for it.
+        self._attempts: Dict[str, int] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+
+        self._counters = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "rejected": 0,
+            "written": 0,
+            "batches": 0,
+            "retried": 0,
+            "failed": 0,
+            "last_batch_ms": 0.0
+        }
+
+    def _ensure_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(
+                target=self._run_writer, name="vector-writer", daemon=True
+            )
+            self._writer.start()
+
+    def _enqueue(self, candidate_id: str, embeddings: List[float], metadata: Dict):
+        entry = (embeddings, metadata)
+        with self._lock:
+            queued = candidate_id in self._pending
+            self._pending[candidate_id] = entry
+            if queued:
+                self._counters["coalesced"] += 1
+                return
+            self._ensure_writer()
+
+        try:
+            self._queue.put(candidate_id, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                if self._pending.get(candidate_id) is entry:
+                    del self._pending[candidate_id]
+                self._counters["rejected"] += 1
+            raise VectorQueueFull("Vector database write queue is full")
+
+        with self._lock:
+            self._counters["enqueued"] += 1
+
+    def add_profile(self, candidate_id: str, embeddings: List[float], metadata: Dict):
+        """Queue a new profile; raises VectorQueueFull under back-pressure"""
+        self._enqueue(candidate_id, embeddings, metadata)
+
+    def update_profile(self, candidate_id: str, embeddings: List[float], metadata: Dict):
+        """Queue a replacement for an existing profile"""
+        self._enqueue(candidate_id, embeddings, metadata)
+
+    def get_profile(self, candidate_id: str):
+        """Chroma-style result, including writes that are still queued"""
+        with self._lock:
+            entry = self._pending.get(candidate_id)
+        if entry is not None:
+            return {"ids": [candidate_id], "embeddings": [entry[0]], "metadatas": [entry[1]]}
+        return vector_db.get_profile(candidate_id)
+
+    def search_similar_profiles(self, query_embeddings: List[float], n_results: int = 5):
+        """Similarity search over written profiles (queued writes are flushed first)"""
+        self.flush()
+        return vector_db.search_similar_profiles(query_embeddings, n_results)
+
+    def _write_batch(self, candidate_ids: List[str]) -> List[str]:
+        """Write the queued entries of candidate_ids; returns the ones to retry"""
+        with self._lock:
+            batch = {cid: self._pending[cid] for cid in candidate_ids if cid in self._pending}
+        if not batch:
+            return []
+
+        started = time.perf_counter()
+        ids = list(batch)
+        try:
+            vector_db.upsert_profiles(
+                ids, [batch[cid][0] for cid in ids], [batch[cid][1] for cid in ids]
+            )
+            failed = []
+        except Exception as e:
+            # Retry one by one so a single bad entry does not lose the batch
+            print(f"Error writing vector batch of {len(ids)}: {e}")
+            failed = []
+            for cid in ids:
+                try:
+                    vector_db.upsert_profiles([cid], [batch[cid][0]], [batch[cid][1]])
+                except Exception as item_error:
+                    print(f"Error writing vector profile {cid}: {item_error}")
+                    failed.append(cid)
+
+        retry = []
+        dropped = []
+        with self._lock:
+            for cid, entry in batch.items():
+                current = self._pending.get(cid)
+                if cid in failed:
+                    # Stays in _pending (the latest entry is retried), unless out of attempts
+                    attempts = self._attempts.get(cid, 0) + 1
+                    if attempts >= self.max_attempts:
+                        self._pending.pop(cid, None)
+                        self._attempts.pop(cid, None)
+                        dropped.append(cid)
+                    else:
+                        self._attempts[cid] = attempts
+                        retry.append(cid)
+                    continue
+                self._attempts.pop(cid, None)
+                if current is entry:
+                    del self._pending[cid]
+                elif current is not None:
+                    # Replaced while this batch was in flight; write the newer one too
+                    self._reenqueue(cid)
+            self._counters["written"] += len(ids) - len(failed)
+            self._counters["retried"] += len(retry)
+            self._counters["failed"] += len(dropped)
+            self._counters["batches"] += 1
+            self._counters["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if dropped:
+            print(f"Dropped vector profiles after {self.max_attempts} failed attempts: {', '.join(dropped)}")
+        return retry
+
+    def _reenqueue(self, candidate_id: str):
+        try:
+            self._queue.put_nowait(candidate_id)
+        except queue.Full:
+            # The writer drains the queue itself, so wait outside the lock
+            threading.Thread(target=self._queue.put, args=(candidate_id,), daemon=True).start()
+
+    def _retry_wait(self) -> Optional[float]:
+        """Seconds until the next retry is due; None without retries"""
+        if not self._retry_at:
+            return None
+        return max(0.0, min(self._retry_at.values()) - time.monotonic())
+
+    def _due_retries(self) -> List[str]:
+        now = time.monotonic()
+        due = [cid for cid, at in self._retry_at.items() if at <= now]
+        for cid in due:
+            del self._retry_at[cid]
+        return due
+
+    def _run_writer(self):
+        stopping = False
+        while True:
+            timeout = self._retry_wait()
+            if stopping and timeout is None:
+                timeout = 0  # only drain what is left
+            batch = []
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is None:
+                    stopping = True
+                    self._queue.task_done()
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                if stopping and not self._retry_at:
+                    return
+
+            deadline = time.monotonic() + self.flush_interval
+            while batch and not stopping and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    next_item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if next_item is None:
+                    # Entries replaced or retried during the last batches are drained first
+                    stopping = True
+                    self._queue.task_done()
+                    break
+                batch.append(next_item)
+            batch.extend(self._due_retries())
+            if not batch:
+                continue
+
+            try:
+                retry = set(self._write_batch(batch))
+            except Exception as e:
+                print(f"Error in vector writer: {e}")
+                retry = set()
+            for cid in batch:
+                if cid in retry and cid not in self._retry_at:
+                    attempts = self._attempts.get(cid, 1)
+                    self._retry_at[cid] = time.monotonic() + self.retry_backoff * 2 ** (attempts - 1)
+                else:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Block until everything queued so far has been written or, after its
+        last attempt, dropped"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Write out queued profiles and stop the writer"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._writer = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "retrying": len(self._attempts),
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                **self._counters
+            }
+
+vector_writer = VectorWriteBehind(
+    batch_size=settings.VECTOR_WRITE_BATCH_SIZE,
+    flush_interval=settings.VECTOR_WRITE_FLUSH_INTERVAL_MS / 1000,
+    queue_size=settings.VECTOR_WRITE_QUEUE_SIZE,
+    enqueue_timeout=settings.VECTOR_WRITE_ENQUEUE_TIMEOUT_MS / 1000,
+    max_attempts=settings.VECTOR_WRITE_MAX_ATTEMPTS,
+    retry_backoff=settings.VECTOR_WRITE_RETRY_BACKOFF_MS / 1000
+)
@@ -0,0 +1,222 @@
+﻿"""Columnar export of interview history for score-trend analytics.
+
+Completed sessions are flattened to one row per answer and written as Parquet
+files partitioned by completion date and role:
+
+    <ANALYTICS_PATH>/date=2026-10-18/role_slug=ml_engineer/part-<id>.parquet
+
+    python -m app.services.analytics backfill
+    python -m app.services.analytics compact
+    python -m app.services.analytics query --metric technical_accuracy --by role --freq W
+"""
+import argparse
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from app.core.config import settings
+from app.utils.roles import role_slug
+
+SCORE_COLUMNS = ["communication_clarity", "technical_accuracy", "confidence", "relevance"]
+COLUMNS = [
+    "session_id", "candidate_id", "role", "completed_at", "question_id",
+    "category", "difficulty", "answer_length", *SCORE_COLUMNS, "session_overall_score"
+]
+PARTITIONING = ds.partitioning(
+    pa.schema([("date", pa.string()), ("role_slug", pa.string())]),
+    flavor="hive"
+)
+
+class AnalyticsStore:
+
+    def __init__(self, path: str, flush_rows: int, flush_interval: float):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self._buffer: List[Dict] = []
+        self._buffer_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def flatten_session(log: Dict) -> List[Dict]:
+        """One row per answer, with the per-answer scores from the evaluation"""
+        questions = {q["question_id"]: q for q in log.get("questions", [])}
+        evaluation = log.get("evaluation") or {}
+        answer_scores = evaluation.get("answer_scores") or {}
+        completed_at = pd.Timestamp(log.get("completed_at") or log.get("started_at"))
+
+        rows = []
+        for answer in log.get("answers", []):
+            scores = answer_scores.get(answer["question_id"], {})
+            question = questions.get(answer["question_id"], {})
+            rows.append({
+                "session_id": log["session_id"],
+                "candidate_id": log.get("candidate_id"),
+                "role": log.get("role", ""),
+                "completed_at": completed_at,
+                "question_id": answer["question_id"],
+                "category": answer.get("category") or question.get("category"),
+                "difficulty": question.get("difficulty"),
+                "answer_length": len(answer.get("answer", "")),
+                **{column: scores.get(column) for column in SCORE_COLUMNS},
+                "session_overall_score": evaluation.get("overall_score")
+            })
+        return rows
+
+    def _write_rows(self, rows: List[Dict]):
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        df["completed_at"] = pd.to_datetime(df["completed_at"])
+        df["answer_length"] = df["answer_length"].astype("int64")
+        for column in [*SCORE_COLUMNS, "session_overall_score"]:
+            df[column] = df[column].astype("float64")
+
+        partition_date = df["completed_at"].dt.strftime("%Y-%m-%d")
+        partition_role = df["role"].map(role_slug)
+        for (date, slug), part in df.groupby([partition_date, partition_role]):
+            directory = os.path.join(self.path, f"date={date}", f"role_slug={slug}")
+            os.makedirs(directory, exist_ok=True)
+            part.to_parquet(
+                os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet"),
+                index=False, compression="zstd"
+            )
+
+    def add_session(self, log: Dict):
+        """Buffer a completed session; written out once the buffer is large or old enough"""
+        rows = self.flatten_session(log)
+        with self._lock:
+            self._buffer.extend(rows)
+            if self._buffer_since is None:
+                self._buffer_since = time.monotonic()
+            due = (len(self._buffer) >= self.flush_rows or
+                   time.monotonic() - self._buffer_since >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._buffer_since = None
+        if rows:
+            self._write_rows(rows)
+
+    def backfill(self, logs, batch_rows: int = 500000) -> int:
+        """Export an iterable of session logs in large batches"""
+        batch, total = [], 0
+        for log in logs:
+            batch.extend(self.flatten_session(log))
+            if len(batch) >= batch_rows:
+                self._write_rows(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self._write_rows(batch)
+            total += len(batch)
+        return total
+
+    def compact(self) -> Dict:
+        """Merge each partition's part files into one, dropping duplicate answers"""
+        merged = 0
+        for date_dir in sorted(os.listdir(self.path)) if os.path.isdir(self.path) else []:
+            for role_dir in sorted(os.listdir(os.path.join(self.path, date_dir))):
+                directory = os.path.join(self.path, date_dir, role_dir)
+                parts = sorted(f for f in os.listdir(directory) if f.endswith(".parquet"))
+                if len(parts) < 2:
+                    continue
+
+                df = pd.concat(
+                    [pd.read_parquet(os.path.join(directory, f)) for f in parts],
+                    ignore_index=True
+                )
+                df = df.drop_duplicates(["session_id", "question_id"], keep="last")
+                df.to_parquet(
+                    os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet"),
+                    index=False, compression="zstd"
+                )
+                for f in parts:
+                    os.remove(os.path.join(directory, f))
+                merged += len(parts)
+        return {"files_merged": merged}
+
+    def load(self, columns: List[str], role: Optional[str] = None,
+             since: Optional[str] = None, until: Optional[str] = None) -> pd.DataFrame:
+        """Read selected columns, pruning partitions by role and date"""
+        if not os.path.isdir(self.path):
+            return pd.DataFrame(columns=columns)
+
+        dataset = ds.dataset(self.path, format="parquet", partitioning=PARTITIONING)
+        if not dataset.files:
+            # Nothing flushed yet (or everything deleted); an empty dataset has no
+            # schema to resolve the columns against
+            return pd.DataFrame(columns=columns)
+        expression = None
+        for condition in [
+            ds.field("role_slug") == role_slug(role) if role else None,
+            ds.field("date") >= since if since else None,
+            ds.field("date") <= until if until else None
+        ]:
+            if condition is not None:
+                expression = condition if expression is None else expression & condition
+
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    def score_trend(self, metric: str = "technical_accuracy", by: List[str] = None,
+                    freq: str = "W", role: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None) -> pd.DataFrame:
+        """Mean of a score per group and period, e.g. technical_accuracy by role per week"""
+        by = by or ["role"]
+        if metric not in SCORE_COLUMNS + ["session_overall_score"]:
+            raise ValueError(f"Unknown metric: {metric}")
+
+        df = self.load(["completed_at", metric, *by], role=role, since=since, until=until)
+        if df.empty:
+            return pd.DataFrame(columns=[*by, "period", "mean", "count"])
+
+        grouped = df.groupby([*by, pd.Grouper(key="completed_at", freq=freq)])[metric]
+        result = grouped.agg(["mean", "count"]).reset_index()
+        return result.rename(columns={"completed_at": "period"})
+
+analytics_store = AnalyticsStore(
+    path=settings.ANALYTICS_PATH,
+    flush_rows=settings.ANALYTICS_FLUSH_ROWS,
+    flush_interval=settings.ANALYTICS_FLUSH_INTERVAL_SECONDS
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interview analytics export")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("backfill", help="export every stored interview log")
+    subparsers.add_parser("compact", help="merge small part files per partition")
+    query = subparsers.add_parser("query", help="mean score per group and period")
+    query.add_argument("--metric", default="technical_accuracy")
+    query.add_argument("--by", default="role", help="comma-separated columns, e.g. role,category")
+    query.add_argument("--freq", default="W", help="pandas period alias: D, W, MS")
+    query.add_argument("--role")
+    query.add_argument("--since", help="YYYY-MM-DD")
+    query.add_argument("--until", help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        from app.models.interview_log import interview_log
+        started = time.perf_counter()
+        rows = analytics_store.backfill(interview_log.iter_logs())
+        print(f"Exported {rows} answers in {time.perf_counter() - started:.1f}s")
+    elif args.command == "compact":
+        print(analytics_store.compact())
+    else:
+        started = time.perf_counter()
+        result = analytics_store.score_trend(
+            metric=args.metric,
+            by=[c.strip() for c in args.by.split(",")],
+            freq=args.freq,
+            role=args.role,
+            since=args.since,
+            until=args.until
+        )
+        with pd.option_context("display.max_rows", None, "display.width", 160):
+            print(result.to_string(index=False))
+        print(f"\n{len(result)} rows in {time.perf_counter() - started:.2f}s")
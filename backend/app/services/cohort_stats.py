@@ -0,0 +1,336 @@
+﻿"""Cohort percentile ranks per role and score dimension.
+
+Scores are bounded to 0-100, so each (role, dimension) sketch is a fixed
+histogram of BUCKETS counts at 0.5-point resolution. Merging two sketches is
+exact (add the counts), a percentile rank or quantile reads at most BUCKETS
+counts, and a sketch is the same size however many sessions it holds.
+
+Roles are keyed by their slug (see app/utils/roles.py); roles outside
+AVAILABLE_ROLES share the "other" cohort, so free-text roles cannot grow the
+sketches without bound.
+
+Each worker adds completed sessions to its own sketches, and a background
+thread writes them to ``cohort-<writer>.bin`` under COHORT_SKETCH_PATH at most
+every COHORT_PERSIST_SECONDS. Reads merge in the other workers' files,
+reloading them at most every COHORT_REFRESH_SECONDS. Files of stopped workers
+stay in the cohort until compacted.
+
+    python -m app.services.cohort_stats rebuild   # from the interview logs; stop workers first
+    python -m app.services.cohort_stats compact   # merge old workers' files; stop workers first
+    python -m app.services.cohort_stats stats
+"""
+import argparse
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, Optional, Tuple
+from app.core.config import settings
+from app.models.schemas import EvaluationScore
+from app.utils.roles import KNOWN_ROLE_SLUGS, role_slug
+
+DIMENSIONS = [
+    "overall_score", "communication_clarity", "technical_accuracy", "confidence_score", "relevance_score"
+]
+RESOLUTION = 0.5
+BUCKETS = int(100 / RESOLUTION) + 1
+MAGIC = b"CTSK1"
+ENTRY_HEADER = struct.Struct("<HB")  # role length, dimension index
+OTHER_ROLE = "other"
+
+def cohort_key(role: str) -> str:
+    """The cohort a role's sessions are counted in"""
+    slug = role_slug(role)
+    return slug if slug in KNOWN_ROLE_SLUGS else OTHER_ROLE
+
+class ScoreSketch:
+    """Mergeable histogram of 0-100 scores"""
+
+    def __init__(self, counts: Optional[array] = None):
+        self.counts = counts if counts is not None else array("I", bytes(4 * BUCKETS))
+        self.total = sum(self.counts)
+
+    def add(self, score: float):
+        self.counts[round(max(0.0, min(100.0, score)) / RESOLUTION)] += 1
+        self.total += 1
+
+    def merge(self, other: "ScoreSketch"):
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        self.total += other.total
+
+    def copy(self) -> "ScoreSketch":
+        return ScoreSketch(array("I", self.counts))
+
+    def percentile_rank(self, score: float) -> Optional[float]:
+        """Share of the cohort scoring below score, counting ties as half (0-100)"""
+        if not self.total:
+            return None
+        bucket = round(max(0.0, min(100.0, score)) / RESOLUTION)
+        below = sum(self.counts[:bucket])
+        return round(100 * (below + self.counts[bucket] / 2) / self.total, 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.total:
+            return None
+        target = q * (self.total - 1)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen > target:
+                return bucket * RESOLUTION
+        return 100.0
+
+SketchKey = Tuple[str, int]
+
+def normalize_sketches(sketches: Dict[SketchKey, ScoreSketch]) -> Dict[SketchKey, ScoreSketch]:
+    """Re-key sketches by cohort_key, merging roles that map to the same cohort
+    (files written before roles were normalized are keyed by the raw role)"""
+    normalized: Dict[SketchKey, ScoreSketch] = {}
+    for (role, dimension), sketch in sketches.items():
+        key = (cohort_key(role), dimension)
+        if key in normalized:
+            normalized[key].merge(sketch)
+        else:
+            normalized[key] = sketch
+    return normalized
+
+def encode_sketches(sketches: Dict[SketchKey, ScoreSketch]) -> bytes:
+    parts = []
+    for (role, dimension), sketch in sketches.items():
+        role_bytes = role.encode()
+        parts.append(ENTRY_HEADER.pack(len(role_bytes), dimension) + role_bytes + sketch.counts.tobytes())
+    return MAGIC + zlib.compress(b"".join(parts), 6)
+
+def decode_sketches(data: bytes) -> Dict[SketchKey, ScoreSketch]:
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a cohort sketch file")
+    payload = zlib.decompress(data[len(MAGIC):])
+    sketches, offset, counts_size = {}, 0, 4 * BUCKETS
+    while offset < len(payload):
+        role_length, dimension = ENTRY_HEADER.unpack_from(payload, offset)
+        offset += ENTRY_HEADER.size
+        role = payload[offset:offset + role_length].decode()
+        offset += role_length
+        counts = array("I")
+        counts.frombytes(payload[offset:offset + counts_size])
+        offset += counts_size
+        sketches[(role, dimension)] = ScoreSketch(counts)
+    return sketches
+
+class CohortStats:
+
+    def __init__(self, path: str, refresh_interval: float, min_samples: int, persist_interval: float):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.min_samples = min_samples
+        self.persist_interval = persist_interval
+        self._writer_id = f"{time.time_ns()}-{os.getpid()}"
+
+        self._local: Dict[SketchKey, ScoreSketch] = {}
+        self._merged: Dict[SketchKey, ScoreSketch] = {}
+        # filename -> (mtime_ns, sketches) of other workers' files
+        self._others: Dict[str, Tuple[int, Dict[SketchKey, ScoreSketch]]] = {}
+        self._refreshed_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        # Local sketches changed since they were last written
+        self._dirty = False
+        self._writer: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def _own_file(self) -> str:
+        return os.path.join(self.path, f"cohort-{self._writer_id}.bin")
+
+    def _persist(self):
+        self._write(encode_sketches(self._local))
+        self._dirty = False
+
+    def _write(self, data: bytes):
+        tmp_path = f"{self._own_file}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._own_file)
+
+    def _refresh(self, force: bool = False):
+        """Reload other workers' files that changed; caller holds the lock"""
+        if not force and time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        self._refreshed_at = time.monotonic()
+
+        changed = False
+        seen = set()
+        for filepath in glob.glob(os.path.join(self.path, "cohort-*.bin")):
+            if filepath == self._own_file:
+                continue
+            seen.add(filepath)
+            try:
+                mtime = os.stat(filepath).st_mtime_ns
+                if filepath in self._others and self._others[filepath][0] == mtime:
+                    continue
+                with open(filepath, 'rb') as f:
+                    self._others[filepath] = (mtime, normalize_sketches(decode_sketches(f.read())))
+                changed = True
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"Skipping cohort sketch {filepath}: {e}")
+        for filepath in set(self._others) - seen:
+            del self._others[filepath]
+            changed = True
+
+        if changed:
+            merged = {key: sketch.copy() for key, sketch in self._local.items()}
+            for _, sketches in self._others.values():
+                for key, sketch in sketches.items():
+                    if key in merged:
+                        merged[key].merge(sketch)
+                    else:
+                        merged[key] = sketch.copy()
+            self._merged = merged
+            self._generation += 1
+
+    def add_evaluation(self, role: str, evaluation: EvaluationScore):
+        """Count a completed session's scores in its role's cohort; the file is
+        written by the background writer"""
+        key = cohort_key(role)
+        with self._lock:
+            for index, dimension in enumerate(DIMENSIONS):
+                score = getattr(evaluation, dimension)
+                for sketches in (self._local, self._merged):
+                    sketches.setdefault((key, index), ScoreSketch()).add(score)
+            self._generation += 1
+            self._dirty = True
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="cohort-writer", daemon=True)
+                self._writer.start()
+
+    def _save(self):
+        """Write the local sketches if they changed; encoded under the lock, written outside it"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = encode_sketches(self._local)
+            self._dirty = False
+        try:
+            self._write(data)
+        except OSError as e:
+            print(f"Error saving cohort sketches: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def _run_writer(self):
+        while not self._stopping.wait(self.persist_interval):
+            self._save()
+
+    def close(self):
+        """Stop the writer and write out the latest sketches"""
+        self._stopping.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        self._save()
+
+    def compare(self, role: str, evaluation: EvaluationScore) -> Dict:
+        """Percentile rank of each score within the role's cohort. Ranks are None
+        until the cohort has COHORT_MIN_SAMPLES sessions."""
+        key = cohort_key(role)
+        with self._lock:
+            self._refresh()
+            sketches = [self._merged.get((key, index)) for index in range(len(DIMENSIONS))]
+            size = sketches[0].total if sketches[0] is not None else 0
+            ranked = size >= self.min_samples
+            return {
+                "role": role,
+                "cohort": key,
+                "cohort_size": size,
+                "percentiles": {
+                    dimension: sketch.percentile_rank(getattr(evaluation, dimension)) if ranked else None
+                    for dimension, sketch in zip(DIMENSIONS, sketches)
+                },
+                "cohort_median": {
+                    dimension: sketch.quantile(0.5) if ranked else None
+                    for dimension, sketch in zip(DIMENSIONS, sketches)
+                }
+            }
+
+    def generation(self) -> int:
+        """Changes whenever the merged sketches change; part of cached responses' versions"""
+        with self._lock:
+            self._refresh()
+            return self._generation
+
+    def rebuild(self, evaluations: Iterable[Tuple[str, EvaluationScore]]) -> Dict:
+        """Replace every worker's sketches with ones built from evaluations"""
+        with self._lock:
+            for filepath in glob.glob(os.path.join(self.path, "cohort-*.bin")):
+                os.remove(filepath)
+            self._local, self._others = {}, {}
+            sessions = 0
+            for role, evaluation in evaluations:
+                key = cohort_key(role)
+                for index, dimension in enumerate(DIMENSIONS):
+                    self._local.setdefault((key, index), ScoreSketch()).add(getattr(evaluation, dimension))
+                sessions += 1
+            self._persist()
+            self._merged = {key: sketch.copy() for key, sketch in self._local.items()}
+            self._generation += 1
+        return {"sessions": sessions, "sketches": len(self._local)}
+
+    def compact(self) -> Dict:
+        """Merge every worker file (including those of stopped workers) into one"""
+        with self._lock:
+            self._refresh(force=True)
+            files = list(self._others)
+            self._local = {key: sketch.copy() for key, sketch in self._merged.items()}
+            self._persist()
+            for filepath in files:
+                os.remove(filepath)
+            self._others = {}
+        return {"merged_files": len(files), "sketches": len(self._local)}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._refresh(force=True)
+            return {
+                "worker_files": len(self._others) + int(os.path.exists(self._own_file)),
+                "roles": {
+                    role: sketch.total
+                    for (role, index), sketch in sorted(self._merged.items())
+                    if index == 0
+                },
+                "file_bytes": os.path.getsize(self._own_file) if os.path.exists(self._own_file) else 0
+            }
+
+cohort_stats = CohortStats(
+    path=settings.COHORT_SKETCH_PATH,
+    refresh_interval=settings.COHORT_REFRESH_SECONDS,
+    min_samples=settings.COHORT_MIN_SAMPLES,
+    persist_interval=settings.COHORT_PERSIST_SECONDS
+)
+
+def _logged_evaluations():
+    from app.models.interview_log import interview_log
+
+    for log in interview_log.iter_logs():
+        evaluation = log.get("evaluation")
+        if log.get("role") and evaluation:
+            yield log["role"], EvaluationScore.model_validate(evaluation)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cohort percentile sketches")
+    parser.add_argument("command", choices=["rebuild", "compact", "stats"])
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        result = cohort_stats.rebuild(_logged_evaluations())
+    elif args.command == "compact":
+        result = cohort_stats.compact()
+    else:
+        result = cohort_stats.stats()
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,250 @@
+﻿"""Conversational interview mode: each question is generated from the running transcript.
+
+A turn sends the system prompt, the rolling summary and the most recent
+question/answer pairs that fit in CONVERSATION_CONTEXT_TOKENS. The turns older
+than CONVERSATION_RECENT_TURNS are folded into the summary in the background
+while the candidate answers; the next turn picks the new summary up. Each
+summary step only reads the previous summary and the newly folded turns, so
+neither the prompts nor the summary calls grow with the length of the
+interview. Summaries in progress are per worker, like follow-up prefetches.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.models.schemas import (
+    ConversationTurn, InterviewAnswer, InterviewQuestion, InterviewSession, ResumeData
+)
+from app.services.interview_simulator import interview_simulator
+from app.utils.llm_client import llm_client, estimate_tokens
+from app.utils.llm_resilience import CircuitOpenError, llm_degraded
+from app.utils.usage import economy_mode, track_usage
+import contextvars
+import threading
+import time
+import uuid
+
+class _PendingSummary:
+    def __init__(self, start: int, end: int, future: Future):
+        self.start = start
+        self.end = end
+        self.future = future
+
+class ConversationalInterviewer:
+
+    def __init__(self, context_tokens: int, recent_turns: int, summary_max_tokens: int,
+                 question_max_tokens: int, max_workers: int):
+        self.context_tokens = context_tokens
+        self.recent_turns = recent_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.question_max_tokens = question_max_tokens
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="conversation")
+        self._pending: Dict[str, _PendingSummary] = {}
+        self._lock = threading.Lock()
+
+        self._counters = {
+            "turns": 0,
+            "summaries_scheduled": 0,
+            "summaries_applied": 0,
+            "summaries_stale": 0,
+            "summaries_failed": 0,
+            "trimmed_turns": 0
+        }
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    @staticmethod
+    def transcript(session: InterviewSession) -> List[Tuple[InterviewQuestion, Optional[InterviewAnswer]]]:
+        answers = {a.question_id: a for a in session.answers}
+        return [(q, answers.get(q.question_id)) for q in session.questions]
+
+    @staticmethod
+    def _system_prompt(role: str, resume_data: ResumeData, max_questions: int) -> str:
+        projects = ', '.join(p.get('name', '') for p in resume_data.projects[:3])
+        return f"""You are interviewing a candidate for a {role} position, one question at a time.
+Candidate skills: {', '.join(resume_data.skills[:15])}
+Recent projects: {projects}
+
+Build on what the candidate has already said: probe vague claims, ask for specifics
+and move on to new areas once a topic is covered. Mix HR, technical and behavioral
+questions over the {max_questions} questions of the interview.
+Reply with ONLY the next question, without any preamble."""
+
+    @staticmethod
+    def _turn_messages(question: InterviewQuestion, answer: Optional[InterviewAnswer]) -> List[Dict]:
+        messages = [{"role": "assistant", "content": question.question}]
+        if answer is not None:
+            messages.append({"role": "user", "content": answer.answer})
+        return messages
+
+    def build_messages(self, session: InterviewSession, resume_data: ResumeData) -> Tuple[List[Dict], int]:
+        """Chat messages for the next question and their estimated token count"""
+        state = session.conversation
+        messages = [{
+            "role": "system",
+            "content": self._system_prompt(session.role, resume_data, state.max_questions)
+        }]
+        budget = self.context_tokens
+        if state.summary:
+            messages.append({"role": "system", "content": f"Notes on the interview so far:\n{state.summary}"})
+            budget -= estimate_tokens(state.summary)
+
+        # Newest turns first; the latest answer is always sent
+        recent: List[Dict] = []
+        unsummarized = self.transcript(session)[state.summarized_turns:]
+        for position, (question, answer) in enumerate(reversed(unsummarized)):
+            turn = self._turn_messages(question, answer)
+            cost = sum(estimate_tokens(m["content"]) for m in turn)
+            if recent and cost > budget:
+                # The summary of these turns is still being written
+                self._count("trimmed_turns", len(unsummarized) - position)
+                break
+            recent = turn + recent
+            budget -= cost
+
+        messages.extend(recent)
+        if not recent:
+            messages.append({"role": "user", "content": "I'm ready to start the interview."})
+        return messages, sum(estimate_tokens(m["content"]) for m in messages)
+
+    def _template_question(self, session: InterviewSession, resume_data: ResumeData) -> str:
+        templates = [t for category in ("hr", "technical", "behavioral")
+                     for t in interview_simulator.question_templates[category]]
+        skill = resume_data.skills[0] if resume_data.skills else "the technology you use most"
+        return templates[len(session.questions) % len(templates)].replace("[specific technology]", skill)
+
+    def next_question(self, session: InterviewSession, resume_data: ResumeData) -> Tuple[InterviewQuestion, ConversationTurn]:
+        """Generate the next question, append it to the session and record the turn"""
+        state = session.conversation
+        self._apply_summary(session)
+
+        started = time.perf_counter()
+        context_tokens = 0
+        with track_usage(session.candidate_id, session) as scope:
+            if economy_mode() or llm_degraded("conversation"):
+                text = self._template_question(session, resume_data)
+            else:
+                messages, context_tokens = self.build_messages(session, resume_data)
+                try:
+                    text = llm_client.chat_completion(
+                        messages, temperature=0.7, max_tokens=self.question_max_tokens, task="question_gen"
+                    ).strip().strip('"')
+                except CircuitOpenError:
+                    text = self._template_question(session, resume_data)
+                if not text:
+                    text = "Can you elaborate on that point?"
+
+            question = InterviewQuestion(
+                question_id=str(uuid.uuid4()),
+                question=text,
+                category="conversational",
+                difficulty="medium"
+            )
+            turn = ConversationTurn(
+                question_id=question.question_id,
+                latency_ms=round((time.perf_counter() - started) * 1000, 2),
+                prompt_tokens=scope.usage.prompt_tokens,
+                completion_tokens=scope.usage.completion_tokens,
+                context_tokens=context_tokens,
+                summarized_turns=state.summarized_turns
+            )
+            session.questions.append(question)
+            state.turns.append(turn)
+            self._count("turns")
+
+            # Inside the scope so the summary's tokens count towards the candidate's daily budget;
+            # after the last question no further turn would read it
+            if len(session.questions) < state.max_questions:
+                self._schedule_summary(session)
+        return question, turn
+
+    # ---- rolling summary ---------------------------------------------------
+
+    def _summarize(self, previous: str, turns: List[Tuple[InterviewQuestion, InterviewAnswer]], role: str) -> Optional[str]:
+        if economy_mode():
+            return None
+        exchanges = "\n\n".join(f"Q: {q.question}\nA: {a.answer}" for q, a in turns)
+        prompt = f"""Update the interviewer's notes on a {role} interview with the new exchanges.
+Keep what is useful for later questions: the candidate's experience, skills and
+claims, examples they gave, strengths, weak or vague answers and topics already
+covered. Drop pleasantries. Stay under {self.summary_max_tokens * 3 // 4} words.
+
+Current notes:
+{previous or "(none yet)"}
+
+New exchanges:
+{exchanges}
+
+Return only the updated notes."""
+        return llm_client.chat_completion(
+            [{"role": "user", "content": prompt}], temperature=0.3, max_tokens=self.summary_max_tokens,
+            task="summary"
+        ).strip()
+
+    def _schedule_summary(self, session: InterviewSession):
+        """Fold answered turns older than the recent ones into the summary in the background"""
+        state = session.conversation
+        answered = [(q, a) for q, a in self.transcript(session) if a is not None]
+        end = len(answered) - self.recent_turns
+        if end <= state.summarized_turns:
+            return
+
+        with self._lock:
+            pending = self._pending.get(session.session_id)
+            if pending is not None:
+                if pending.start == state.summarized_turns:
+                    return  # not adopted yet; the turns after it are folded next time
+                pending.future.cancel()
+            # Run in a copy of the caller's context so usage is attributed to the candidate
+            future = self._executor.submit(
+                contextvars.copy_context().run,
+                self._summarize,
+                state.summary,
+                answered[state.summarized_turns:end],
+                session.role
+            )
+            self._pending[session.session_id] = _PendingSummary(state.summarized_turns, end, future)
+            self._counters["summaries_scheduled"] += 1
+
+    def _apply_summary(self, session: InterviewSession):
+        """Adopt a finished background summary; never waits for one still running"""
+        state = session.conversation
+        with self._lock:
+            pending = self._pending.get(session.session_id)
+            if pending is None or not pending.future.done():
+                return
+            del self._pending[session.session_id]
+
+        if pending.start != state.summarized_turns:
+            self._count("summaries_stale")
+            return
+        try:
+            summary = pending.future.result()
+        except Exception as e:
+            print(f"Conversation summary failed: {e}")
+            self._count("summaries_failed")
+            return
+        if summary:
+            state.summary = summary
+            state.summarized_turns = pending.end
+            self._count("summaries_applied")
+
+    def discard_session(self, session_id: str):
+        with self._lock:
+            pending = self._pending.pop(session_id, None)
+        if pending is not None:
+            pending.future.cancel()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"pending_summaries": len(self._pending), **self._counters}
+
+conversational_interviewer = ConversationalInterviewer(
+    context_tokens=settings.CONVERSATION_CONTEXT_TOKENS,
+    recent_turns=settings.CONVERSATION_RECENT_TURNS,
+    summary_max_tokens=settings.CONVERSATION_SUMMARY_MAX_TOKENS,
+    question_max_tokens=settings.CONVERSATION_QUESTION_MAX_TOKENS,
+    max_workers=settings.CONVERSATION_SUMMARY_WORKERS
+)
@@ -1,15 +1,61 @@
-﻿from typing import List, Dict
-from app.models.schemas import InterviewAnswer, EvaluationScore, ResumeData
-from app.utils.llm_client import llm_client
-import json
-import numpy as np
+﻿from typing import List, Dict, Optional
+from app.models.schemas import AnswerScores, InterviewAnswer, EvaluationScore, ResumeData
+from app.utils.llm_resilience import CircuitOpenError, llm_degraded
+from app.utils.structured_output import structured_output, StructuredOutputError
+from app.utils.usage import economy_mode
+import re
+from statistics import fmean
+
+# Bump when the evaluation prompt or weights change; logs and re-grades are tagged with it
+SCORING_VERSION = "1"
+
+HEDGES = ("maybe", "i think", "not sure", "i guess", "probably", "kind of", "sort of")
+STRUCTURE_MARKERS = ("for example", "first", "then", "finally", "because", "as a result", "the result")
 
 class EvaluationEngine:
     
     def evaluate_answer(self, answer: InterviewAnswer, resume_data: ResumeData, 
-                       role: str) -> Dict[str, float]:
-        """Evaluate a single interview answer"""
-        
+                       role: str, strict: bool = False) -> Dict[str, float]:
+        """Evaluate a single interview answer. With strict, a failed or skipped LLM
+        call raises (CircuitOpenError, StructuredOutputError) instead of returning
+        heuristic or default scores."""
+        
+        if strict:
+            if llm_degraded("answer_score"):
+                raise CircuitOpenError("LLM backend circuit is open")
+        elif economy_mode() or llm_degraded("answer_score"):
+            return self.heuristic_scores(answer, resume_data)
+        
+        system_message, prompt = self.answer_prompt(answer, resume_data, role)
+        try:
+            # Scores are clamped to 0-100 by the schema
+            return structured_output.generate_object(
+                "answer_score",
+                AnswerScores,
+                prompt=prompt,
+                system_message=system_message,
+                temperature=0.3,
+                task="answer_eval"
+            ).model_dump()
+            
+        except CircuitOpenError:
+            if strict:
+                raise
+            return self.heuristic_scores(answer, resume_data)
+        except StructuredOutputError as e:
+            if strict:
+                raise
+            print(f"Error parsing evaluation: {e}")
+            # Return default scores
+            return {
+                "communication_clarity": 50.0,
+                "technical_accuracy": 50.0,
+                "confidence": 50.0,
+                "relevance": 50.0
+            }
+    
+    def answer_prompt(self, answer: InterviewAnswer, resume_data: ResumeData, role: str):
+        """(system message, prompt) sent to score one answer"""
         system_message = """You are an expert technical interviewer and HR professional. 
         Evaluate interview answers on these criteria (0-100 scale):
         1. communication_clarity: How clear and well-structured is the answer?
@@ -29,44 +75,38 @@ Candidate Background: {', '.join(resume_data.skills[:10])}
 
 Return JSON with scores (0-100):
 {{"communication_clarity": 0, "technical_accuracy": 0, "confidence": 0, "relevance": 0}}"""
-        
-        response = llm_client.generate_completion(
-            prompt=prompt,
-            system_message=system_message,
-            temperature=0.3
-        )
-        
-        try:
-            # Clean and parse response
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]
-            if clean_response.startswith('```'):
-                clean_response = clean_response[3:]
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]
-            
-            scores = json.loads(clean_response.strip())
-            
-            # Ensure all scores are within 0-100
-            for key in scores:
-                scores[key] = max(0, min(100, float(scores[key])))
-            
-            return scores
-            
-        except Exception as e:
-            print(f"Error parsing evaluation: {e}")
-            # Return default scores
-            return {
-                "communication_clarity": 50.0,
-                "technical_accuracy": 50.0,
-                "confidence": 50.0,
-                "relevance": 50.0
-            }
+        return system_message, prompt
+    
+    def heuristic_scores(self, answer: InterviewAnswer, resume_data: ResumeData) -> Dict[str, float]:
+        """Score an answer without the LLM from its length, overlap with the question,
+        structure, concrete detail and hedging"""
+        text = answer.answer.lower()
+        words = re.findall(r"[a-z0-9+#]+", text)
+        if not words:
+            return {"communication_clarity": 0.0, "technical_accuracy": 0.0, "confidence": 0.0, "relevance": 0.0}
+        
+        fullness = min(1.0, len(words) / 120)  # about two minutes of speech
+        question_words = {w for w in re.findall(r"[a-z0-9+#]+", answer.question.lower()) if len(w) > 3}
+        overlap = len(question_words & set(words)) / len(question_words) if question_words else 0.5
+        skill_mentions = sum(1 for skill in resume_data.skills if skill.lower() in text)
+        structured = any(marker in text for marker in STRUCTURE_MARKERS)
+        concrete = bool(re.search(r"\d", text))
+        hedges = sum(text.count(hedge) for hedge in HEDGES)
+        
+        scores = {
+            "communication_clarity": 40 + 35 * fullness + (15 if structured else 0),
+            "technical_accuracy": 35 + 25 * fullness + min(25, 8 * skill_mentions) + (10 if concrete else 0),
+            "confidence": 55 + 25 * fullness - min(30, 10 * hedges),
+            "relevance": 40 + 45 * overlap + 10 * fullness
+        }
+        return {key: round(max(0.0, min(100.0, value)), 1) for key, value in scores.items()}
     
     def evaluate_session(self, answers: List[InterviewAnswer], resume_data: ResumeData, 
-                        role: str) -> EvaluationScore:
-        """Evaluate entire interview session"""
+                        role: str, scored: Optional[Dict[str, Dict[str, float]]] = None,
+                        strict: bool = False) -> EvaluationScore:
+        """Evaluate entire interview session; scored holds answers already scored
+        (by question_id), which are not sent to the LLM again. strict is passed
+        to evaluate_answer."""
         
         if not answers:
             return EvaluationScore(
@@ -79,16 +119,20 @@ Return JSON with scores (0-100):
         
         # Evaluate each answer
         all_scores = []
+        answer_scores = {}
         for answer in answers:
-            scores = self.evaluate_answer(answer, resume_data, role)
+            scores = scored.get(answer.question_id) if scored else None
+            if scores is None:
+                scores = self.evaluate_answer(answer, resume_data, role, strict=strict)
             all_scores.append(scores)
+            answer_scores[answer.question_id] = scores
         
         # Calculate averages
         avg_scores = {
-            'communication_clarity': np.mean([s['communication_clarity'] for s in all_scores]),
-            'technical_accuracy': np.mean([s['technical_accuracy'] for s in all_scores]),
-            'confidence': np.mean([s['confidence'] for s in all_scores]),
-            'relevance': np.mean([s['relevance'] for s in all_scores])
+            'communication_clarity': fmean([s['communication_clarity'] for s in all_scores]),
+            'technical_accuracy': fmean([s['technical_accuracy'] for s in all_scores]),
+            'confidence': fmean([s['confidence'] for s in all_scores]),
+            'relevance': fmean([s['relevance'] for s in all_scores])
         }
         
         # Calculate overall score (weighted average)
@@ -104,7 +148,8 @@ Return JSON with scores (0-100):
             technical_accuracy=round(avg_scores['technical_accuracy'], 2),
             confidence_score=round(avg_scores['confidence'], 2),
             relevance_score=round(avg_scores['relevance'], 2),
-            overall_score=round(overall, 2)
+            overall_score=round(overall, 2),
+            answer_scores=answer_scores
         )
     
     def calculate_role_readiness(self, evaluation: EvaluationScore, 
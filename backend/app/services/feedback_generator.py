@@ -1,25 +1,192 @@
-﻿from typing import List, Dict
+﻿"""Interview feedback, generated map-reduce style.
+
+Map: each answer gets a short critique, started in the background when the
+answer is submitted and cached by a hash of role, question and answer.
+Reduce: one compact call turns the critiques and the EvaluationScore into the
+FeedbackReport. A reduce that fails even after structured-output repair is
+retried on its own; the critiques are kept. While the LLM circuit is open the
+default feedback is returned without retrying.
+
+Critiques in progress and cached are per worker; completing a session on a
+worker that did not see its answers computes the missing ones concurrently.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import List, Dict, Optional
+from app.models.hot_cache import HotCache
 from app.models.schemas import (
-    InterviewAnswer, EvaluationScore, FeedbackReport, 
+    AnswerCritique, InterviewAnswer, EvaluationScore, FeedbackContent, FeedbackReport, 
     ResumeData
 )
-from app.utils.llm_client import llm_client
+from app.utils.llm_resilience import CircuitOpenError, llm_degraded
+from app.utils.serialization import dumps, loads, to_data
+from app.utils.structured_output import structured_output
+from app.core.config import settings
+from app.utils.usage import budget_exhausted, economy_mode
 from datetime import datetime
-import json
+import contextvars
+import hashlib
+import threading
 
 class FeedbackGenerator:
     
+    def __init__(self, critique_max_tokens: int, cache_max_bytes: int, excerpt_chars: int,
+                 reduce_attempts: int, max_workers: int):
+        self.critique_max_tokens = critique_max_tokens
+        self.excerpt_chars = excerpt_chars
+        self.reduce_attempts = reduce_attempts
+        
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="critique")
+        self._critiques = HotCache(
+            "critiques", cache_max_bytes,
+            lambda critique: dumps(to_data(critique)),
+            lambda data: AnswerCritique.model_validate(loads(data))
+        )
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        
+        self._counters = {
+            "critiques_scheduled": 0,
+            "critiques_cached": 0,
+            "critiques_awaited": 0,
+            "critiques_on_demand": 0,
+            "critique_failures": 0,
+            "reduce_retries": 0,
+            "reduce_failures": 0
+        }
+    
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+    
+    @staticmethod
+    def critique_key(answer: InterviewAnswer, role: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (role, answer.question, answer.answer.strip()):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    # ---- map ---------------------------------------------------------------
+    
+    def _critique(self, answer: InterviewAnswer, role: str) -> AnswerCritique:
+        prompt = f"""Critique this answer from a {role} interview.
+
+Question: {answer.question}
+Answer: {answer.answer}
+
+Respond with JSON only:
+{{
+  "summary": "one or two sentences on what the candidate said",
+  "strengths": ["what was good, if anything"],
+  "weaknesses": ["what was missing or weak, if anything"]
+}}"""
+        return structured_output.generate_object(
+            "answer_critique",
+            AnswerCritique,
+            prompt=prompt,
+            system_message="You are a senior technical interviewer writing concise notes.",
+            temperature=0.3,
+            max_tokens=self.critique_max_tokens,
+            task="answer_eval"
+        )
+    
+    def _run_critique(self, key: str, answer: InterviewAnswer, role: str) -> AnswerCritique:
+        try:
+            critique = self._critique(answer, role)
+            self._critiques.put(key, critique)
+            return critique
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+    
+    def _submit(self, key: str, answer: InterviewAnswer, role: str) -> Future:
+        """Start a critique unless one is running for key; caller holds the lock"""
+        future = self._pending.get(key)
+        if future is None:
+            # Run in a copy of the caller's context so usage is attributed to the candidate
+            future = self._executor.submit(
+                contextvars.copy_context().run, self._run_critique, key, answer, role
+            )
+            self._pending[key] = future
+        return future
+    
+    def schedule_critique(self, answer: InterviewAnswer, role: str) -> bool:
+        """Critique a submitted answer in the background. Returns True when a
+        critique is cached or running."""
+        if economy_mode() or not answer.answer.strip() or llm_degraded("answer_critique"):
+            return False
+        key = self.critique_key(answer, role)
+        if self._critiques.get(key) is not None:
+            return True
+        with self._lock:
+            if key not in self._pending:
+                self._counters["critiques_scheduled"] += 1
+            self._submit(key, answer, role)
+        return True
+    
+    def collect_critiques(self, answers: List[InterviewAnswer], role: str) -> List[Optional[AnswerCritique]]:
+        """Critiques of all answers: cached, awaited if running, or computed now
+        concurrently. None where a critique failed or economy mode skipped it."""
+        critiques: List[Optional[AnswerCritique]] = [None] * len(answers)
+        futures: Dict[int, Future] = {}
+        for index, answer in enumerate(answers):
+            if not answer.answer.strip():
+                continue
+            key = self.critique_key(answer, role)
+            cached = self._critiques.get(key)
+            if cached is not None:
+                critiques[index] = cached
+                self._count("critiques_cached")
+                continue
+            with self._lock:
+                if key in self._pending:
+                    self._counters["critiques_awaited"] += 1
+                elif economy_mode():
+                    continue
+                else:
+                    self._counters["critiques_on_demand"] += 1
+                futures[index] = self._submit(key, answer, role)
+        
+        wait(list(futures.values()))
+        for index, future in futures.items():
+            try:
+                critiques[index] = future.result()
+            except Exception as e:
+                print(f"Error critiquing answer: {e}")
+                self._count("critique_failures")
+        return critiques
+    
+    # ---- reduce ------------------------------------------------------------
+    
+    def _answer_notes(self, answers: List[InterviewAnswer],
+                      critiques: List[Optional[AnswerCritique]]) -> str:
+        notes = []
+        for index, (answer, critique) in enumerate(zip(answers, critiques), 1):
+            lines = [f"{index}. [{answer.category}] {answer.question}"]
+            if critique is not None:
+                lines.append(f"   Summary: {critique.summary}")
+                if critique.strengths:
+                    lines.append(f"   Strong: {'; '.join(critique.strengths)}")
+                if critique.weaknesses:
+                    lines.append(f"   Weak: {'; '.join(critique.weaknesses)}")
+            else:
+                excerpt = answer.answer.strip()
+                if len(excerpt) > self.excerpt_chars:
+                    excerpt = excerpt[:self.excerpt_chars].rsplit(' ', 1)[0] + " ..."
+                lines.append(f"   Answer: {excerpt}")
+            notes.append("\n".join(lines))
+        return "\n\n".join(notes)
+    
     def generate_comprehensive_feedback(self, candidate_id: str, role: str,
                                        answers: List[InterviewAnswer],
                                        evaluation: EvaluationScore,
                                        resume_data: ResumeData) -> FeedbackReport:
         """Generate detailed feedback report"""
         
-        # Prepare context
-        answers_text = "\n\n".join([
-            f"Q: {a.question}\nA: {a.answer}"
-            for a in answers
-        ])
+        if budget_exhausted() or llm_degraded("feedback"):
+            return self._generate_default_feedback(candidate_id, role, evaluation, resume_data)
+        
+        critiques = self.collect_critiques(answers, role)
         
         system_message = """You are a senior career coach and technical interviewer.
         Provide constructive, actionable feedback for job candidates."""
@@ -37,8 +204,8 @@ Scores:
 
 Candidate Skills: {', '.join(resume_data.skills[:15])}
 
-Interview Answers:
-{answers_text}
+Interviewer notes per answer:
+{self._answer_notes(answers, critiques)}
 
 Provide feedback as JSON:
 {{
@@ -55,43 +222,45 @@ Provide feedback as JSON:
 
 Be specific, constructive, and actionable."""
         
-        response = llm_client.generate_completion(
-            prompt=prompt,
-            system_message=system_message,
-            temperature=0.7,
-            max_tokens=2000
-        )
+        max_tokens = 2000
+        if economy_mode():
+            prompt += " Keep every list to two short items."
+            max_tokens = settings.LLM_ECONOMY_MAX_TOKENS
         
-        # Parse response
-        try:
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]
-            if clean_response.startswith('```'):
-                clean_response = clean_response[3:]
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]
-            
-            feedback_data = json.loads(clean_response.strip())
-            
-            return FeedbackReport(
-                candidate_id=candidate_id,
-                timestamp=datetime.now(),
-                role=role,
-                evaluation=evaluation,
-                strengths=feedback_data.get('strengths', []),
-                weaknesses=feedback_data.get('weaknesses', []),
-                skill_gaps=feedback_data.get('skill_gaps', []),
-                recommendations=feedback_data.get('recommendations', []),
-                improvement_roadmap=feedback_data.get('improvement_roadmap', {})
-            )
-            
-        except Exception as e:
-            print(f"Error parsing feedback: {e}")
-            # Return default feedback
-            return self._generate_default_feedback(
-                candidate_id, role, evaluation, resume_data
-            )
+        # Only the reduce step is retried; the critiques above are reused
+        for attempt in range(1, self.reduce_attempts + 1):
+            try:
+                content = structured_output.generate_object(
+                    "feedback",
+                    FeedbackContent,
+                    prompt=prompt,
+                    system_message=system_message,
+                    temperature=0.7,
+                    max_tokens=max_tokens,
+                    task="feedback"
+                )
+                
+                return FeedbackReport(
+                    candidate_id=candidate_id,
+                    timestamp=datetime.now(),
+                    role=role,
+                    evaluation=evaluation,
+                    **content.model_dump()
+                )
+                
+            except CircuitOpenError:
+                # Every retry would be rejected too
+                break
+            except Exception as e:
+                print(f"Error generating feedback (attempt {attempt}): {e}")
+                if attempt < self.reduce_attempts:
+                    self._count("reduce_retries")
+        
+        self._count("reduce_failures")
+        # Return default feedback
+        return self._generate_default_feedback(
+            candidate_id, role, evaluation, resume_data
+        )
     
     def _generate_default_feedback(self, candidate_id: str, role: str,
                                    evaluation: EvaluationScore,
@@ -161,4 +330,16 @@ Be specific, constructive, and actionable."""
             "trend": "improving" if improvement > 0 else "declining" if improvement < 0 else "stable"
         }
 
-feedback_generator = FeedbackGenerator()
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            pending = len(self._pending)
+        return {"pending_critiques": pending, **counters, "cache": self._critiques.stats()}
+
+feedback_generator = FeedbackGenerator(
+    critique_max_tokens=settings.FEEDBACK_CRITIQUE_MAX_TOKENS,
+    cache_max_bytes=settings.FEEDBACK_CRITIQUE_CACHE_MAX_BYTES,
+    excerpt_chars=settings.FEEDBACK_EXCERPT_CHARS,
+    reduce_attempts=settings.FEEDBACK_REDUCE_ATTEMPTS,
+    max_workers=settings.FEEDBACK_CRITIQUE_WORKERS
+)
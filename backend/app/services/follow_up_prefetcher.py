@@ -0,0 +1,149 @@
+﻿from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Tuple
+from app.core.config import settings
+from app.models.schemas import InterviewQuestion
+from app.services.interview_simulator import interview_simulator
+import contextvars
+import re
+import threading
+
+class _Prefetch:
+    def __init__(self, snapshot: str, future: Future, attempts: int):
+        self.generated_from = snapshot  # the draft the follow-up is generated from
+        self.snapshot = snapshot  # the latest draft that still continues it
+        self.future = future
+        self.attempts = attempts
+
+class FollowUpPrefetcher:
+    """Speculatively generates follow-up questions from partial-answer snapshots"""
+
+    def __init__(self, min_chars: int, reuse_similarity: float, max_prefetches: int,
+                 max_entries: int, max_workers: int):
+        self.min_chars = min_chars
+        self.reuse_similarity = reuse_similarity
+        self.max_prefetches = max_prefetches
+        self.max_entries = max_entries
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="follow-up")
+        self._entries: "OrderedDict[Tuple[str, str], _Prefetch]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._counters = {
+            "snapshots": 0,
+            "prefetches": 0,
+            "reused": 0,
+            "stale_discarded": 0,
+            "generated_on_demand": 0
+        }
+
+    @staticmethod
+    def containment(earlier: str, later: str) -> float:
+        """Share of the words of earlier that are still in later; a draft that only
+        grew keeps 1.0, however much was added"""
+        words_earlier = set(re.findall(r"\w+", earlier.lower()))
+        words_later = set(re.findall(r"\w+", later.lower()))
+        if not words_earlier:
+            return 1.0
+        return len(words_earlier & words_later) / len(words_earlier)
+
+    @staticmethod
+    def _context(role: str, question: str) -> str:
+        return f"Role: {role}\nQuestion: {question}"
+
+    def snapshot(self, session_id: str, question_id: str, question: str,
+                 role: str, partial_answer: str) -> bool:
+        """Record a partial answer and prefetch a follow-up if the draft moved on. Returns
+        True when a prefetch for the current draft is running or ready.
+
+        A draft that continues the latest snapshot keeps the prefetch and becomes
+        the new snapshot. It is prefetched again, while attempts remain, once the
+        prefetch's own draft covers too little of it."""
+        partial_answer = partial_answer.strip()
+        if len(partial_answer) < self.min_chars:
+            return False
+
+        key = (session_id, question_id)
+        with self._lock:
+            self._counters["snapshots"] += 1
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                continues = self.containment(entry.snapshot, partial_answer) >= self.reuse_similarity
+                covered = self.containment(partial_answer, entry.generated_from) >= self.reuse_similarity
+                if continues and (covered or entry.attempts >= self.max_prefetches):
+                    entry.snapshot = partial_answer
+                    return True
+                if entry.attempts >= self.max_prefetches:
+                    return False
+                entry.future.cancel()
+
+            # Run in a copy of the caller's context so usage and spans are attributed to it
+            future = self._executor.submit(
+                contextvars.copy_context().run,
+                interview_simulator.adaptive_follow_up,
+                partial_answer,
+                self._context(role, question)
+            )
+            attempts = entry.attempts + 1 if entry is not None else 1
+
+            self._entries[key] = _Prefetch(partial_answer, future, attempts)
+            self._entries.move_to_end(key)
+            self._counters["prefetches"] += 1
+
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.future.cancel()
+
+        return True
+
+    def resolve(self, session_id: str, question_id: str, question: str,
+                role: str, final_answer: str) -> InterviewQuestion:
+        """Return the follow-up for a submitted answer, reusing the prefetch when the
+        final answer continues the latest snapshot"""
+        with self._lock:
+            entry = self._entries.pop((session_id, question_id), None)
+
+        if entry is not None:
+            if self.containment(entry.snapshot, final_answer) >= self.reuse_similarity:
+                try:
+                    follow_up = entry.future.result()
+                    with self._lock:
+                        self._counters["reused"] += 1
+                    return follow_up
+                except Exception as e:
+                    print(f"Prefetched follow-up failed: {e}")
+            else:
+                entry.future.cancel()
+                with self._lock:
+                    self._counters["stale_discarded"] += 1
+
+        with self._lock:
+            self._counters["generated_on_demand"] += 1
+        return interview_simulator.adaptive_follow_up(
+            final_answer, self._context(role, question)
+        )
+
+    def discard_session(self, session_id: str):
+        """Drop any outstanding prefetches for a session"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == session_id]:
+                self._entries.pop(key).future.cancel()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            served = counters["reused"] + counters["generated_on_demand"]
+            return {
+                "entries": len(self._entries),
+                **counters,
+                "reuse_rate": round(counters["reused"] / served, 4) if served else 0.0
+            }
+
+follow_up_prefetcher = FollowUpPrefetcher(
+    min_chars=settings.FOLLOW_UP_PREFETCH_MIN_CHARS,
+    reuse_similarity=settings.FOLLOW_UP_REUSE_SIMILARITY,
+    max_prefetches=settings.FOLLOW_UP_MAX_PREFETCHES,
+    max_entries=settings.FOLLOW_UP_MAX_ENTRIES,
+    max_workers=settings.FOLLOW_UP_PREFETCH_WORKERS
+)
@@ -0,0 +1,260 @@
+﻿"""Live interview channel: one WebSocket per session instead of per-answer POSTs.
+
+Every message is a JSON object with a "type".
+
+Client to server:
+    {"type": "answer", "question_id": ..., "answer": ..., "idempotency_key": ...}
+    {"type": "complete"}
+
+Server to client:
+    session            on connect: role, total and the ids of answered questions
+    question           every unanswered question on connect, and each
+                       conversational question as soon as it is generated
+    answer_ack         an answer was stored; a resent idempotency key (or the same
+                       answer to an answered question) gets the same ack with
+                       "duplicate": true instead of storing it again
+    provisional_score  the scores of one answer, computed in the background
+    report             the /api/interview/complete response; the socket is then closed
+    error              {"status": 400/404/409/500, "detail": ...}
+
+While the socket is open the session's questions and answers are held in dicts
+keyed by question_id. Provisional scores are reused by the final evaluation, so
+completing over the socket only scores answers that were not scored yet.
+"""
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from app.models.repository import repository
+from app.models.schemas import InterviewAnswer, InterviewQuestion, InterviewSession, LLMUsage, ResumeData
+from app.services.conversation import conversational_interviewer
+from app.services.evaluation_engine import evaluation_engine
+from app.services.feedback_generator import feedback_generator
+from app.utils.serialization import dumps, loads, to_data
+from app.utils.usage import track_usage
+
+CompleteSession = Callable[[InterviewSession, Dict[str, Dict[str, float]]], Awaitable[Dict]]
+
+# Close codes in the application range
+CLOSE_REPLACED = 4000
+CLOSE_NOT_FOUND = 4404
+
+def _question_message(question: InterviewQuestion, **extra) -> Dict:
+    return {
+        "type": "question",
+        "question": to_data(question, include=["question_id", "question", "category", "difficulty"]),
+        **extra
+    }
+
+class InterviewChannel:
+
+    def __init__(self, websocket: WebSocket, session: InterviewSession, resume_data: ResumeData,
+                 complete: CompleteSession):
+        self.websocket = websocket
+        self.session = session
+        self.resume_data = resume_data
+        self.complete = complete
+
+        self.questions: Dict[str, InterviewQuestion] = {q.question_id: q for q in session.questions}
+        self.answers: Dict[str, InterviewAnswer] = {a.question_id: a for a in session.answers}
+        self.acks: Dict[str, Dict] = {}  # idempotency key -> ack
+        self.scores: Dict[str, Dict[str, float]] = {}
+        self.scoring: Dict[str, asyncio.Task] = {}
+        self.usage = LLMUsage()  # of provisional scoring, added to the session on completion
+        self._send_lock = asyncio.Lock()
+
+    @property
+    def total(self) -> int:
+        if self.session.conversation is not None:
+            return self.session.conversation.max_questions
+        return len(self.questions)
+
+    async def send(self, message: Dict):
+        async with self._send_lock:
+            await self.websocket.send_text(dumps(message).decode())
+
+    async def error(self, status: int, detail: str, **extra):
+        await self.send({"type": "error", "status": status, "detail": detail, **extra})
+
+    async def run(self):
+        await self.send({
+            "type": "session",
+            "session_id": self.session.session_id,
+            "role": self.session.role,
+            "status": self.session.status,
+            "total": self.total,
+            "answered": list(self.answers)
+        })
+        for question in self.session.questions:
+            if question.question_id not in self.answers:
+                await self.send(_question_message(question))
+
+        try:
+            while True:
+                try:
+                    message = loads(await self.websocket.receive_text())
+                except ValueError:
+                    await self.error(400, "Messages must be JSON")
+                    continue
+                kind = message.get("type") if isinstance(message, dict) else None
+                if kind == "answer":
+                    await self.on_answer(message)
+                elif kind == "complete":
+                    if await self.on_complete():
+                        await self.websocket.close()
+                        return
+                else:
+                    await self.error(400, "Unknown message type")
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # RuntimeError: closed by a newer channel for the session
+        finally:
+            for task in self.scoring.values():
+                task.cancel()
+
+    async def on_answer(self, message: Dict):
+        key = message.get("idempotency_key")
+        question_id = message.get("question_id")
+        text = message.get("answer")
+        if not key or not question_id or not isinstance(text, str):
+            await self.error(400, "answer needs question_id, answer and idempotency_key", idempotency_key=key)
+            return
+
+        if key in self.acks:
+            await self.send({**self.acks[key], "duplicate": True})
+            return
+        question = self.questions.get(question_id)
+        if question is None:
+            await self.error(404, "Question not found", idempotency_key=key)
+            return
+        if self.session.status == "completed":
+            await self.error(400, "Interview already completed", idempotency_key=key)
+            return
+
+        existing = self.answers.get(question_id)
+        if existing is not None:
+            if existing.answer != text:
+                await self.error(409, "Question already answered", idempotency_key=key)
+                return
+            # Resent after a reconnect, when the first ack was lost with the old socket
+            ack = self._ack(key, question_id, len(self.answers))
+            await self.send({**ack, "duplicate": True})
+            return
+
+        answer = InterviewAnswer(
+            question_id=question_id,
+            question=question.question,
+            answer=text,
+            category=question.category
+        )
+        answered = await run_in_threadpool(repository.add_answer, self.session.session_id, answer)
+        # The memory backend appends to the same session object
+        if len(self.session.answers) < answered:
+            self.session.answers.append(answer)
+        self.answers[question_id] = answer
+
+        await self.send({**self._ack(key, question_id, answered), "duplicate": False})
+
+        # The critique finishes after this message; it counts towards the daily budget only
+        with track_usage(self.session.candidate_id):
+            feedback_generator.schedule_critique(answer, self.session.role)
+        self.scoring[question_id] = asyncio.create_task(self._score(answer))
+
+        conversation = self.session.conversation
+        if conversation is not None and answered < conversation.max_questions:
+            await self._next_question()
+
+    def _ack(self, key: str, question_id: str, answered: int) -> Dict:
+        ack = {
+            "type": "answer_ack",
+            "question_id": question_id,
+            "idempotency_key": key,
+            "answered": answered,
+            "total": self.total
+        }
+        self.acks[key] = ack
+        return ack
+
+    async def _score(self, answer: InterviewAnswer):
+        def score():
+            with track_usage(self.session.candidate_id) as scope:
+                scores = evaluation_engine.evaluate_answer(answer, self.resume_data, self.session.role)
+            return scores, scope.usage
+
+        try:
+            scores, usage = await run_in_threadpool(score)
+        except Exception as e:
+            print(f"Provisional scoring failed: {e}")
+            return
+        self.scores[answer.question_id] = scores
+        self.usage = self.usage + usage
+        channel_registry.count("provisional_scores")
+        await self.send({"type": "provisional_score", "question_id": answer.question_id, "scores": scores})
+
+    async def _next_question(self):
+        try:
+            question, turn = await run_in_threadpool(
+                conversational_interviewer.next_question, self.session, self.resume_data
+            )
+            await run_in_threadpool(repository.save_session, self.session)
+        except Exception as e:
+            await self.error(500, f"Error generating the next question: {str(e)}")
+            return
+        self.questions[question.question_id] = question
+        await self.send(_question_message(question, turn=to_data(turn)))
+
+    async def on_complete(self) -> bool:
+        if self.session.status == "completed":
+            await self.error(400, "Interview already completed")
+            return False
+        if self.scoring:
+            await asyncio.gather(*self.scoring.values(), return_exceptions=True)
+
+        try:
+            session = await run_in_threadpool(repository.get_session, self.session.session_id)
+            if session.status == "completed":
+                await self.error(400, "Interview already completed")
+                return False
+            session.usage = session.usage + self.usage
+            report = await self.complete(session, dict(self.scores))
+        except Exception as e:
+            await self.error(500, f"Error completing interview: {str(e)}")
+            return False
+
+        self.session = session
+        channel_registry.count("reports")
+        await self.send({"type": "report", **report})
+        return True
+
+class ChannelRegistry:
+    """Open channels of this worker, one per session"""
+
+    def __init__(self):
+        self._open: Dict[str, InterviewChannel] = {}
+        self._lock = threading.Lock()
+        self._counters = {"connections": 0, "replaced": 0, "provisional_scores": 0, "reports": 0}
+
+    def count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def open(self, channel: InterviewChannel) -> Optional[InterviewChannel]:
+        """Register a channel; returns the one it replaces, which the caller closes"""
+        with self._lock:
+            self._counters["connections"] += 1
+            previous = self._open.get(channel.session.session_id)
+            self._open[channel.session.session_id] = channel
+            if previous is not None:
+                self._counters["replaced"] += 1
+            return previous
+
+    def close(self, channel: InterviewChannel):
+        with self._lock:
+            if self._open.get(channel.session.session_id) is channel:
+                del self._open[channel.session.session_id]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"open": len(self._open), **self._counters}
+
+channel_registry = ChannelRegistry()
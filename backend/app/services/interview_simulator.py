@@ -1,7 +1,8 @@
 ﻿from typing import List, Dict
-from app.models.schemas import InterviewQuestion, ResumeData
-from app.utils.llm_client import llm_client
-import json
+from app.models.schemas import GeneratedQuestion, InterviewQuestion, ResumeData
+from app.utils.llm_resilience import CircuitOpenError, llm_degraded
+from app.utils.structured_output import structured_output, StructuredOutputError
+from app.utils.usage import economy_mode
 import uuid
 
 class InterviewSimulator:
@@ -34,6 +35,9 @@ class InterviewSimulator:
                                         num_behavioral: int = 3) -> List[InterviewQuestion]:
         """Generate personalized interview questions based on role and resume"""
         
+        if economy_mode() or llm_degraded("questions"):
+            return self.template_questions(resume_data, num_hr, num_technical, num_behavioral)
+        
         # Create context about candidate
         context = f"""
         Role: {role}
@@ -50,12 +54,10 @@ class InterviewSimulator:
         Context about candidate:
         {context}
         
-        Make questions relevant to their background. Return as JSON array of objects with:
-        {{"question": "question text", "difficulty": "easy/medium/hard"}}"""
+        Make questions relevant to their background. Return a JSON object:
+        {{"questions": [{{"question": "question text", "difficulty": "easy/medium/hard"}}]}}"""
         
-        hr_response = llm_client.generate_completion(hr_prompt, temperature=0.8)
-        hr_questions = self._parse_questions_response(hr_response, "hr")
-        questions.extend(hr_questions[:num_hr])
+        questions.extend(self._generate_questions(hr_prompt, "hr", num_hr))
         
         # Generate Technical questions
         tech_prompt = f"""Generate {num_technical} technical interview questions for a {role} position.
@@ -64,12 +66,10 @@ class InterviewSimulator:
         {context}
         
         Focus on technologies they know: {', '.join(resume_data.skills[:10])}
-        Mix difficulty levels. Return as JSON array of objects with:
-        {{"question": "question text", "difficulty": "easy/medium/hard"}}"""
+        Mix difficulty levels. Return a JSON object:
+        {{"questions": [{{"question": "question text", "difficulty": "easy/medium/hard"}}]}}"""
         
-        tech_response = llm_client.generate_completion(tech_prompt, temperature=0.8)
-        tech_questions = self._parse_questions_response(tech_response, "technical")
-        questions.extend(tech_questions[:num_technical])
+        questions.extend(self._generate_questions(tech_prompt, "technical", num_technical))
         
         # Generate Behavioral questions
         behavioral_prompt = f"""Generate {num_behavioral} behavioral (STAR method) interview questions for a {role} position.
@@ -77,40 +77,47 @@ class InterviewSimulator:
         Context about candidate:
         {context}
         
-        Make them scenario-based and relevant to the role. Return as JSON array of objects with:
-        {{"question": "question text", "difficulty": "easy/medium/hard"}}"""
+        Make them scenario-based and relevant to the role. Return a JSON object:
+        {{"questions": [{{"question": "question text", "difficulty": "easy/medium/hard"}}]}}"""
         
-        behavioral_response = llm_client.generate_completion(behavioral_prompt, temperature=0.8)
-        behavioral_questions = self._parse_questions_response(behavioral_response, "behavioral")
-        questions.extend(behavioral_questions[:num_behavioral])
+        questions.extend(self._generate_questions(behavioral_prompt, "behavioral", num_behavioral))
         
         return questions
     
-    def _parse_questions_response(self, response: str, category: str) -> List[InterviewQuestion]:
-        """Parse LLM response into InterviewQuestion objects"""
-        try:
-            # Clean response
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]
-            if clean_response.startswith('```'):
-                clean_response = clean_response[3:]
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]
-            
-            questions_data = json.loads(clean_response.strip())
-            
-            questions = []
-            for q in questions_data:
+    def template_questions(self, resume_data: ResumeData, num_hr: int = 3, num_technical: int = 4,
+                           num_behavioral: int = 3) -> List[InterviewQuestion]:
+        """Question set built from the templates, without calling the LLM"""
+        skill = resume_data.skills[0] if resume_data.skills else "the technology you use most"
+        questions = []
+        for category, count in [("hr", num_hr), ("technical", num_technical), ("behavioral", num_behavioral)]:
+            templates = self.question_templates[category]
+            for i in range(count):
                 questions.append(InterviewQuestion(
                     question_id=str(uuid.uuid4()),
-                    question=q['question'],
+                    question=templates[i % len(templates)].replace("[specific technology]", skill),
                     category=category,
-                    difficulty=q.get('difficulty', 'medium')
+                    difficulty="medium"
                 ))
+        return questions
+    
+    def _generate_questions(self, prompt: str, category: str, count: int) -> List[InterviewQuestion]:
+        """Generate count questions of a category from the LLM"""
+        try:
+            generated = structured_output.generate_list(
+                "questions", GeneratedQuestion, prompt, count=count, items_key="questions", temperature=0.8,
+                task="question_gen"
+            )
             
-            return questions
-        except Exception as e:
+            return [
+                InterviewQuestion(
+                    question_id=str(uuid.uuid4()),
+                    question=q.question,
+                    category=category,
+                    difficulty=q.difficulty
+                )
+                for q in generated
+            ]
+        except (StructuredOutputError, CircuitOpenError) as e:
             print(f"Error parsing questions: {e}")
             # Return fallback question
             return [InterviewQuestion(
@@ -122,6 +129,14 @@ class InterviewSimulator:
     
     def adaptive_follow_up(self, previous_answer: str, context: str) -> InterviewQuestion:
         """Generate adaptive follow-up question based on previous answer"""
+        if economy_mode() or llm_degraded("follow_up"):
+            return InterviewQuestion(
+                question_id=str(uuid.uuid4()),
+                question="Can you elaborate on that point?",
+                category="follow_up",
+                difficulty="medium"
+            )
+        
         prompt = f"""Based on this interview answer, generate ONE relevant follow-up question.
         
         Previous Answer: {previous_answer}
@@ -130,26 +145,18 @@ class InterviewSimulator:
         Make it probing and insightful. Return as JSON:
         {{"question": "follow-up question", "difficulty": "medium"}}"""
         
-        response = llm_client.generate_completion(prompt, temperature=0.7)
-        
         try:
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]
-            if clean_response.startswith('```'):
-                clean_response = clean_response[3:]
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]
-            
-            data = json.loads(clean_response.strip())
+            data = structured_output.generate_object(
+                "follow_up", GeneratedQuestion, prompt, temperature=0.7, task="follow_up"
+            )
             
             return InterviewQuestion(
                 question_id=str(uuid.uuid4()),
-                question=data['question'],
+                question=data.question,
                 category="follow_up",
-                difficulty=data.get('difficulty', 'medium')
+                difficulty=data.difficulty
             )
-        except:
+        except (StructuredOutputError, CircuitOpenError):
             return InterviewQuestion(
                 question_id=str(uuid.uuid4()),
                 question="Can you elaborate on that point?",
@@ -0,0 +1,168 @@
+﻿from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.models.schemas import InterviewQuestion, ResumeData
+from app.services.interview_simulator import interview_simulator
+import threading
+import time
+
+class QuestionCache:
+    """Bounded, expiring cache of speculatively pre-generated question sets"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int, daily_budget: int,
+                 max_roles: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.daily_budget = daily_budget
+        self.max_roles = max_roles
+
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[InterviewQuestion]]]" = OrderedDict()
+        # key -> token of the running generation; invalidate() drops the token so
+        # a generation started before it is not stored
+        self._in_flight: Dict[Tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+
+        self._budget_day = date.today()
+        self._budget_used = 0
+
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "in_flight_misses": 0,
+            "expired": 0,
+            "evicted": 0,
+            "generated": 0,
+            "failed": 0,
+            "budget_skipped": 0,
+            "invalidated": 0
+        }
+
+    @staticmethod
+    def _key(candidate_id: str, role: str) -> Tuple[str, str]:
+        return (candidate_id, role.strip().lower())
+
+    def _reserve_budget(self) -> bool:
+        """Reserve one question-set generation from today's budget"""
+        today = date.today()
+        if today != self._budget_day:
+            self._budget_day = today
+            self._budget_used = 0
+
+        if self._budget_used >= self.daily_budget:
+            return False
+
+        self._budget_used += 1
+        return True
+
+    def _drop_expired(self, now: float):
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+            self._counters["expired"] += 1
+
+    def prefetch(self, candidate_id: str, roles: List[str], resume_data: ResumeData,
+                 num_hr: int = 3, num_technical: int = 4, num_behavioral: int = 3):
+        """Pre-generate a question set for each target role (runs in the background)"""
+
+        for role in roles[:self.max_roles]:
+            key = self._key(candidate_id, role)
+
+            with self._lock:
+                if key in self._entries or key in self._in_flight:
+                    continue
+                if not self._reserve_budget():
+                    self._counters["budget_skipped"] += 1
+                    continue
+                token = object()
+                self._in_flight[key] = token
+
+            try:
+                questions = interview_simulator.generate_role_specific_questions(
+                    role=role,
+                    resume_data=resume_data,
+                    num_hr=num_hr,
+                    num_technical=num_technical,
+                    num_behavioral=num_behavioral
+                )
+            except Exception as e:
+                print(f"Error pre-generating questions for {role}: {e}")
+                with self._lock:
+                    if self._in_flight.get(key) is token:
+                        del self._in_flight[key]
+                    self._counters["failed"] += 1
+                continue
+
+            with self._lock:
+                if self._in_flight.get(key) is not token:
+                    continue  # invalidated while generating
+                del self._in_flight[key]
+                now = time.monotonic()
+                self._drop_expired(now)
+                self._entries[key] = (now + self.ttl_seconds, questions)
+                self._entries.move_to_end(key)
+                self._counters["generated"] += 1
+
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._counters["evicted"] += 1
+
+    def take(self, candidate_id: str, role: str) -> Optional[List[InterviewQuestion]]:
+        """Pop the pre-generated question set for a candidate and role, if still fresh"""
+        key = self._key(candidate_id, role)
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+            if entry is None:
+                self._counters["misses"] += 1
+                if key in self._in_flight:
+                    self._counters["in_flight_misses"] += 1
+                return None
+
+            expires_at, questions = entry
+            if expires_at <= time.monotonic():
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return None
+
+            self._counters["hits"] += 1
+            return questions
+
+    def invalidate(self, candidate_id: str):
+        """Drop a candidate's question sets, including ones still being generated,
+        after their resume or target roles changed"""
+        with self._lock:
+            keys = {key for key in list(self._entries) + list(self._in_flight) if key[0] == candidate_id}
+            for key in keys:
+                self._entries.pop(key, None)
+                self._in_flight.pop(key, None)
+            self._counters["invalidated"] += len(keys)
+
+    def stats(self) -> Dict:
+        """Cache size, budget usage and hit-rate metrics"""
+        with self._lock:
+            self._drop_expired(time.monotonic())
+            counters = dict(self._counters)
+            lookups = counters["hits"] + counters["misses"]
+
+            return {
+                "enabled": settings.QUESTION_PREFETCH_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "in_flight": len(self._in_flight),
+                "budget_day": str(self._budget_day),
+                "budget_used": self._budget_used,
+                "daily_budget": self.daily_budget,
+                **counters,
+                "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+                # Share of generated sets that were actually served to a candidate
+                "utilization": round(counters["hits"] / counters["generated"], 4) if counters["generated"] else 0.0
+            }
+
+question_cache = QuestionCache(
+    max_entries=settings.QUESTION_PREFETCH_MAX_ENTRIES,
+    ttl_seconds=settings.QUESTION_PREFETCH_TTL_SECONDS,
+    daily_budget=settings.QUESTION_PREFETCH_DAILY_BUDGET,
+    max_roles=settings.QUESTION_PREFETCH_MAX_ROLES
+)
@@ -0,0 +1,275 @@
+﻿"""Re-grade stored interview logs with the current EvaluationEngine.
+
+Streams the latest log of every completed session. Each session's answers are
+re-scored through the LLM client at background priority, a few sessions at a
+time. The log is then appended again with the new scores under
+``regrades[<version>]``, and the original ``evaluation`` is left as it was.
+Sessions that already have the version are skipped. After every
+REGRADE_CHECKPOINT_EVERY sessions the log is flushed and a checkpoint with the
+running totals is written, so an interrupted run resumes where it stopped.
+Scoring is strict: a session with an answer the LLM could not score (circuit
+open, unparseable reply) is recorded as failed rather than stored with
+heuristic or default scores, and is picked up again by --retry-failed. While
+the circuit is open no new sessions are started.
+
+The job runs in its own process, so the server's priority slots cannot see
+it. Instead its calls are paced to REGRADE_MAX_CALLS_PER_MINUTE, leaving the
+rest of the provider's rate limit to the server, and every thread pauses
+after a 429 with a back-off that doubles while they continue.
+
+    python -m app.services.regrade estimate [--version V] [--prompt-price P --completion-price C]
+    python -m app.services.regrade run [--version V] [--concurrency N] [--limit N] [--retry-failed]
+    python -m app.services.regrade status [--version V]
+
+Profiles are read from the repository for the candidate's skills; with
+STORAGE_BACKEND=memory the job runs without them.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from typing import Dict, Iterator, Optional
+from app.core.config import settings
+from app.models.interview_log import interview_log
+from app.models.repository import repository
+from app.models.schemas import InterviewAnswer, LLMUsage, ResumeData
+from app.services.evaluation_engine import evaluation_engine, SCORING_VERSION
+from app.utils.llm_client import CallPacer, background_priority, estimate_tokens
+from app.utils.llm_resilience import llm_breaker
+from app.utils.serialization import to_data
+from app.utils.usage import UsageScope, current_usage
+
+# Completion tokens per scored answer when no earlier run has measured them
+ESTIMATED_COMPLETION_TOKENS = 40
+PROGRESS_INTERVAL_SECONDS = 10
+
+class JobUsage(UsageScope):
+    """Usage of a whole job. It is not charged to candidates and never enters
+    economy mode, so every re-grade uses the full LLM path."""
+
+    def __init__(self):
+        super().__init__("regrade", date.today().isoformat(), LLMUsage(), LLMUsage())
+
+    def _add(self, call: LLMUsage):
+        with self._lock:
+            self.usage = self.usage + call
+
+    def budget_used(self) -> float:
+        return 0.0
+
+def checkpoint_path(version: str) -> str:
+    return os.path.join(settings.REGRADE_PATH, f"regrade-{version}.json")
+
+def load_checkpoint(version: str) -> Optional[Dict]:
+    try:
+        with open(checkpoint_path(version)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_checkpoint(checkpoint: Dict):
+    os.makedirs(settings.REGRADE_PATH, exist_ok=True)
+    filepath = checkpoint_path(checkpoint["version"])
+    checkpoint["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    with open(f"{filepath}.tmp", 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(f"{filepath}.tmp", filepath)
+
+def pending_logs(version: str, role: Optional[str] = None) -> Iterator[Dict]:
+    """Completed session logs not yet scored with version"""
+    for log in interview_log.iter_logs():
+        if not log.get("answers") or not log.get("evaluation"):
+            continue
+        if role and log.get("role") != role:
+            continue
+        if log.get("scoring_version") == version or version in (log.get("regrades") or {}):
+            continue
+        yield log
+
+def estimate(version: str, role: Optional[str] = None,
+             prompt_price: float = 0.0, completion_price: float = 0.0) -> Dict:
+    """Dry run: LLM calls and tokens a run would use, without calling the LLM.
+    Prices are per million tokens."""
+    checkpoint = load_checkpoint(version)
+    completion_per_answer = ESTIMATED_COMPLETION_TOKENS
+    if checkpoint and checkpoint["answers_done"] and checkpoint["usage"]["completion_tokens"]:
+        completion_per_answer = checkpoint["usage"]["completion_tokens"] / checkpoint["answers_done"]
+
+    resume_data = ResumeData(raw_text="")
+    sessions = answers = prompt_tokens = 0
+    for log in pending_logs(version, role):
+        sessions += 1
+        for answer in log["answers"]:
+            answers += 1
+            system_message, prompt = evaluation_engine.answer_prompt(
+                InterviewAnswer(**answer), resume_data, log["role"]
+            )
+            prompt_tokens += estimate_tokens(system_message) + estimate_tokens(prompt)
+
+    completion_tokens = int(answers * completion_per_answer)
+    return {
+        "version": version,
+        "sessions": sessions,
+        "llm_calls": answers,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "estimated_cost": round(
+            (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000, 4
+        )
+    }
+
+def regrade_session(log: Dict, version: str, scope: JobUsage, pacer: Optional[CallPacer] = None) -> int:
+    """Score one session's answers again and append the log with them; returns the answer count"""
+    token = current_usage.set(scope)
+    try:
+        with background_priority(pacer):
+            answers = [InterviewAnswer(**answer) for answer in log["answers"]]
+            profile = repository.get_profile(log["candidate_id"]) if log.get("candidate_id") else None
+            evaluation = evaluation_engine.evaluate_session(
+                answers=answers,
+                resume_data=profile.resume_data if profile else ResumeData(raw_text=""),
+                role=log["role"],
+                strict=True  # fallback scores must never be stored as a version
+            )
+    finally:
+        current_usage.reset(token)
+
+    data = dict(log)
+    data["regrades"] = {
+        **(log.get("regrades") or {}),
+        version: {
+            "evaluation": to_data(evaluation),
+            "regraded_at": datetime.now().isoformat(timespec="seconds")
+        }
+    }
+    interview_log.append(log["session_id"], log.get("candidate_id"), data)
+    return len(answers)
+
+def run(version: str, concurrency: int, limit: int = 0, role: Optional[str] = None,
+        retry_failed: bool = False) -> Dict:
+    checkpoint = load_checkpoint(version) or {
+        "version": version,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "sessions_done": 0,
+        "answers_done": 0,
+        "elapsed_seconds": 0.0,
+        "usage": to_data(LLMUsage()),
+        "failed": {}
+    }
+    failed = checkpoint["failed"]
+    remaining = sum(
+        1 for log in pending_logs(version, role)
+        if retry_failed or log["session_id"] not in failed
+    )
+    if limit:
+        remaining = min(remaining, limit)
+    print(f"Re-grading {remaining} sessions with scoring version {version} "
+          f"({checkpoint['sessions_done']} done in earlier runs)")
+
+    scope = JobUsage()
+    pacer = CallPacer(
+        per_minute=settings.REGRADE_MAX_CALLS_PER_MINUTE,
+        backoff_min=settings.REGRADE_RATE_LIMIT_BACKOFF_SECONDS,
+        backoff_max=settings.REGRADE_RATE_LIMIT_BACKOFF_MAX_SECONDS
+    )
+    base_usage = LLMUsage(**checkpoint["usage"])
+    base_elapsed = checkpoint["elapsed_seconds"]
+    started = time.monotonic()
+    last_report = started
+    done = answers_done = since_checkpoint = 0
+
+    def write_checkpoint():
+        nonlocal since_checkpoint
+        interview_log.flush()  # scores must be durable before the checkpoint counts them
+        checkpoint["usage"] = to_data(base_usage + scope.usage)
+        checkpoint["elapsed_seconds"] = round(base_elapsed + time.monotonic() - started, 1)
+        save_checkpoint(checkpoint)
+        since_checkpoint = 0
+
+    def report():
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = done / elapsed
+        eta = (remaining - done) / rate if rate else 0
+        paced = pacer.stats()
+        print(f"{done}/{remaining} sessions, {answers_done / elapsed:.2f} answers/s, "
+              f"{scope.usage.total_tokens} tokens, {len(failed)} failed, "
+              f"{paced['rate_limited']} rate limited, ETA {eta / 60:.1f} min")
+
+    def collect(futures):
+        nonlocal done, answers_done, since_checkpoint, last_report
+        for future in futures:
+            session_id = in_flight.pop(future)
+            try:
+                answers = future.result()
+            except Exception as e:
+                print(f"Error re-grading {session_id}: {e}")
+                failed[session_id] = str(e)
+                continue
+            failed.pop(session_id, None)
+            done += 1
+            answers_done += answers
+            checkpoint["sessions_done"] += 1
+            checkpoint["answers_done"] += answers
+            since_checkpoint += 1
+        if since_checkpoint >= settings.REGRADE_CHECKPOINT_EVERY:
+            write_checkpoint()
+        if time.monotonic() - last_report >= PROGRESS_INTERVAL_SECONDS:
+            last_report = time.monotonic()
+            report()
+
+    in_flight = {}
+    submitted = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="regrade") as executor:
+        try:
+            for log in pending_logs(version, role):
+                if limit and submitted >= limit:
+                    break
+                if log["session_id"] in failed and not retry_failed:
+                    continue
+                # Every session would fail while the circuit is open
+                while llm_breaker.is_open():
+                    time.sleep(1)
+                # Keep only a couple of sessions per thread in memory
+                while len(in_flight) >= concurrency * 2:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                in_flight[executor.submit(regrade_session, log, version, scope, pacer)] = log["session_id"]
+                submitted += 1
+            collect(wait(in_flight).done)
+        except KeyboardInterrupt:
+            print("Interrupted; finishing sessions already being graded")
+            for future in list(in_flight):
+                if future.cancel():
+                    in_flight.pop(future)
+            collect(wait(in_flight).done)
+            write_checkpoint()
+            report()
+            raise SystemExit(130)
+
+    write_checkpoint()
+    report()
+    return checkpoint
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-grade stored interview logs")
+    parser.add_argument("command", choices=["estimate", "run", "status"])
+    parser.add_argument("--version", default=SCORING_VERSION,
+                        help="scoring version the new scores are stored under (default: current)")
+    parser.add_argument("--role", help="only sessions for this role")
+    parser.add_argument("--concurrency", type=int, default=settings.REGRADE_CONCURRENCY)
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many sessions")
+    parser.add_argument("--retry-failed", action="store_true", help="retry sessions that failed before")
+    parser.add_argument("--prompt-price", type=float, default=0.0, help="per million prompt tokens")
+    parser.add_argument("--completion-price", type=float, default=0.0, help="per million completion tokens")
+    args = parser.parse_args()
+
+    if args.command == "estimate":
+        result = estimate(args.version, args.role, args.prompt_price, args.completion_price)
+    elif args.command == "run":
+        result = run(args.version, args.concurrency, args.limit, args.role, args.retry_failed)
+        interview_log.close()
+    else:
+        result = load_checkpoint(args.version) or {"version": args.version, "status": "not started"}
+    print(json.dumps(result, indent=2))
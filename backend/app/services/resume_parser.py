@@ -1,21 +1,74 @@
-﻿import PyPDF2
-import pdfplumber
+﻿import importlib
 import re
-from typing import Dict, List
-from app.models.schemas import ResumeData
+from typing import Dict, List, Tuple
+from app.core.container import services
+from app.models.schemas import ParsedResume, ResumeData
 from app.utils.llm_client import llm_client
+from app.utils.metrics import span
+from app.utils.structured_output import structured_output
 import traceback
 
+services.register(
+    "pdf_libraries",
+    lambda: (importlib.import_module("pdfplumber"), importlib.import_module("PyPDF2"))
+)
+
+PARSE_SYSTEM_MESSAGE = """You are an expert resume parser. Extract structured information from resumes.
+            Return a JSON object with these fields:
+            - name: string
+            - email: string
+            - phone: string
+            - skills: array of strings (technical skills, tools, technologies)
+            - experience: array of objects with {title, company, duration, description}
+            - education: array of objects with {degree, institution, year}
+            - projects: array of objects with {name, description, technologies}
+            - summary: string (professional summary)
+            
+            Be thorough and extract all relevant information."""
+
+# Resume sections and the ResumeData fields parsed from them. "contact" is the
+# text before the first recognized heading.
+SECTION_FIELDS = {
+    "contact": ("name", "email", "phone"),
+    "summary": ("summary",),
+    "skills": ("skills",),
+    "experience": ("experience",),
+    "education": ("education",),
+    "projects": ("projects",)
+}
+
+_HEADINGS = {
+    heading: section
+    for section, headings in {
+        "summary": ("summary", "professional summary", "profile", "professional profile",
+                    "objective", "career objective", "about me"),
+        "skills": ("skills", "technical skills", "key skills", "core competencies", "technologies"),
+        "experience": ("experience", "work experience", "professional experience", "employment",
+                       "employment history", "work history"),
+        "education": ("education", "academic background", "qualifications"),
+        "projects": ("projects", "personal projects", "key projects", "academic projects")
+    }.items()
+    for heading in headings
+}
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+class ResumeParseFailed(Exception):
+    """A re-uploaded resume could not be parsed; the stored resume data is kept"""
+
 class ResumeParser:
     
     @staticmethod
     def extract_text_from_pdf(file_path: str) -> str:
         """Extract text from PDF using multiple methods"""
+        pdfplumber, PyPDF2 = services.get("pdf_libraries")
         text = ""
         
         # Try pdfplumber first (better for complex layouts)
         try:
-            with pdfplumber.open(file_path) as pdf:
+            with span("pdf_extract") as s, pdfplumber.open(file_path) as pdf:
+                s.set(pages=len(pdf.pages))
                 for page in pdf.pages:
                     page_text = page.extract_text()
                     if page_text:
@@ -24,8 +77,9 @@ class ResumeParser:
             print(f"pdfplumber failed: {e}")
             # Fallback to PyPDF2
             try:
-                with open(file_path, 'rb') as file:
+                with span("pdf_extract_fallback") as s, open(file_path, 'rb') as file:
                     pdf_reader = PyPDF2.PdfReader(file)
+                    s.set(pages=len(pdf_reader.pages))
                     for page in pdf_reader.pages:
                         page_text = page.extract_text()
                         if page_text:
@@ -59,65 +113,35 @@ class ResumeParser:
         }
     
     @staticmethod
-    def parse_with_llm(text: str) -> ResumeData:
-        """Use LLM to intelligently parse resume"""
-        try:
-            system_message = """You are an expert resume parser. Extract structured information from resumes.
-            Return a JSON object with these fields:
-            - name: string
-            - email: string
-            - phone: string
-            - skills: array of strings (technical skills, tools, technologies)
-            - experience: array of objects with {title, company, duration, description}
-            - education: array of objects with {degree, institution, year}
-            - projects: array of objects with {name, description, technologies}
-            - summary: string (professional summary)
-            
-            Be thorough and extract all relevant information."""
-            
-            prompt = f"""Parse this resume and extract all information in JSON format:
+    def _parse(text: str) -> ResumeData:
+        """Parse the whole resume; raises when the LLM call fails"""
+        prompt = f"""Parse this resume and extract all information in JSON format:
 
 {text}
 
 Return ONLY the JSON object, no additional text."""
-            
-            print("Calling OpenAI API for resume parsing...")
-            response = llm_client.generate_completion(
-                prompt=prompt,
-                system_message=system_message,
-                temperature=0.3
-            )
-            print(f"OpenAI response received: {response[:200]}...")
-            
-            # Parse JSON response
-            import json
-            # Clean response (remove markdown code blocks if present)
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]
-            if clean_response.startswith('```'):
-                clean_response = clean_response[3:]
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]
-            
-            parsed_data = json.loads(clean_response.strip())
-            
-            # Create ResumeData object
-            resume_data = ResumeData(
-                name=parsed_data.get('name'),
-                email=parsed_data.get('email'),
-                phone=parsed_data.get('phone'),
-                skills=parsed_data.get('skills', []),
-                experience=parsed_data.get('experience', []),
-                education=parsed_data.get('education', []),
-                projects=parsed_data.get('projects', []),
-                summary=parsed_data.get('summary'),
-                raw_text=text
-            )
-            
-            print(f"Resume parsed successfully: {resume_data.name}")
-            return resume_data
-            
+        
+        print("Calling OpenAI API for resume parsing...")
+        parsed = structured_output.generate_object(
+            "resume_parse",
+            ParsedResume,
+            prompt=prompt,
+            system_message=PARSE_SYSTEM_MESSAGE,
+            temperature=0.3,
+            task="resume_parse"
+        )
+        
+        # Create ResumeData object
+        resume_data = ResumeData(**parsed.model_dump(), raw_text=text)
+        
+        print(f"Resume parsed successfully: {resume_data.name}")
+        return resume_data
+    
+    @staticmethod
+    def parse_with_llm(text: str) -> ResumeData:
+        """Use LLM to intelligently parse resume"""
+        try:
+            return ResumeParser._parse(text)
         except Exception as e:
             print(f"Error parsing with LLM: {e}")
             print(traceback.format_exc())
@@ -135,19 +159,91 @@ Return ONLY the JSON object, no additional text."""
             )
     
     @staticmethod
-    def create_profile_embedding(resume_data: ResumeData) -> List[float]:
-        """Create embedding representation of candidate profile"""
-        try:
-            # Combine all relevant text for embedding
-            profile_text = f"""
+    def split_sections(text: str) -> Dict[str, str]:
+        """Split resume text at recognized section headings. Lines under an
+        unrecognized heading stay in the section above it."""
+        sections: Dict[str, List[str]] = {"contact": []}
+        current = "contact"
+        for line in text.split("\n"):
+            section = _HEADINGS.get(line.strip().rstrip(":").strip().lower())
+            if section is not None:
+                current = section
+                sections.setdefault(current, [])
+                continue
+            sections[current].append(line)
+        return {name: "\n".join(lines).strip() for name, lines in sections.items()}
+    
+    @staticmethod
+    def update_with_llm(previous: ResumeData, text: str) -> Tuple[ResumeData, List[str]]:
+        """Re-parse only the sections of text that differ from previous.raw_text and
+        merge them into previous. Returns the new data and the changed sections.
+        Raises ResumeParseFailed instead of falling back to contact details only,
+        which would overwrite the stored skills, experience and projects."""
+        old_sections = ResumeParser.split_sections(previous.raw_text)
+        new_sections = ResumeParser.split_sections(text)
+        if len(old_sections) == 1 or len(new_sections) == 1:
+            # Without headings there is nothing to line up; parse everything
+            try:
+                return ResumeParser._parse(text), list(SECTION_FIELDS)
+            except Exception as e:
+                print(f"Error parsing updated resume: {e}")
+                raise ResumeParseFailed(str(e)) from e
+        
+        changed = [
+            section for section in SECTION_FIELDS
+            if _normalize(old_sections.get(section, "")) != _normalize(new_sections.get(section, ""))
+        ]
+        # Fields of removed sections go back to their defaults
+        defaults = ParsedResume().model_dump()
+        update = {field: defaults[field] for section in changed for field in SECTION_FIELDS[section]}
+        update["raw_text"] = text
+        
+        present = [section for section in changed if new_sections.get(section)]
+        if present:
+            fields = [field for section in present for field in SECTION_FIELDS[section]]
+            sections_text = "\n\n".join(f"[{section}]\n{new_sections[section]}" for section in present)
+            prompt = f"""These sections of a resume were edited:
+
+{sections_text}
+
+Return a JSON object with ONLY these fields: {', '.join(fields)}"""
+            
+            try:
+                print(f"Calling OpenAI API for changed resume sections: {', '.join(present)}")
+                parsed = structured_output.generate_object(
+                    "resume_update",
+                    ParsedResume,
+                    prompt=prompt,
+                    system_message=PARSE_SYSTEM_MESSAGE,
+                    temperature=0.3,
+                    task="resume_parse",
+                    required=tuple(fields)
+                )
+            except Exception as e:
+                print(f"Error parsing changed sections: {e}")
+                raise ResumeParseFailed(str(e)) from e
+            # Every ParsedResume field has a default, so only fields the reply
+            # actually contained may replace stored data
+            update.update({field: getattr(parsed, field) for field in fields if field in parsed.model_fields_set})
+        
+        return previous.model_copy(update=update), changed
+    
+    @staticmethod
+    def profile_text(resume_data: ResumeData) -> str:
+        """The text the profile embedding is computed from"""
+        return f"""
             Skills: {', '.join(resume_data.skills)}
             Summary: {resume_data.summary or ''}
             Experience: {' '.join([exp.get('description', '') for exp in resume_data.experience])}
             Projects: {' '.join([proj.get('description', '') for proj in resume_data.projects])}
-            """
-            
+            """.strip()
+    
+    @staticmethod
+    def create_profile_embedding(resume_data: ResumeData) -> List[float]:
+        """Create embedding representation of candidate profile"""
+        try:
             print("Creating embeddings...")
-            embeddings = llm_client.generate_embeddings(profile_text.strip())
+            embeddings = llm_client.generate_embeddings(ResumeParser.profile_text(resume_data))
             print(f"Embeddings created: {len(embeddings)} dimensions")
             return embeddings
         except Exception as e:
@@ -0,0 +1,72 @@
+﻿"""Conditional GET for the read endpoints the frontend polls.
+
+Each cached response is keyed by endpoint and entity and stores the entity
+version it was rendered from, a strong ETag (hash of the body) and the encoded
+body. While the version is unchanged, a request costs one version lookup and
+is answered with 304 or with the stored bytes. A write that bumps the version
+makes the next request render again.
+"""
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+from fastapi import Request, Response
+from app.core.config import settings
+from app.models.hot_cache import HotCache
+from app.utils.serialization import dumps
+
+class CachedResponse(NamedTuple):
+    version: Hashable
+    etag: str
+    body: bytes
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as RFC 9110 requires for If-None-Match"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+class ResponseCache:
+
+    def __init__(self, max_bytes: int):
+        self._entries = HotCache("responses", max_bytes, lambda entry: entry.body, None)
+        self._counters = {"rendered": 0, "not_modified": 0, "served_cached": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def respond(self, request: Request, key: str, version: Hashable,
+                build: Callable[[], Any], cache_control: str) -> Response:
+        """Serve key at version, calling build() only if no body is cached for it.
+
+        Read the version before build() reads the data: a write in between then
+        only causes one extra render, never a stale body under a new version.
+        """
+        entry = self._entries.get(key)
+        rendered = entry is None or entry.version != version
+        if rendered:
+            body = dumps(build())
+            entry = CachedResponse(version, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', body)
+            self._entries.put(key, entry)
+            self._count("rendered")
+
+        headers = {"ETag": entry.etag, "Cache-Control": cache_control}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self._count("not_modified")
+            return Response(status_code=304, headers=headers)
+        if not rendered:
+            self._count("served_cached")
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, "cache": self._entries.stats()}
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES)
@@ -1,44 +1,331 @@
-﻿from openai import OpenAI
-from app.core.config import settings
-from typing import List, Dict
+﻿from app.core.config import settings
+from app.core.container import services
+from app.utils.llm_resilience import llm_breaker, llm_hedges, llm_latency
+from app.utils.llm_router import Provider, ProviderUnavailable, RouteTarget, llm_router
+from app.utils.metrics import metrics, span, current_endpoint
+from app.utils.usage import current_usage
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from contextlib import contextmanager
+from typing import List, Dict, Optional
+import contextvars
 import json
+import threading
+import time
+
+# "background" calls (bulk jobs) only use the slots interactive requests leave free
+llm_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default="interactive")
+llm_pacer: contextvars.ContextVar[Optional["CallPacer"]] = contextvars.ContextVar("llm_pacer", default=None)
+
+@contextmanager
+def background_priority(pacer: Optional["CallPacer"] = None):
+    """Run LLM calls at background priority. Slots only order calls within this
+    process; a job running in its own process also passes a pacer, which caps
+    its call rate and backs off on rate limits shared with the server."""
+    token = llm_priority.set("background")
+    pacer_token = llm_pacer.set(pacer)
+    try:
+        yield
+    finally:
+        llm_pacer.reset(pacer_token)
+        llm_priority.reset(token)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) for budgeting prompts"""
+    return len(text) // 4 + 1
+
+class PrioritySlots:
+    """Concurrency limit for LLM calls. Background calls never take the last
+    `reserved` slots and wait while any interactive call is waiting."""
+    
+    def __init__(self, size: int, reserved: int):
+        self.size = size
+        self.reserved = max(0, min(reserved, size - 1))
+        self._in_use = 0
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+    
+    @contextmanager
+    def acquire(self, background: bool):
+        with self._cond:
+            if background:
+                self._cond.wait_for(
+                    lambda: not self._interactive_waiting and self._in_use < self.size - self.reserved
+                )
+            else:
+                self._interactive_waiting += 1
+                try:
+                    self._cond.wait_for(lambda: self._in_use < self.size)
+                finally:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+            self._in_use += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify_all()
+
+class CallPacer:
+    """Spaces the calls of a bulk job to at most per_minute, across its threads.
+    After a rate-limit error (429) every call of the job waits for a back-off
+    that doubles up to backoff_max while 429s continue and resets on a success."""
+    
+    def __init__(self, per_minute: float, backoff_min: float, backoff_max: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self._next_at = 0.0
+        self._backoff = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "rate_limited": 0, "waited_seconds": 0.0}
+    
+    def wait(self):
+        """Block until the next call may start"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_at)
+            self._next_at = start + self.interval
+            self._counters["calls"] += 1
+            self._counters["waited_seconds"] += start - now
+        if start > now:
+            time.sleep(start - now)
+    
+    def rate_limited(self):
+        with self._lock:
+            self._backoff = min(self.backoff_max, self._backoff * 2 or self.backoff_min)
+            self._next_at = max(self._next_at, time.monotonic() + self._backoff)
+            self._counters["rate_limited"] += 1
+            backoff = self._backoff
+        print(f"Rate limited; pausing background LLM calls for {backoff:.1f}s")
+    
+    def succeeded(self):
+        with self._lock:
+            self._backoff = 0.0
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._counters, "waited_seconds": round(self._counters["waited_seconds"], 1)}
 
 class LLMClient:
     def __init__(self):
-        self.client = OpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            base_url="https://api.groq.com/openai/v1"
+        import openai
+        
+        # Providers, models and their clients come from llm_router; a target whose
+        # API key is missing is skipped, and reported when it is the last one
+        self.timeout_errors = (openai.APITimeoutError,)
+        self.rate_limit_error = openai.RateLimitError
+        self.bad_request_error = openai.BadRequestError
+        self.retryable_errors = (
+            openai.APIConnectionError,
+            openai.RateLimitError,
+            openai.InternalServerError
+        )
+        self._slots = PrioritySlots(settings.LLM_MAX_CONCURRENCY, settings.LLM_BACKGROUND_RESERVED_SLOTS)
+        # Requests that may be hedged run here; a hedge and the request it duplicates
+        # hold one hedge slot until both have finished
+        self._hedge_slots = threading.BoundedSemaphore(settings.LLM_HEDGE_MAX_IN_FLIGHT)
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.LLM_MAX_CONCURRENCY + 2 * settings.LLM_HEDGE_MAX_IN_FLIGHT,
+            thread_name_prefix="llm-request"
         )
-        self.model = "llama-3.3-70b-versatile"
+    
+    def _request(self, client, kwargs: Dict):
+        return client.chat.completions.create(**kwargs)
+    
+    def _hedged_request(self, client, kwargs: Dict, latency_key: str, hedge: bool):
+        """One upstream request, duplicated if it runs past the hedge delay; the
+        first successful response wins"""
+        delay = llm_latency.hedge_delay(latency_key) if hedge else None
+        if delay is None:
+            return self._request(client, kwargs)
+        
+        primary = self._executor.submit(self._request, client, kwargs)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        if not self._hedge_slots.acquire(blocking=False):
+            llm_hedges.count("skipped")
+            return primary.result()
+        
+        hedged = self._executor.submit(self._request, client, kwargs)
+        hedged.add_done_callback(lambda _: primary.add_done_callback(lambda _: self._hedge_slots.release()))
+        endpoint = current_endpoint.get()
+        scope = current_usage.get()
+        
+        def count_duplicate(future):
+            # The losing request is billed too. It may finish after the usage block
+            # ended; it then still counts towards the candidate's daily usage.
+            if future.exception() is None and future.result().usage:
+                usage = future.result().usage
+                metrics.inc("llm_tokens_total", usage.prompt_tokens, endpoint=endpoint, kind="hedge_prompt")
+                metrics.inc("llm_tokens_total", usage.completion_tokens, endpoint=endpoint, kind="hedge_completion")
+                if scope is not None:
+                    scope.record_hedge(usage.prompt_tokens, usage.completion_tokens)
+        
+        pending = {primary, hedged}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    llm_hedges.count("won" if future is hedged else "lost")
+                    for other in pending:
+                        other.add_done_callback(count_duplicate)
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    @staticmethod
+    def _target_kwargs(target: RouteTarget, provider: Provider, kwargs: Dict, last: bool) -> Dict:
+        request = {**kwargs, "model": target.model}
+        if not provider.json_mode:
+            # The prompt still asks for JSON; the reply is parsed and repaired as usual
+            request.pop("response_format", None)
+        if target.max_tokens is not None:
+            request["max_tokens"] = min(kwargs.get("max_tokens") or target.max_tokens, target.max_tokens)
+        if target.temperature is not None:
+            request["temperature"] = target.temperature
+        if not last:
+            # Past its SLO the call moves on to the next target
+            request["timeout"] = target.slo_ms / 1000
+        return request
+    
+    def _routed_request(self, task: str, targets: List[RouteTarget], kwargs: Dict, hedge: bool):
+        """Try the task's targets in order; the last one's errors are raised"""
+        for index, target in enumerate(targets):
+            last = index == len(targets) - 1
+            request = self._target_kwargs(target, llm_router.provider(target), kwargs, last)
+            latency_key = f"{target.name}:{request.get('max_tokens', 0)}"
+            started = time.perf_counter()
+            try:
+                response = self._hedged_request(llm_router.client(target), request, latency_key, hedge)
+            except ProviderUnavailable as e:
+                # A configuration problem: retrying the same target cannot help
+                llm_router.record(task, target, "error")
+                if last:
+                    raise
+                print(f"LLM target {target.name} for {task} is unavailable ({e}), trying the next one")
+                continue
+            except self.retryable_errors as e:
+                timed_out = isinstance(e, self.timeout_errors)
+                llm_router.record(task, target, "slo_breach" if timed_out and not last else "error")
+                if last:
+                    raise
+                print(f"LLM target {target.name} for {task} failed ({e.__class__.__name__}), trying the next one")
+                continue
+            
+            elapsed = time.perf_counter() - started
+            llm_latency.observe(latency_key, elapsed)
+            llm_router.record(task, target, "slo_breach" if elapsed * 1000 > target.slo_ms else "ok")
+            return response
+    
+    def _create(self, name: str, task: str, **kwargs) -> str:
+        """Run a chat completion for a task under the concurrency limit, retrying
+        transient errors. Raises CircuitOpenError while the breaker is open."""
+        with span(name) as s:
+            llm_breaker.acquire()
+            targets = llm_router.route(task)
+            priority = llm_priority.get()
+            hedge = settings.LLM_HEDGE_ENABLED and priority != "background"
+            pacer = llm_pacer.get()
+            if pacer is not None:
+                pacer.wait()
+            wait_started = time.perf_counter()
+            with self._slots.acquire(background=priority == "background"):
+                queue_wait = time.perf_counter() - wait_started
+                metrics.observe("llm_queue_wait_seconds", queue_wait, priority=priority)
+                
+                retries = 0
+                upstream_started = time.perf_counter()
+                while True:
+                    attempt_started = time.perf_counter()
+                    try:
+                        response = self._routed_request(task, targets, kwargs, hedge)
+                        llm_breaker.record(time.perf_counter() - attempt_started)
+                        if pacer is not None:
+                            pacer.succeeded()
+                        break
+                    except self.retryable_errors as e:
+                        llm_breaker.record(time.perf_counter() - attempt_started, error=True)
+                        if pacer is not None and isinstance(e, self.rate_limit_error):
+                            pacer.rate_limited()
+                        # No point retrying once the failures opened the breaker
+                        if retries >= settings.LLM_MAX_RETRIES or llm_breaker.is_open():
+                            metrics.inc("llm_errors_total", endpoint=current_endpoint.get())
+                            s.set(retries=retries, queue_wait_ms=round(queue_wait * 1000, 2), error=1)
+                            scope = current_usage.get()
+                            if scope is not None:
+                                scope.record(0, 0, (time.perf_counter() - upstream_started) * 1000, retries)
+                            raise
+                        retries += 1
+                        # The earlier targets already failed or breached their SLO
+                        targets = targets[-1:]
+                        metrics.inc("llm_retries_total", endpoint=current_endpoint.get())
+                        print(f"LLM call failed ({e.__class__.__name__}), retry {retries}")
+                        time.sleep(settings.LLM_RETRY_BACKOFF_MS / 1000 * 2 ** (retries - 1))
+                        if pacer is not None:
+                            pacer.wait()
+                    except Exception:
+                        llm_breaker.release()
+                        raise
+                upstream_ms = (time.perf_counter() - upstream_started) * 1000
+            
+            usage = response.usage
+            prompt_tokens = usage.prompt_tokens if usage else 0
+            completion_tokens = usage.completion_tokens if usage else 0
+            endpoint = current_endpoint.get()
+            metrics.inc("llm_tokens_total", prompt_tokens, endpoint=endpoint, kind="prompt")
+            metrics.inc("llm_tokens_total", completion_tokens, endpoint=endpoint, kind="completion")
+            scope = current_usage.get()
+            if scope is not None:
+                scope.record(prompt_tokens, completion_tokens, upstream_ms, retries)
+            s.set(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                retries=retries,
+                queue_wait_ms=round(queue_wait * 1000, 2)
+            )
+            return response.choices[0].message.content
     
     def generate_completion(self, prompt: str, system_message: str = None, 
-                          temperature: float = 0.7, max_tokens: int = 1500) -> str:
+                          temperature: float = 0.7, max_tokens: int = 1500,
+                          json_mode: bool = False, task: str = "default") -> str:
         messages = []
         if system_message:
             messages.append({"role": "system", "content": system_message})
         messages.append({"role": "user", "content": prompt})
         
-        response = self.client.chat.completions.create(
-            model=self.model,
+        # JSON mode makes the provider return one JSON object; the prompt must mention JSON.
+        # It is only sent to providers whose route declares json_mode.
+        kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+        return self._create(
+            "llm_completion",
+            task,
             messages=messages,
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            **kwargs
         )
-        return response.choices[0].message.content
     
     def generate_embeddings(self, text: str) -> List[float]:
         import hashlib
         import numpy as np
-        hash_val = int(hashlib.md5(text.encode()).hexdigest(), 16)
-        np.random.seed(hash_val % (2**32))
-        return np.random.rand(1536).tolist()
+        with span("embedding"):
+            hash_val = int(hashlib.md5(text.encode()).hexdigest(), 16)
+            np.random.seed(hash_val % (2**32))
+            return np.random.rand(1536).tolist()
     
-    def chat_completion(self, messages: List[Dict], temperature: float = 0.7) -> str:
-        response = self.client.chat.completions.create(
-            model=self.model,
+    def chat_completion(self, messages: List[Dict], temperature: float = 0.7,
+                        max_tokens: int = None, task: str = "default") -> str:
+        kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+        return self._create(
+            "llm_chat",
+            task,
             messages=messages,
-            temperature=temperature
+            temperature=temperature,
+            **kwargs
         )
-        return response.choices[0].message.content
 
-llm_client = LLMClient()
+llm_client = services.register("llm_client", LLMClient)
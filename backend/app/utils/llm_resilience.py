@@ -0,0 +1,233 @@
+﻿"""Tail-latency protection for LLM calls.
+
+Hedging: upstream latencies are kept in a rolling window per model and
+max_tokens (output length dominates latency, so a 250-token score and a
+2000-token feedback report are timed separately). When a call has been running for
+longer than LLM_HEDGE_PERCENTILE of its window, a duplicate request is sent
+and whichever returns first is used. At most LLM_HEDGE_MAX_IN_FLIGHT hedges
+run at once, and background (bulk) calls are never hedged.
+
+Circuit breaker: every call is recorded as a success, an error or a slow call
+(over LLM_BREAKER_SLOW_MS). Once LLM_BREAKER_MIN_CALLS were made in the last
+LLM_BREAKER_WINDOW_SECONDS and the share of errors and slow calls reaches
+LLM_BREAKER_FAILURE_RATE, the breaker opens: calls fail fast with
+CircuitOpenError and the call sites use their local paths (template
+questions, heuristic scores, default feedback). After
+LLM_BREAKER_OPEN_SECONDS one probe call is let through; it closes the breaker
+if it succeeds in time and reopens it otherwise.
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from app.core.config import settings
+from app.utils.metrics import metrics
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+HEDGE_OUTCOMES = ("won", "lost", "skipped")
+
+class CircuitOpenError(RuntimeError):
+    """The LLM backend is failing or too slow; use the local fallback"""
+
+class LatencyWindow:
+    """Recent upstream latencies (seconds) per "provider/model:max_tokens", for the hedge delay"""
+
+    def __init__(self, size: int, percentile: float, min_samples: int, min_delay: float):
+        self.size = size
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._windows: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float):
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows.setdefault(key, deque(maxlen=self.size))
+            window.append(seconds)
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging; None until the window has enough samples"""
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or len(window) < self.min_samples:
+                return None
+            ordered = sorted(window)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            windows = {key: sorted(window) for key, window in self._windows.items()}
+        stats = {}
+        for key, ordered in windows.items():
+            delay = self.hedge_delay(key)
+            stats[key] = {
+                "samples": len(ordered),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None
+            }
+        return stats
+
+class CircuitBreaker:
+
+    def __init__(self, window_seconds: float, min_calls: int, failure_rate: float,
+                 slow_seconds: float, open_seconds: float):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        # (time, failed) of recent calls
+        self._calls: Deque[Tuple[float, bool]] = deque()
+        self._lock = threading.Lock()
+
+        self._counters = {"trips": 0, "rejected": 0, "errors": 0, "slow": 0}
+
+    def _transition(self, state: str):
+        self.state = state
+        metrics.inc("llm_breaker_transitions_total", state=state)
+
+    def _drop_old(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected; does not take the half-open probe"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at < self.open_seconds
+            return self.state == HALF_OPEN and self._probing
+
+    def acquire(self):
+        """Called before each LLM call; raises CircuitOpenError when it may not run"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self._counters["rejected"] += 1
+        metrics.inc("llm_breaker_rejected_total")
+        raise CircuitOpenError("LLM backend circuit is open")
+
+    def record(self, seconds: float, error: bool = False):
+        """Outcome of a call let through by acquire()"""
+        slow = not error and seconds > self.slow_seconds
+        failed = error or slow
+        now = time.monotonic()
+        with self._lock:
+            if error:
+                self._counters["errors"] += 1
+            elif slow:
+                self._counters["slow"] += 1
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._opened_at = now
+                    self._transition(OPEN)
+                else:
+                    self._calls.clear()
+                    self._transition(CLOSED)
+                return
+
+            self._calls.append((now, failed))
+            self._drop_old(now)
+            failures = sum(1 for _, f in self._calls if f)
+            if (self.state == CLOSED and len(self._calls) >= self.min_calls
+                    and failures / len(self._calls) >= self.failure_rate):
+                print(f"LLM circuit opened: {failures} of the last {len(self._calls)} calls failed or were slow")
+                self._opened_at = now
+                self._counters["trips"] += 1
+                self._calls.clear()
+                self._transition(OPEN)
+
+    def release(self):
+        """A call let through by acquire() ended without an outcome (e.g. a client error)"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._drop_old(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for _, f in self._calls if f)
+            return {
+                "state": self.state,
+                "calls_in_window": calls,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                **self._counters
+            }
+
+class HedgeStats:
+
+    def __init__(self):
+        self._counters = {name: 0 for name in HEDGE_OUTCOMES}
+        self._lock = threading.Lock()
+
+    def count(self, outcome: str):
+        with self._lock:
+            self._counters[outcome] += 1
+        metrics.inc("llm_hedges_total", outcome=outcome)
+
+    def win_rate(self) -> float:
+        with self._lock:
+            sent = self._counters["won"] + self._counters["lost"]
+            return round(self._counters["won"] / sent, 3) if sent else 0.0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, "win_rate": self.win_rate()}
+
+metrics.counter("llm_breaker_transitions_total", "LLM circuit breaker state changes by new state")
+metrics.counter("llm_breaker_rejected_total", "LLM calls rejected while the circuit was open")
+metrics.counter("llm_hedges_total", "Hedged LLM requests by outcome (won: the hedge returned first)")
+metrics.counter("llm_degraded_total", "Calls served by a local fallback while the LLM circuit was open")
+
+llm_breaker = CircuitBreaker(
+    window_seconds=settings.LLM_BREAKER_WINDOW_SECONDS,
+    min_calls=settings.LLM_BREAKER_MIN_CALLS,
+    failure_rate=settings.LLM_BREAKER_FAILURE_RATE,
+    slow_seconds=settings.LLM_BREAKER_SLOW_MS / 1000,
+    open_seconds=settings.LLM_BREAKER_OPEN_SECONDS
+)
+llm_latency = LatencyWindow(
+    size=settings.LLM_HEDGE_WINDOW,
+    percentile=settings.LLM_HEDGE_PERCENTILE,
+    min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    min_delay=settings.LLM_HEDGE_MIN_DELAY_MS / 1000
+)
+llm_hedges = HedgeStats()
+
+metrics.gauge("llm_breaker_state", "LLM circuit breaker state (0 closed, 1 half-open, 2 open)",
+              lambda: STATE_VALUES[llm_breaker.state])
+metrics.gauge("llm_hedge_win_ratio", "Share of hedged LLM requests where the hedge returned first",
+              llm_hedges.win_rate)
+
+def llm_degraded(site: str) -> bool:
+    """True while the circuit is open; counts the call site as served by its
+    local fallback instead of the LLM"""
+    if not llm_breaker.is_open():
+        return False
+    metrics.inc("llm_degraded_total", site=site)
+    return True
+
+def resilience_stats() -> Dict:
+    return {
+        "breaker": llm_breaker.stats(),
+        "hedges": llm_hedges.stats(),
+        "latency": llm_latency.stats()
+    }
@@ -0,0 +1,232 @@
+﻿"""Task-based routing of LLM calls.
+
+Each call names its task (resume_parse, question_gen, answer_eval, feedback,
+follow_up, ...). A task maps to an ordered list of targets: a provider, a
+model, a latency SLO and optionally the max_tokens cap and temperature to use
+with that model. A provider declares whether it supports JSON mode
+(response_format=json_object); calls that ask for JSON only send it to
+providers that do. A target other than the last gets its SLO as the request
+timeout; on a timeout or a transient error the call moves on to the next
+target. Tasks without a route use "default".
+
+Routes are read from the JSON file at LLM_ROUTES_PATH:
+
+    {
+      "providers": {
+        "groq": {"base_url": "https://api.groq.com/openai/v1", "api_key_env": "OPENAI_API_KEY",
+                 "json_mode": true}
+      },
+      "tasks": {
+        "answer_eval": [
+          {"provider": "groq", "model": "llama-3.1-8b-instant", "slo_ms": 2000, "max_tokens": 200},
+          {"provider": "groq", "model": "llama-3.3-70b-versatile", "slo_ms": 10000}
+        ],
+        "default": [{"provider": "groq", "model": "llama-3.3-70b-versatile", "slo_ms": 20000}]
+      }
+    }
+
+Without the file DEFAULT_ROUTES is used. The file is checked for changes every
+LLM_ROUTES_CHECK_SECONDS and reloaded without a restart; an invalid file is
+reported and the previous routes stay in place. A target whose provider
+has no API key configured is skipped like one that failed. Each provider has its own
+client and connection pool, kept across reloads while its settings are
+unchanged. A replaced or removed provider's client is closed once requests
+already using it have had LLM_TIMEOUT_SECONDS to finish.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from app.core.config import settings
+from app.utils.metrics import metrics
+from app.utils.serialization import loads
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+
+DEFAULT_ROUTES = {
+    "providers": {
+        "groq": {"base_url": GROQ_BASE_URL, "api_key_env": "OPENAI_API_KEY", "json_mode": True}
+    },
+    "tasks": {
+        # Four numbers per answer; a small model is enough
+        "answer_eval": [
+            {"provider": "groq", "model": "llama-3.1-8b-instant", "slo_ms": 3000, "max_tokens": 300},
+            {"provider": "groq", "model": "llama-3.3-70b-versatile", "slo_ms": 15000}
+        ],
+        "follow_up": [
+            {"provider": "groq", "model": "llama-3.1-8b-instant", "slo_ms": 3000},
+            {"provider": "groq", "model": "llama-3.3-70b-versatile", "slo_ms": 15000}
+        ],
+        "default": [
+            {"provider": "groq", "model": "llama-3.3-70b-versatile", "slo_ms": 30000}
+        ]
+    }
+}
+
+class Provider(BaseModel):
+    base_url: str
+    api_key_env: str = "OPENAI_API_KEY"
+    max_connections: int = Field(20, ge=1)
+    json_mode: bool = False  # accepts response_format={"type": "json_object"}
+
+class RouteTarget(BaseModel):
+    provider: str
+    model: str
+    slo_ms: int = Field(..., gt=0)
+    max_tokens: Optional[int] = Field(None, gt=0)  # cap on the caller's max_tokens
+    temperature: Optional[float] = None  # replaces the caller's temperature
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+class RoutingConfig(BaseModel):
+    providers: Dict[str, Provider]
+    tasks: Dict[str, List[RouteTarget]]
+
+    @model_validator(mode="after")
+    def _check_references(self):
+        if not self.tasks.get("default"):
+            raise ValueError('a "default" task route is required')
+        for task, targets in self.tasks.items():
+            if not targets:
+                raise ValueError(f"task {task} has no targets")
+            for target in targets:
+                if target.provider not in self.providers:
+                    raise ValueError(f"task {task} uses unknown provider {target.provider}")
+        return self
+
+metrics.counter("llm_route_requests_total", "Routed LLM requests by task, target and outcome")
+
+class ProviderUnavailable(RuntimeError):
+    """A target's provider cannot be called, e.g. its API key is not configured"""
+
+class LLMRouter:
+
+    def __init__(self, path: str, check_interval: float):
+        self.path = path
+        self.check_interval = check_interval
+
+        self._config = RoutingConfig.model_validate(DEFAULT_ROUTES)
+        self._source = "default"
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        # provider name -> (settings it was created with, client)
+        self._clients: Dict[str, Tuple[Provider, object]] = {}
+        self._lock = threading.Lock()
+
+        self._targets: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._counters = {"reloads": 0, "reload_errors": 0, "clients_closed": 0}
+
+    def _retire_client(self, name: str):
+        """Close a provider's client after requests in flight on it can finish;
+        called with the lock held"""
+        entry = self._clients.pop(name, None)
+        if entry is None:
+            return
+        closer = threading.Timer(settings.LLM_TIMEOUT_SECONDS, entry[1].close)
+        closer.daemon = True
+        closer.start()
+        self._counters["clients_closed"] += 1
+
+    def _reload(self):
+        """Load the routes file if it changed since the last check"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+
+        if mtime is None:
+            self._config, self._source = RoutingConfig.model_validate(DEFAULT_ROUTES), "default"
+        else:
+            try:
+                with open(self.path, "rb") as f:
+                    self._config = RoutingConfig.model_validate(loads(f.read()))
+                self._source = self.path
+            except (OSError, ValueError, ValidationError) as e:
+                self._counters["reload_errors"] += 1
+                print(f"Invalid LLM routes in {self.path}, keeping the previous routes: {e}")
+                return
+        for name in [name for name in self._clients if name not in self._config.providers]:
+            self._retire_client(name)
+        self._counters["reloads"] += 1
+        print(f"LLM routes loaded from {self._source}")
+
+    def route(self, task: str) -> List[RouteTarget]:
+        with self._lock:
+            self._reload()
+            return self._config.tasks.get(task) or self._config.tasks["default"]
+
+    def provider(self, target: RouteTarget) -> Provider:
+        with self._lock:
+            return self._config.providers[target.provider]
+
+    def client(self, target: RouteTarget):
+        """The provider's client, created on first use and when its settings change"""
+        with self._lock:
+            provider = self._config.providers[target.provider]
+            entry = self._clients.get(target.provider)
+            if entry is not None and entry[0] == provider:
+                return entry[1]
+
+            import httpx
+            import openai
+            api_key = (settings.OPENAI_API_KEY if provider.api_key_env == "OPENAI_API_KEY"
+                       else os.environ.get(provider.api_key_env))
+            if not api_key:
+                raise ProviderUnavailable(f"{provider.api_key_env} is not configured")
+            # Retries are done by LLMClient so each attempt is counted
+            client = openai.OpenAI(
+                api_key=api_key,
+                base_url=provider.base_url,
+                max_retries=0,
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                http_client=httpx.Client(limits=httpx.Limits(
+                    max_connections=provider.max_connections,
+                    max_keepalive_connections=provider.max_connections
+                ))
+            )
+            # Settings changed since the previous client was created
+            self._retire_client(target.provider)
+            self._clients[target.provider] = (provider, client)
+            return client
+
+    def record(self, task: str, target: RouteTarget, outcome: str):
+        """outcome: ok, slo_breach (timed out, moved on) or error"""
+        with self._lock:
+            counters = self._targets.setdefault(
+                (task, target.name), {"ok": 0, "slo_breach": 0, "error": 0}
+            )
+            counters[outcome] += 1
+        metrics.inc("llm_route_requests_total", task=task, target=target.name, outcome=outcome)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._reload()
+            tasks = {
+                task: [target.model_dump(exclude_none=True) for target in targets]
+                for task, targets in self._config.tasks.items()
+            }
+            requests: Dict[str, Dict[str, Dict[str, int]]] = {}
+            for (task, name), counters in self._targets.items():
+                requests.setdefault(task, {})[name] = dict(counters)
+            return {
+                "source": self._source,
+                **self._counters,
+                "providers": sorted(self._config.providers),
+                "tasks": tasks,
+                "requests": requests
+            }
+
+llm_router = LLMRouter(
+    path=settings.LLM_ROUTES_PATH,
+    check_interval=settings.LLM_ROUTES_CHECK_SECONDS
+)
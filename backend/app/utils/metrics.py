@@ -0,0 +1,195 @@
+﻿"""In-process metrics and request tracing.
+
+Timed sections of the hot path are wrapped in ``span("name")``. Each span is
+observed into a histogram labelled with the endpoint that triggered it (or
+"background" for writer threads and background tasks outside a request) and,
+when the request asked for a trace, appended to the request's span list.
+``metrics.render()`` produces the Prometheus text exposition format served
+at /metrics.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Route template of the request being served, e.g. "/api/interview/complete"
+current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_endpoint", default="background"
+)
+# Span list of the request being served, when it asked for a trace
+current_trace: contextvars.ContextVar[Optional[List[Dict]]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(key: Tuple, extra: Tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class Histogram:
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # label key -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+class Counter:
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._series: Dict[Tuple, float] = {}
+
+    def inc(self, value: float = 1, **labels):
+        key = _label_key(labels)
+        self._series[key] = self._series.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+class MetricsRegistry:
+
+    def __init__(self, prefix: str = "career_twin"):
+        self.prefix = prefix
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(name, lambda full: Histogram(full, help_text, buckets))
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(name, lambda full: Counter(full, help_text))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self._register(name, lambda full: Gauge(full, help_text, read))
+
+    def _register(self, name: str, create):
+        full_name = f"{self.prefix}_{name}"
+        with self._lock:
+            if full_name not in self._metrics:
+                self._metrics[full_name] = create(full_name)
+            return self._metrics[full_name]
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            self._metrics[f"{self.prefix}_{name}"].observe(value, **labels)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._metrics[f"{self.prefix}_{name}"].inc(value, **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            if isinstance(metric, Gauge):
+                lines.extend(metric.render())
+            else:
+                with self._lock:
+                    lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+metrics.histogram("request_duration_seconds", "HTTP request latency by endpoint")
+metrics.histogram("span_duration_seconds", "Time spent in a hot-path section by endpoint")
+metrics.histogram("llm_queue_wait_seconds", "Time an LLM call waited for a concurrency slot")
+metrics.counter("llm_tokens_total", "LLM tokens by endpoint and kind (prompt/completion)")
+metrics.counter("llm_retries_total", "LLM call retries by endpoint")
+metrics.counter("llm_errors_total", "LLM calls that failed after all retries")
+
+class Span:
+    """Handle yielded by span(); attributes set on it are reported with the span"""
+
+    __slots__ = ("name", "attributes")
+
+    def __init__(self, name: str, attributes: Dict):
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a section of work; e.g. ``with span("pdf_extract") as s: s.set(pages=3)``"""
+    handle = Span(name, attributes)
+    started = time.perf_counter()
+    try:
+        yield handle
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe("span_duration_seconds", elapsed, endpoint=current_endpoint.get(), span=name)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.append({"name": name, "ms": round(elapsed * 1000, 2), **handle.attributes})
+
+def server_timing(trace: List[Dict], total_seconds: float) -> str:
+    """Server-Timing header value: one entry per span name with summed numeric attributes"""
+    grouped: Dict[str, Dict] = {}
+    for record in trace:
+        entry = grouped.setdefault(record["name"], {"ms": 0.0, "n": 0})
+        entry["n"] += 1
+        for key, value in record.items():
+            if key != "name" and isinstance(value, (int, float)) and not isinstance(value, bool):
+                entry[key] = entry.get(key, 0) + value
+
+    parts = []
+    for name, entry in grouped.items():
+        ms = entry.pop("ms")
+        desc = " ".join(f"{key}={round(value, 2)}" for key, value in entry.items())
+        parts.append(f'{name};dur={ms:.1f};desc="{desc}"')
+    parts.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(parts)
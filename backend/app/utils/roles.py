@@ -0,0 +1,25 @@
+﻿"""Interview roles and their normalized names (lowercase, underscores), used
+for analytics partitions and cohort sketches."""
+import re
+
+AVAILABLE_ROLES = [
+    "Software Engineer",
+    "ML Engineer",
+    "Data Analyst",
+    "Frontend Developer",
+    "Backend Developer",
+    "Full Stack Developer",
+    "DevOps Engineer",
+    "Product Manager",
+    "Data Scientist",
+    "Cloud Architect"
+]
+
+# Roles are free text from the client; slugs longer than this are cut
+ROLE_SLUG_MAX_LENGTH = 64
+
+def role_slug(role: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", role.lower()[:4 * ROLE_SLUG_MAX_LENGTH]).strip("_")
+    return slug[:ROLE_SLUG_MAX_LENGTH].rstrip("_") or "unknown"
+
+KNOWN_ROLE_SLUGS = frozenset(role_slug(role) for role in AVAILABLE_ROLES)
@@ -0,0 +1,54 @@
+﻿"""JSON encoding shared by API responses, storage and interview logs.
+
+Uses orjson when it is installed and the standard library otherwise; both
+produce compact UTF-8 JSON. Models are converted with Pydantic v2
+``model_dump(mode="json")`` so datetimes become ISO strings in one place.
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, Optional
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+def loads(data) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def to_data(model: BaseModel, include: Optional[Iterable[str]] = None,
+            exclude: Optional[Iterable[str]] = None) -> dict:
+    """JSON-ready dict of a model (datetimes as ISO strings)"""
+    return model.model_dump(
+        mode="json",
+        include=set(include) if include is not None else None,
+        exclude=set(exclude) if exclude is not None else None
+    )
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps().
+
+    Returning one from a route also skips FastAPI's jsonable_encoder pass over
+    the content, so routes build it from plain dicts (see to_data).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
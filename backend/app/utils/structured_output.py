@@ -0,0 +1,240 @@
+﻿"""LLM output validated against Pydantic models.
+
+Calls request JSON mode, which is sent to providers whose route declares
+json_mode, so every prompt asks for one JSON object (lists are wrapped in it
+under a key). A provider that rejects its own output in JSON mode (Groq's 400
+json_validate_failed) returns the rejected text in the error, which is parsed
+and repaired like any reply. Code fences and prose around the JSON are
+stripped. Trailing commas and truncated output are
+repaired locally by closing open strings and brackets, dropping the last
+incomplete value if needed. Fields of an object or items of a list that are
+still missing or invalid are requested again on their own, without
+regenerating the rest, up to LLM_STRUCTURED_REPAIR_REQUESTS times. Fields
+listed as required count as missing when the reply omits them, even if the
+model has a default for them.
+
+Outcomes are counted per call site and served at /api/stats/structured-output.
+"""
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+from app.core.config import settings
+from app.utils.llm_client import llm_client
+from app.utils.metrics import metrics, span
+from app.utils.serialization import dumps
+
+T = TypeVar("T", bound=BaseModel)
+
+OUTCOMES = ("clean", "repaired", "rerequested", "failed")
+# Cut points tried from the end when completing truncated JSON
+MAX_TRUNCATION_CANDIDATES = 50
+
+_FENCE = re.compile(r"```[a-zA-Z]*")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_decoder = json.JSONDecoder(strict=False)
+
+metrics.counter("llm_structured_output_total", "Structured LLM outputs by call site and outcome")
+
+class StructuredOutputError(ValueError):
+    """The response could not be turned into the schema, even after repair"""
+
+def _strip(text: str) -> str:
+    """Remove code fences and anything before the first bracket"""
+    text = _FENCE.sub("", text).strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):] if starts else text
+
+def _completions(text: str) -> List[str]:
+    """Ways to complete truncated JSON, longest first"""
+    stack: List[str] = []
+    in_string = escape = False
+    cuts: List[Tuple[int, str]] = []  # text[:end] + closers is complete
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            cuts.append((i + 1, "".join(reversed(stack))))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            cuts.append((i + 1, "".join(reversed(stack))))
+        elif ch == ",":
+            cuts.append((i, "".join(reversed(stack))))
+
+    closers = "".join(reversed(stack))
+    candidates = [text + ('"' if in_string else "") + closers]
+    candidates.extend(text[:end] + tail for end, tail in reversed(cuts[-MAX_TRUNCATION_CANDIDATES:]))
+    return candidates
+
+def parse_json(text: str) -> Tuple[Any, bool]:
+    """Parse the JSON in an LLM response; returns (value, repaired)"""
+    cleaned = _strip(text)
+    try:
+        # raw_decode ignores anything after the JSON value
+        return _decoder.raw_decode(cleaned)[0], False
+    except ValueError:
+        pass
+    fixed = _TRAILING_COMMA.sub(r"\1", cleaned)
+    for candidate in [fixed] + _completions(fixed):
+        try:
+            return _decoder.raw_decode(candidate)[0], True
+        except ValueError:
+            continue
+    raise StructuredOutputError("Response is not JSON")
+
+class StructuredOutput:
+
+    def __init__(self, repair_requests: int):
+        self.repair_requests = repair_requests
+        self._sites: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, site: str, outcome: str, invalid_items: int = 0):
+        with self._lock:
+            counters = self._sites.setdefault(
+                site, {"calls": 0, **{name: 0 for name in OUTCOMES}, "invalid_items": 0}
+            )
+            counters["calls"] += 1
+            counters[outcome] += 1
+            counters["invalid_items"] += invalid_items
+        metrics.inc("llm_structured_output_total", site=site, outcome=outcome)
+
+    def _complete(self, prompt: str, system_message: Optional[str],
+                  temperature: float, max_tokens: int, task: str) -> Tuple[Any, bool]:
+        try:
+            response = llm_client.generate_completion(
+                prompt=prompt,
+                system_message=system_message,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                json_mode=True,
+                task=task
+            )
+        except llm_client.bad_request_error as e:
+            if e.code != "json_validate_failed":
+                raise
+            # The provider's JSON check failed; its output is in the error body
+            response = e.body.get("failed_generation") if isinstance(e.body, dict) else None
+            if not response:
+                return None, False
+        with span("llm_json_parse"):
+            try:
+                return parse_json(response)
+            except StructuredOutputError:
+                return None, False
+
+    @staticmethod
+    def _invalid_fields(model: Type[BaseModel], data: Dict) -> List[str]:
+        try:
+            model.model_validate(data)
+            return []
+        except ValidationError as e:
+            fields = {str(error["loc"][0]) for error in e.errors() if error["loc"]}
+            # Errors without a location concern the whole object
+            return sorted(fields) if fields else list(model.model_fields)
+
+    def generate_object(self, site: str, model: Type[T], prompt: str,
+                        system_message: Optional[str] = None, temperature: float = 0.7,
+                        max_tokens: int = 1500, task: str = "default",
+                        required: Tuple[str, ...] = ()) -> T:
+        """One model instance from the LLM, routed as task; raises StructuredOutputError.
+        Fields in required end up in the result's model_fields_set."""
+        data, repaired = self._complete(prompt, system_message, temperature, max_tokens, task)
+        data = data if isinstance(data, dict) else {}
+        rerequests = 0
+
+        while True:
+            invalid = sorted(set(self._invalid_fields(model, data)) | {f for f in required if f not in data})
+            if not invalid or rerequests >= self.repair_requests:
+                break
+
+            rerequests += 1
+            kept = {key: value for key, value in data.items() if key not in invalid}
+            follow_up = f"""{prompt}
+
+Your previous reply was incomplete or invalid. These fields are already answered:
+{dumps(kept).decode()}
+
+Return a JSON object with ONLY these fields: {', '.join(invalid)}"""
+            extra, _ = self._complete(follow_up, system_message, temperature, max_tokens, task)
+            if isinstance(extra, dict):
+                data = {**kept, **{key: extra[key] for key in invalid if key in extra}}
+
+        if invalid:
+            self._record(site, "failed")
+            raise StructuredOutputError(f"{site}: invalid fields {', '.join(invalid)}")
+        self._record(site, "rerequested" if rerequests else "repaired" if repaired else "clean")
+        return model.model_validate(data)
+
+    @staticmethod
+    def _items(data: Any, items_key: str) -> List:
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict):
+            if isinstance(data.get(items_key), list):
+                return data[items_key]
+            lists = [value for value in data.values() if isinstance(value, list)]
+            if len(lists) == 1:
+                return lists[0]
+            if data:
+                return [data]  # a single item instead of a list
+        return []
+
+    def generate_list(self, site: str, model: Type[T], prompt: str, count: int, items_key: str,
+                      system_message: Optional[str] = None, temperature: float = 0.7,
+                      max_tokens: int = 1500, task: str = "default") -> List[T]:
+        """Up to count model instances; the prompt asks for {items_key: [...]}.
+        Raises StructuredOutputError when no valid item was returned."""
+        data, repaired = self._complete(prompt, system_message, temperature, max_tokens, task)
+        items: List[T] = []
+        invalid_items = 0
+        rerequests = 0
+
+        while True:
+            for item in self._items(data, items_key):
+                try:
+                    items.append(model.model_validate(item))
+                except ValidationError:
+                    invalid_items += 1
+            missing = count - len(items)
+            if missing <= 0 or rerequests >= self.repair_requests:
+                break
+
+            rerequests += 1
+            follow_up = f"""{prompt}
+
+You already returned these items:
+{dumps([item.model_dump() for item in items]).decode()}
+
+Return a JSON object {{"{items_key}": [...]}} with {missing} more, different items."""
+            data, _ = self._complete(follow_up, system_message, temperature, max_tokens, task)
+
+        if not items:
+            self._record(site, "failed", invalid_items)
+            raise StructuredOutputError(f"{site}: no valid items")
+        self._record(site, "rerequested" if rerequests else "repaired" if repaired else "clean", invalid_items)
+        return items[:count]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sites = {site: dict(counters) for site, counters in self._sites.items()}
+        for counters in sites.values():
+            calls = counters["calls"]
+            counters["repair_rate"] = round((counters["repaired"] + counters["rerequested"]) / calls, 3)
+            counters["failure_rate"] = round(counters["failed"] / calls, 3)
+        return sites
+
+structured_output = StructuredOutput(
+    repair_requests=settings.LLM_STRUCTURED_REPAIR_REQUESTS
+)
@@ -0,0 +1,100 @@
+﻿"""Per-candidate and per-session LLM usage accounting.
+
+Work done for a candidate runs inside ``track_usage(candidate_id, session)``.
+Every LLMClient call made inside it (including from threads that copied the
+context) is recorded on the scope and added to the candidate's daily usage
+straight away. When the scope exits, its usage is also added to the
+session's. The scope also tells services when a session or daily token
+budget is nearly used up, so they can switch to their cheaper paths.
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+from datetime import date
+from typing import Optional
+from app.core.config import settings
+from app.models.repository import repository
+from app.models.schemas import InterviewSession, LLMUsage
+
+class UsageScope:
+    """LLM usage of one request or background job on behalf of a candidate"""
+
+    def __init__(self, candidate_id: str, day: str, session_usage: LLMUsage, daily_usage: LLMUsage):
+        self.candidate_id = candidate_id
+        self.day = day
+        self.usage = LLMUsage()
+        self._session_before = session_usage
+        self._daily_before = daily_usage
+        self._lock = threading.Lock()
+
+    def _add(self, call: LLMUsage):
+        with self._lock:
+            self.usage = self.usage + call
+        repository.add_daily_usage(self.candidate_id, self.day, call)
+
+    def record(self, prompt_tokens: int, completion_tokens: int, latency_ms: float, retries: int):
+        self._add(LLMUsage(
+            calls=1,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=round(latency_ms, 2),
+            retries=retries
+        ))
+
+    def record_hedge(self, prompt_tokens: int, completion_tokens: int):
+        """Tokens of a hedged request whose reply was not used; billed, but not a call"""
+        self._add(LLMUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+
+    def record_economy(self):
+        """Count an LLM call that was skipped or shortened to stay within budget"""
+        self._add(LLMUsage(economy_calls=1))
+
+    def budget_used(self) -> float:
+        """Largest fraction used of the session and daily budgets"""
+        used = 0.0
+        if settings.LLM_SESSION_TOKEN_BUDGET:
+            tokens = self._session_before.total_tokens + self.usage.total_tokens
+            used = max(used, tokens / settings.LLM_SESSION_TOKEN_BUDGET)
+        if settings.LLM_DAILY_TOKEN_BUDGET:
+            tokens = self._daily_before.total_tokens + self.usage.total_tokens
+            used = max(used, tokens / settings.LLM_DAILY_TOKEN_BUDGET)
+        return used
+
+current_usage: contextvars.ContextVar[Optional[UsageScope]] = contextvars.ContextVar(
+    "current_usage", default=None
+)
+
+@contextmanager
+def track_usage(candidate_id: str, session: Optional[InterviewSession] = None):
+    """Account LLM calls made inside the block to the candidate (and session, on exit)"""
+    day = date.today().isoformat()
+    scope = UsageScope(
+        candidate_id,
+        day,
+        session.usage if session is not None else LLMUsage(),
+        repository.get_daily_usage(candidate_id, day)
+    )
+    token = current_usage.set(scope)
+    try:
+        yield scope
+    finally:
+        current_usage.reset(token)
+        if session is not None:
+            session.usage = session.usage + scope.usage
+
+def economy_mode() -> bool:
+    """True once the current candidate/session has nearly used a budget; counts the
+    call the caller is about to skip or shorten"""
+    scope = current_usage.get()
+    if scope is None or scope.budget_used() < settings.LLM_ECONOMY_THRESHOLD:
+        return False
+    scope.record_economy()
+    return True
+
+def budget_exhausted() -> bool:
+    """True once a budget is fully used; even cheap LLM calls are skipped"""
+    scope = current_usage.get()
+    if scope is None or scope.budget_used() < 1.0:
+        return False
+    scope.record_economy()
+    return True
@@ -0,0 +1,169 @@
+﻿"""ResumeParser micro-benchmarks on a synthetic PDF corpus.
+
+Generates the corpus from benchmarks/pdf_corpus.py, then times
+extract_text_from_pdf, extract_contact_info and create_profile_embedding per
+case. The LLM is stubbed with the structured content the PDF was generated
+from. Each case runs in a fresh process so its peak RSS is its own. Run from
+the backend directory:
+
+    python -m benchmarks.bench_resume_parser --save-baseline
+    python -m benchmarks.bench_resume_parser --check
+
+--check compares against the saved baseline and exits 1 if any case is more
+than --tolerance slower (p95 latency, pages/s) or heavier (peak RSS).
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from benchmarks.pdf_corpus import CASES, CorpusCase, build_pdf, resume_content
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "resume_parser.json")
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(latencies, pages: int = 0) -> dict:
+    result = {
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+    }
+    if pages:
+        result["pages_per_s"] = round(pages * len(latencies) / sum(latencies), 2)
+    return result
+
+def timed(fn, iterations: int):
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def run_case(case: CorpusCase, path: str, iterations: int) -> dict:
+    """Runs in a child process; returns the timings and peak RSS of this case alone"""
+    from app.models.schemas import ResumeData
+    from app.services.resume_parser import resume_parser, services
+    from app.utils.llm_client import llm_client
+
+    content = resume_content(case)
+    llm_client.generate_completion = lambda *args, **kwargs: json.dumps(content)
+    resume_data = ResumeData(**content, education=[], raw_text="")
+    services.get("pdf_libraries")
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # The parser prints progress on every call
+    with contextlib.redirect_stdout(io.StringIO()):
+        text = resume_parser.extract_text_from_pdf(path)
+        extract = timed(lambda: resume_parser.extract_text_from_pdf(path), iterations)
+        contact = timed(lambda: resume_parser.extract_contact_info(text), iterations * 20)
+        embedding = timed(lambda: resume_parser.create_profile_embedding(resume_data), iterations * 20)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KB on Linux
+    return {
+        "pages": case.pages,
+        "columns": case.columns,
+        "file_kb": round(os.path.getsize(path) / 1024, 1),
+        "extracted_chars": len(text),
+        "extract_text_from_pdf": summarize(extract, case.pages),
+        "extract_contact_info": summarize(contact),
+        "create_profile_embedding": summarize(embedding),
+        "peak_rss_mb": round(peak / scale, 1),
+        "case_rss_mb": round((peak - rss_before) / scale, 1)
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("cases", {}).get(name)
+        if previous is None:
+            continue
+        for operation in ["extract_text_from_pdf", "extract_contact_info", "create_profile_embedding"]:
+            now, before = current[operation]["p95_ms"], previous[operation]["p95_ms"]
+            if now > before * (1 + tolerance):
+                regressions.append(f"{name} {operation} p95 {before:.2f}ms -> {now:.2f}ms")
+        now, before = current["extract_text_from_pdf"]["pages_per_s"], previous["extract_text_from_pdf"]["pages_per_s"]
+        if now < before / (1 + tolerance):
+            regressions.append(f"{name} extraction {before:.1f} -> {now:.1f} pages/s")
+        if current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name} peak RSS {previous['peak_rss_mb']}MB -> {current['peak_rss_mb']}MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10, help="extractions per case")
+    parser.add_argument("--cases", help="comma-separated case names (default: all)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    cases = CASES
+    if args.cases:
+        wanted = set(args.cases.split(","))
+        cases = [case for case in CASES if case.name in wanted]
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in cases:
+            path = os.path.join(tmp, f"{case.name}.pdf")
+            with open(path, "wb") as f:
+                f.write(build_pdf(case))
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                results[case.name] = pool.apply(run_case, (case, path, args.iterations))
+
+    print(f"{'case':20} {'pages':>5} {'KB':>7} {'pages/s':>9} {'extract p95':>12} "
+          f"{'contact p95':>12} {'embed p95':>10} {'peak RSS':>9}")
+    for name, r in results.items():
+        print(f"{name:20} {r['pages']:>5} {r['file_kb']:>7} "
+              f"{r['extract_text_from_pdf']['pages_per_s']:>9.1f} "
+              f"{r['extract_text_from_pdf']['p95_ms']:>10.1f}ms "
+              f"{r['extract_contact_info']['p95_ms']:>10.2f}ms "
+              f"{r['create_profile_embedding']['p95_ms']:>8.2f}ms "
+              f"{r['peak_rss_mb']:>7.1f}MB")
+
+    if args.save_baseline:
+        import pdfplumber
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "pdfplumber": pdfplumber.__version__,
+                "iterations": args.iterations,
+                "cases": results
+            }, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first")
+            sys.exit(1)
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+﻿"""Serialization cost of a completed interview: the stored log and the API response.
+
+Builds a large synthetic session (many long answers, per-answer scores) and
+times the encoding done by complete_interview:
+
+    legacy  .dict() + jsonable_encoder + json.dumps(default=str, indent=2)
+    current to_data() (model_dump in JSON mode) + serialization.dumps
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --answers 40 --iterations 200
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import warnings
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.schemas import (
+    EvaluationScore, FeedbackReport, InterviewAnswer, InterviewQuestion, InterviewSession, LLMUsage
+)
+from app.utils import serialization
+from app.utils.serialization import dumps, to_data
+
+WORDS = (
+    "designed built shipped scaled migrated optimized led mentored automated reduced "
+    "latency throughput pipeline service platform cluster dashboard model feature team "
+    "customers revenue reliability incidents deployment infrastructure analytics data"
+).split()
+
+def build_session(answers: int, answer_words: int, seed: int = 7):
+    rng = random.Random(seed)
+    text = lambda n: " ".join(rng.choice(WORDS) for _ in range(n))
+    questions = [
+        InterviewQuestion(question_id=f"q{i}", question=text(20) + "?",
+                          category=rng.choice(["hr", "technical", "behavioral"]), difficulty="medium")
+        for i in range(answers)
+    ]
+    session = InterviewSession(
+        session_id="bench-session",
+        candidate_id="bench-candidate",
+        role="Software Engineer",
+        questions=questions,
+        answers=[
+            InterviewAnswer(question_id=q.question_id, question=q.question,
+                            answer=text(answer_words), category=q.category)
+            for q in questions
+        ],
+        started_at=datetime(2024, 1, 1, 9, 0),
+        completed_at=datetime(2024, 1, 1, 9, 45),
+        status="completed",
+        usage=LLMUsage(calls=answers + 2, prompt_tokens=40000, completion_tokens=9000, latency_ms=81234.5)
+    )
+    scores = lambda: {name: round(rng.uniform(40, 95), 1) for name in
+                      ["communication_clarity", "technical_accuracy", "confidence_score", "relevance_score"]}
+    evaluation = EvaluationScore(
+        **scores(), overall_score=71.5,
+        answer_scores={q.question_id: scores() for q in questions}
+    )
+    feedback = FeedbackReport(
+        candidate_id=session.candidate_id,
+        timestamp=session.completed_at,
+        role=session.role,
+        evaluation=evaluation,
+        strengths=[text(25) for _ in range(8)],
+        weaknesses=[text(25) for _ in range(8)],
+        skill_gaps=[text(6) for _ in range(10)],
+        recommendations=[text(30) for _ in range(10)],
+        improvement_roadmap={f"week_{i}": [text(15) for _ in range(4)] for i in range(1, 9)}
+    )
+    return session, evaluation, feedback
+
+def legacy(session, evaluation, feedback):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # .dict() is deprecated in Pydantic v2
+        session_data = {
+            "session_id": session.session_id,
+            "candidate_id": session.candidate_id,
+            "role": session.role,
+            "started_at": str(session.started_at),
+            "completed_at": str(session.completed_at),
+            "questions": [q.dict() for q in session.questions],
+            "answers": [a.dict() for a in session.answers],
+            "evaluation": evaluation.dict(),
+            "feedback": feedback.dict(),
+            "usage": session.usage.dict()
+        }
+        log = json.dumps(session_data, default=str, indent=2).encode()
+        response = {
+            "success": True,
+            "session_id": session.session_id,
+            "evaluation": {
+                "communication_clarity": evaluation.communication_clarity,
+                "technical_accuracy": evaluation.technical_accuracy,
+                "confidence_score": evaluation.confidence_score,
+                "relevance_score": evaluation.relevance_score,
+                "overall_score": evaluation.overall_score
+            },
+            "readiness_score": 68.2,
+            "strengths": feedback.strengths,
+            "weaknesses": feedback.weaknesses,
+            "skill_gaps": feedback.skill_gaps,
+            "recommendations": feedback.recommendations,
+            "improvement_roadmap": feedback.improvement_roadmap,
+            "usage": session.usage.dict()
+        }
+        # What FastAPI does with a returned dict: jsonable_encoder, then JSONResponse.render
+        body = json.dumps(jsonable_encoder(response), ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode()
+    return log, body
+
+def current(session, evaluation, feedback):
+    session_data = {
+        "session_id": session.session_id,
+        "candidate_id": session.candidate_id,
+        "role": session.role,
+        "started_at": str(session.started_at),
+        "completed_at": str(session.completed_at),
+        "questions": [to_data(q) for q in session.questions],
+        "answers": [to_data(a) for a in session.answers],
+        "evaluation": to_data(evaluation),
+        "feedback": to_data(feedback),
+        "usage": to_data(session.usage)
+    }
+    log = dumps(session_data)
+    body = dumps({
+        "success": True,
+        "session_id": session.session_id,
+        "evaluation": to_data(evaluation, exclude={"answer_scores"}),
+        "readiness_score": 68.2,
+        "strengths": feedback.strengths,
+        "weaknesses": feedback.weaknesses,
+        "skill_gaps": feedback.skill_gaps,
+        "recommendations": feedback.recommendations,
+        "improvement_roadmap": feedback.improvement_roadmap,
+        "usage": session_data["usage"]
+    })
+    return log, body
+
+def measure(fn, args, iterations: int) -> dict:
+    fn(*args)
+    latencies = []
+    for _ in range(iterations):
+        started = time.process_time()
+        log, body = fn(*args)
+        latencies.append(time.process_time() - started)
+    return {
+        "mean_us": statistics.mean(latencies) * 1e6,
+        "p50_us": statistics.median(latencies) * 1e6,
+        "log_bytes": len(log),
+        "body_bytes": len(body)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--answers", type=int, default=40)
+    parser.add_argument("--answer-words", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = build_session(args.answers, args.answer_words)
+    results = {
+        "legacy": measure(legacy, payload, args.iterations),
+        "current": measure(current, payload, args.iterations)
+    }
+    encoder = "orjson" if serialization.orjson is not None else "json (orjson not installed)"
+    print(f"{args.answers} answers x {args.answer_words} words, encoder: {encoder}\n")
+    print(f"{'path':8} {'CPU mean':>11} {'CPU p50':>11} {'log bytes':>10} {'body bytes':>11}")
+    for name, r in results.items():
+        print(f"{name:8} {r['mean_us']:>9.0f}us {r['p50_us']:>9.0f}us {r['log_bytes']:>10} {r['body_bytes']:>11}")
+    saved = results["legacy"]["mean_us"] - results["current"]["mean_us"]
+    print(f"\nCPU saved per completed interview: {saved:.0f}us "
+          f"({results['legacy']['mean_us'] / results['current']['mean_us']:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+﻿"""Storage throughput per endpoint: dict path vs SQLite (WAL).
+
+Replays the repository calls each endpoint makes and reports operations per
+second. Run from the backend directory:
+
+    python -m benchmarks.bench_storage --candidates 200 --threads 8
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.models.repository import InMemoryRepository, SQLiteRepository
+from app.models.schemas import (
+    CareerTwinProfile, ResumeData, InterviewQuestion, InterviewAnswer,
+    InterviewSession, FeedbackReport, EvaluationScore
+)
+
+QUESTIONS_PER_SESSION = 10
+
+def make_profile() -> CareerTwinProfile:
+    resume = ResumeData(
+        name="Benchmark Candidate",
+        skills=["python", "sql", "docker", "aws", "react"] * 4,
+        experience=[{"title": "Engineer", "company": "Acme", "description": "Built services " * 20}] * 3,
+        projects=[{"name": "Project", "description": "A project " * 20}] * 3,
+        summary="Experienced engineer " * 10,
+        raw_text="resume text " * 800
+    )
+    return CareerTwinProfile(
+        candidate_id=str(uuid.uuid4()),
+        name=resume.name,
+        resume_data=resume,
+        target_roles=["Software Engineer", "ML Engineer"],
+        skill_embeddings=[0.5] * 1536,
+        created_at=datetime.now(),
+        updated_at=datetime.now()
+    )
+
+def make_session(candidate_id: str) -> InterviewSession:
+    return InterviewSession(
+        session_id=str(uuid.uuid4()),
+        candidate_id=candidate_id,
+        role="Software Engineer",
+        questions=[
+            InterviewQuestion(
+                question_id=str(uuid.uuid4()),
+                question=f"Question {i} about distributed systems?",
+                category="technical",
+                difficulty="medium"
+            )
+            for i in range(QUESTIONS_PER_SESSION)
+        ],
+        started_at=datetime.now()
+    )
+
+def make_feedback(candidate_id: str) -> FeedbackReport:
+    return FeedbackReport(
+        candidate_id=candidate_id,
+        timestamp=datetime.now(),
+        role="Software Engineer",
+        evaluation=EvaluationScore(
+            communication_clarity=70, technical_accuracy=65,
+            confidence_score=60, relevance_score=80, overall_score=68
+        ),
+        strengths=["Clear structure"] * 3,
+        weaknesses=["Shallow depth"] * 3,
+        skill_gaps=["Kubernetes"] * 3,
+        recommendations=["Practice system design"] * 3,
+        improvement_roadmap={"week_1": ["Review"], "week_2_3": ["Mock"], "month_1": ["Apply"]}
+    )
+
+def run_endpoint(name, fn, items, threads):
+    start = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(fn, items))
+    else:
+        for item in items:
+            fn(item)
+    elapsed = time.perf_counter() - start
+    return name, len(items), elapsed
+
+def bench(repo, candidates: int, threads: int):
+    profiles = [make_profile() for _ in range(candidates)]
+    sessions = [make_session(p.candidate_id) for p in profiles]
+    answer_items = [(s, q) for s in sessions for q in s.questions]
+
+    def start(session):
+        repo.get_profile(session.candidate_id)
+        repo.save_session(session)
+
+    def answer(item):
+        session, question = item
+        repo.get_session(session.session_id)
+        repo.add_answer(session.session_id, InterviewAnswer(
+            question_id=question.question_id,
+            question=question.question,
+            answer="A detailed answer about consistency and partitioning. " * 10,
+            category=question.category
+        ))
+
+    def complete(session):
+        loaded = repo.get_session(session.session_id)
+        repo.get_profile(session.candidate_id)
+        loaded.status = "completed"
+        loaded.completed_at = datetime.now()
+        repo.save_session(loaded)
+        repo.save_feedback(session.session_id, make_feedback(session.candidate_id))
+
+    def feedback(session):
+        repo.get_feedback(session.session_id)
+        repo.get_session(session.session_id)
+
+    def progress(profile):
+        repo.has_profile(profile.candidate_id)
+        repo.list_completed_sessions(profile.candidate_id)
+        repo.list_feedback(profile.candidate_id)
+
+    return [
+        run_endpoint("POST /api/profile/create", repo.save_profile, profiles, threads),
+        run_endpoint("GET /api/profile/{id}", lambda p: repo.get_profile(p.candidate_id), profiles, threads),
+        run_endpoint("POST /api/interview/start", start, sessions, threads),
+        run_endpoint("POST /api/interview/answer", answer, answer_items, threads),
+        run_endpoint("POST /api/interview/complete", complete, sessions, threads),
+        run_endpoint("GET /api/feedback/{id}", feedback, sessions, threads),
+        run_endpoint("GET /api/progress/{id}", progress, profiles, threads),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--cache-mb", type=int, default=64, help="hot cache budget per entity type")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_bytes = args.cache_mb * 1024 * 1024
+        backends = [
+            ("memory", InMemoryRepository(os.path.join(tmp, "spill"), cache_bytes, cache_bytes, cache_bytes)),
+            ("sqlite", SQLiteRepository(os.path.join(tmp, "bench.db"), args.pool_size, 5000,
+                                        cache_bytes, cache_bytes))
+        ]
+        results = {name: bench(repo, args.candidates, args.threads) for name, repo in backends}
+        stats = {name: repo.stats() for name, repo in backends}
+        for _, repo in backends:
+            repo.close()
+
+    print(f"{'endpoint':32} {'ops':>7} {'memory ops/s':>14} {'sqlite ops/s':>14} {'ratio':>8}")
+    for mem, sql in zip(results["memory"], results["sqlite"]):
+        name, ops, mem_elapsed = mem
+        sql_elapsed = sql[2]
+        mem_rate = ops / mem_elapsed
+        sql_rate = ops / sql_elapsed
+        print(f"{name:32} {ops:>7} {mem_rate:>14,.0f} {sql_rate:>14,.0f} {sql_rate / mem_rate:>8.3f}")
+
+    for name, backend_stats in stats.items():
+        print(f"\n{name} hot caches:")
+        for cache, values in backend_stats.items():
+            if isinstance(values, dict):
+                print(f"  {cache:20} {values}")
+
+if __name__ == "__main__":
+    main()
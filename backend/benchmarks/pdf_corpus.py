@@ -0,0 +1,183 @@
+﻿"""Deterministic synthetic resume PDFs for the parser benchmarks.
+
+Writes PDF 1.4 files directly, so no PDF library is needed. A case can have
+several pages, one to three text columns, and optionally a large embedded
+TrueType font program.
+"""
+import random
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 48
+LINE_HEIGHT = 13
+FONT_SIZE = 10
+
+SKILLS = [
+    "Python", "SQL", "Docker", "Kubernetes", "AWS", "React", "TypeScript", "PostgreSQL",
+    "Redis", "Kafka", "PyTorch", "TensorFlow", "FastAPI", "Terraform", "Go", "Spark"
+]
+WORDS = (
+    "designed built shipped scaled migrated optimized led mentored automated reduced "
+    "latency throughput pipeline service platform cluster dashboard model feature team "
+    "customers revenue reliability incidents deployment infrastructure analytics data"
+).split()
+
+@dataclass
+class CorpusCase:
+    name: str
+    pages: int
+    columns: int
+    embedded_font_kb: int = 0
+
+CASES = [
+    CorpusCase("single_column_1p", pages=1, columns=1),
+    CorpusCase("single_column_3p", pages=3, columns=1),
+    CorpusCase("two_column_2p", pages=2, columns=2),
+    CorpusCase("three_column_1p", pages=1, columns=3),
+    CorpusCase("long_10p", pages=10, columns=1),
+    CorpusCase("embedded_font_2p", pages=2, columns=2, embedded_font_kb=2048),
+]
+
+def resume_content(case: CorpusCase, seed: int = 7) -> Dict:
+    """Structured resume behind a case, also used as the stubbed LLM parse result"""
+    rng = random.Random(f"{case.name}:{seed}")
+    sentence = lambda n: " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+    jobs = max(2, case.pages * 3)
+    return {
+        "name": f"Candidate {case.name.replace('_', ' ').title()}",
+        "email": f"{case.name}@example.com",
+        "phone": "+1 (555) 010-" + str(rng.randint(1000, 9999)),
+        "summary": " ".join(sentence(14) for _ in range(3)),
+        "skills": rng.sample(SKILLS, 10),
+        "experience": [
+            {
+                "title": rng.choice(["Software Engineer", "Data Engineer", "ML Engineer"]),
+                "company": f"Company {i}",
+                "description": " ".join(sentence(16) for _ in range(4))
+            }
+            for i in range(jobs)
+        ],
+        "projects": [
+            {"name": f"Project {i}", "description": " ".join(sentence(12) for _ in range(2))}
+            for i in range(jobs // 2)
+        ],
+    }
+
+def _wrap(text: str, width_chars: int) -> List[str]:
+    lines, current = [], ""
+    for word in text.split():
+        if current and len(current) + 1 + len(word) > width_chars:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+def _text_lines(content: Dict) -> List[tuple]:
+    """(font, text) lines in reading order; wrapped later to the column width"""
+    lines = [("F2", content["name"]), ("F1", f"{content['email']} | {content['phone']}"), ("F1", "")]
+    lines += [("F2", "Summary"), ("F1", content["summary"]), ("F1", "")]
+    lines += [("F2", "Skills"), ("F1", ", ".join(content["skills"])), ("F1", "")]
+    lines.append(("F2", "Experience"))
+    for job in content["experience"]:
+        lines += [("F2", f"{job['title']} - {job['company']}"), ("F1", job["description"])]
+    lines += [("F1", ""), ("F2", "Projects")]
+    for project in content["projects"]:
+        lines += [("F2", project["name"]), ("F1", project["description"])]
+    return lines
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _page_streams(case: CorpusCase, content: Dict, body_font: str) -> List[bytes]:
+    column_width = (PAGE_WIDTH - 2 * MARGIN - (case.columns - 1) * 18) / case.columns
+    width_chars = int(column_width / (FONT_SIZE * 0.5))
+    rows_per_column = int((PAGE_HEIGHT - 2 * MARGIN) / LINE_HEIGHT)
+
+    wrapped = []
+    for font, text in _text_lines(content):
+        font = body_font if font == "F1" else font
+        wrapped += [(font, part) for part in (_wrap(text, width_chars) or [""])]
+
+    # Repeat the content so the requested page count is filled
+    slots = case.pages * case.columns * rows_per_column
+    while len(wrapped) < slots:
+        wrapped += wrapped[:slots - len(wrapped)]
+
+    streams = []
+    for page in range(case.pages):
+        ops = ["0.9 g", f"{MARGIN} {PAGE_HEIGHT - MARGIN + 6} {PAGE_WIDTH - 2 * MARGIN} 2 re f", "0 g"]
+        for column in range(case.columns):
+            x = MARGIN + column * (column_width + 18)
+            start = (page * case.columns + column) * rows_per_column
+            for row, (font, text) in enumerate(wrapped[start:start + rows_per_column]):
+                if text:
+                    y = PAGE_HEIGHT - MARGIN - row * LINE_HEIGHT
+                    ops.append(f"BT /{font} {FONT_SIZE} Tf {x:.1f} {y} Td ({_escape(text)}) Tj ET")
+        streams.append("\n".join(ops).encode("latin-1"))
+    return streams
+
+def build_pdf(case: CorpusCase, seed: int = 7) -> bytes:
+    content = resume_content(case, seed)
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    def stream(data: bytes, extra: str = "") -> bytes:
+        compressed = zlib.compress(data, 6)
+        return (f"<< /Length {len(compressed)} /Filter /FlateDecode {extra}>>\nstream\n".encode()
+                + compressed + b"\nendstream")
+
+    fonts = {
+        "F1": add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"),
+        "F2": add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"),
+    }
+    body_font = "F1"
+    if case.embedded_font_kb:
+        # Seeded random bytes stand in for the font program: it is only carried through the
+        # object and stream layers, which is the cost this case measures
+        program = random.Random(f"font:{seed}").randbytes(case.embedded_font_kb * 1024)
+        font_file = add(stream(program, f"/Length1 {len(program)} "))
+        descriptor = add(
+            f"<< /Type /FontDescriptor /FontName /SyntheticSans /Flags 32 /FontBBox [-200 -250 1200 950] "
+            f"/ItalicAngle 0 /Ascent 900 /Descent -250 /CapHeight 700 /StemV 80 /FontFile2 {font_file} 0 R >>".encode()
+        )
+        widths = " ".join("500" for _ in range(32, 127))
+        fonts["F3"] = add(
+            f"<< /Type /Font /Subtype /TrueType /BaseFont /SyntheticSans /FirstChar 32 /LastChar 126 "
+            f"/Widths [{widths}] /Encoding /WinAnsiEncoding /FontDescriptor {descriptor} 0 R >>".encode()
+        )
+        body_font = "F3"
+
+    font_resources = " ".join(f"/{name} {ref} 0 R" for name, ref in fonts.items())
+    pages_ref = len(objects) + 1
+    objects.append(b"")  # Pages placeholder, filled once the kids are known
+
+    kids = []
+    for data in _page_streams(case, content, body_font):
+        contents = add(stream(data))
+        kids.append(add(
+            f"<< /Type /Page /Parent {pages_ref} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << {font_resources} >> >> /Contents {contents} 0 R >>".encode()
+        ))
+    objects[pages_ref - 1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+    )
+    catalog = add(f"<< /Type /Catalog /Pages {pages_ref} 0 R >>".encode())
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
@@ -0,0 +1,47 @@
+﻿"""Shared test setup. The backend directory is importable as the app package,
+and every path the module-level services write to points into a temporary
+directory, so importing app modules never touches ./data."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND))
+
+_DATA = tempfile.mkdtemp(prefix="career-twin-tests-")
+for name, relative in {
+    "VECTOR_DB_PATH": "vectorstore",
+    "RESUME_UPLOAD_PATH": "resumes",
+    "INTERVIEW_LOGS_PATH": "interviews",
+    "ANALYTICS_PATH": "analytics",
+    "REGRADE_PATH": "regrade",
+    "SQLITE_PATH": "career_twin.db",
+    "SPILL_PATH": "spill",
+    "JOBS_DB_PATH": "jobs.db",
+    "COHORT_SKETCH_PATH": "cohort",
+    "LLM_ROUTES_PATH": "llm_routes.json"
+}.items():
+    os.environ[name] = os.path.join(_DATA, relative)
+# The LLM client is created (never called) when a test replaces one of its methods
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+class FakeLLM:
+    """Stands in for llm_client.generate_completion; reply(prompt, **kwargs)
+    returns the completion text or raises"""
+
+    def __init__(self):
+        self.calls = []
+        self.reply = lambda prompt, **kwargs: "{}"
+
+    def __call__(self, prompt, **kwargs):
+        self.calls.append(prompt)
+        return self.reply(prompt, **kwargs)
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    from app.utils.llm_client import llm_client
+    fake = FakeLLM()
+    monkeypatch.setattr(llm_client, "generate_completion", fake)
+    return fake
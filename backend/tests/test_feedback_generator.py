@@ -0,0 +1,104 @@
+﻿"""Feedback map-reduce: critique dedup and caching, and the reduce retry."""
+import json
+import threading
+from app.models.schemas import EvaluationScore, InterviewAnswer, ResumeData
+from app.services.feedback_generator import FeedbackGenerator
+from app.utils.llm_resilience import CircuitOpenError
+
+CRITIQUE = json.dumps({"summary": "Explained caching", "strengths": ["specific"], "weaknesses": []})
+FEEDBACK = json.dumps({
+    "strengths": ["clear"], "weaknesses": ["brief"], "skill_gaps": ["systems"],
+    "recommendations": ["practice"], "improvement_roadmap": {"week_1": ["mock interview"]}
+})
+EVALUATION = EvaluationScore(communication_clarity=80, technical_accuracy=70, confidence_score=75,
+                             relevance_score=90, overall_score=78)
+
+def make_generator(**overrides) -> FeedbackGenerator:
+    options = dict(critique_max_tokens=200, cache_max_bytes=1 << 20, excerpt_chars=100,
+                   reduce_attempts=2, max_workers=2)
+    options.update(overrides)
+    return FeedbackGenerator(**options)
+
+def make_answer(text="I put a cache in front of the database") -> InterviewAnswer:
+    return InterviewAnswer(question_id="q1", question="How did you scale reads?",
+                           answer=text, category="technical")
+
+def is_critique(prompt: str) -> bool:
+    return prompt.startswith("Critique this answer")
+
+def generate(generator, answers):
+    return generator.generate_comprehensive_feedback(
+        "candidate", "Backend Engineer", answers, EVALUATION, ResumeData(raw_text="", skills=["python"])
+    )
+
+def test_critique_runs_once_per_answer(fake_llm):
+    release = threading.Event()
+
+    def reply(prompt, **kwargs):
+        if is_critique(prompt):
+            release.wait(5)
+            return CRITIQUE
+        return FEEDBACK
+
+    fake_llm.reply = reply
+    generator = make_generator()
+    answer = make_answer()
+    assert generator.schedule_critique(answer, "Backend Engineer")
+    # A resubmitted identical answer joins the running critique
+    assert generator.schedule_critique(make_answer(), "Backend Engineer")
+    release.set()
+
+    report = generate(generator, [answer])
+    assert report.strengths == ["clear"]
+    assert len([p for p in fake_llm.calls if is_critique(p)]) == 1
+    stats = generator.stats()
+    assert stats["critiques_scheduled"] == 1
+    assert stats["critiques_awaited"] + stats["critiques_cached"] == 1
+
+    # Cached now, so completing again makes no critique call
+    generator.collect_critiques([answer], "Backend Engineer")
+    assert len([p for p in fake_llm.calls if is_critique(p)]) == 1
+    assert generator.stats()["critiques_cached"] >= 1
+
+def test_failed_reduce_is_retried_without_new_critiques(fake_llm):
+    reduce_calls = []
+
+    def reply(prompt, **kwargs):
+        if is_critique(prompt):
+            return CRITIQUE
+        reduce_calls.append(prompt)
+        if len(reduce_calls) == 1:
+            raise RuntimeError("upstream error")
+        return FEEDBACK
+
+    fake_llm.reply = reply
+    generator = make_generator(reduce_attempts=2)
+    report = generate(generator, [make_answer()])
+
+    assert report.recommendations == ["practice"]
+    assert len(reduce_calls) == 2
+    assert "Summary: Explained caching" in reduce_calls[-1]
+    assert len([p for p in fake_llm.calls if is_critique(p)]) == 1
+    stats = generator.stats()
+    assert stats["reduce_retries"] == 1
+    assert stats["reduce_failures"] == 0
+
+def test_open_circuit_skips_reduce_retries(fake_llm):
+    reduce_calls = []
+
+    def reply(prompt, **kwargs):
+        if is_critique(prompt):
+            return CRITIQUE
+        reduce_calls.append(prompt)
+        raise CircuitOpenError("LLM circuit is open")
+
+    fake_llm.reply = reply
+    generator = make_generator(reduce_attempts=3)
+    report = generate(generator, [make_answer()])
+
+    # The local fallback report
+    assert report.recommendations[0] == "Practice mock interviews regularly"
+    assert len(reduce_calls) == 1
+    stats = generator.stats()
+    assert stats["reduce_retries"] == 0
+    assert stats["reduce_failures"] == 1
@@ -0,0 +1,106 @@
+﻿"""Interview log recovery: torn or corrupt records, failed batches and compaction."""
+import os
+import pytest
+from app.models import interview_log as interview_log_module
+from app.models.interview_log import HEADER, InterviewLogWriteError, SegmentedInterviewLog
+
+def make_log(path, **overrides) -> SegmentedInterviewLog:
+    options = dict(segment_max_bytes=1 << 20, batch_size=10, flush_interval=0.01,
+                   queue_size=100, refresh_interval=0)
+    options.update(overrides)
+    return SegmentedInterviewLog(str(path), **options)
+
+def write_logs(path, *logs):
+    log = make_log(path)
+    for session_id, data in logs:
+        log.append(session_id, "candidate", data)
+    log.close()
+    return log
+
+def only_segment(path) -> str:
+    (segment,) = [name for name in os.listdir(path) if name.endswith(".log")]
+    return os.path.join(path, segment)
+
+def test_torn_tail_record_is_dropped_on_index_rebuild(tmp_path):
+    write_logs(tmp_path, ("s1", {"score": 1}), ("s2", {"score": 2}))
+    segment = only_segment(tmp_path)
+    # A crash mid-append: the last record lost its end, and the index was never written
+    os.truncate(segment, os.path.getsize(segment) - 3)
+    os.remove(segment[:-4] + ".idx")
+
+    log = make_log(tmp_path)
+    assert log.get("s1") == {"score": 1}
+    assert log.get("s2") is None
+    assert log.session_ids_for_candidate("candidate") == ["s1"]
+
+def test_scan_resyncs_past_a_corrupt_record(tmp_path):
+    write_logs(tmp_path, ("s1", {"score": 1}), ("s2", {"score": 2}), ("s3", {"score": 3}))
+    segment = only_segment(tmp_path)
+    with open(segment, "r+b") as f:
+        length, _ = HEADER.unpack(f.read(HEADER.size))
+        second = HEADER.size + length
+        f.seek(second + HEADER.size + 2)
+        f.write(b"\xff\xff")
+    os.remove(segment[:-4] + ".idx")
+
+    log = make_log(tmp_path)
+    assert log.get("s1") == {"score": 1}
+    assert log.get("s2") is None
+    assert log.get("s3") == {"score": 3}
+
+def test_failed_batch_is_cut_off_and_retried_in_a_new_segment(tmp_path, monkeypatch):
+    monkeypatch.setattr(interview_log_module, "RETRY_DELAY_MIN", 0.05)
+    log = make_log(tmp_path)
+    log.append("s1", "candidate", {"score": 1})
+    log.flush()
+
+    real_append = SegmentedInterviewLog._append_records
+    failures = []
+
+    def torn_append(self, batch, index_lines, offset):
+        if not failures:
+            failures.append(len(batch))
+            # Part of a record reaches the disk before the write fails
+            self._segment_file.write(b"\x00" * 7)
+            self._segment_file.flush()
+            raise OSError("No space left on device")
+        return real_append(self, batch, index_lines, offset)
+
+    monkeypatch.setattr(SegmentedInterviewLog, "_append_records", torn_append)
+    log.append("s2", "candidate", {"score": 2})
+    with pytest.raises(InterviewLogWriteError):
+        log.flush()
+    # Served from memory until the retry succeeds
+    assert log.get("s2") == {"score": 2}
+
+    log._queue.put(None)  # wakes the writer and seals once the retry succeeds
+    log._writer.join(timeout=5)
+    log.flush()
+    assert log.stats()["write_errors"] == 1
+
+    reopened = make_log(tmp_path)
+    assert reopened.get("s1") == {"score": 1}
+    assert reopened.get("s2") == {"score": 2}
+    segments = sorted(name for name in os.listdir(tmp_path) if name.endswith(".log"))
+    assert len(segments) == 2
+    # The torn bytes were cut off the first segment, which only holds s1
+    first = os.path.join(tmp_path, segments[0])
+    with open(first, "rb") as f:
+        length, _ = HEADER.unpack(f.read(HEADER.size))
+    assert os.path.getsize(first) == HEADER.size + length
+
+def test_compact_keeps_the_latest_record_per_session(tmp_path):
+    write_logs(tmp_path, ("s1", {"version": 1}), ("s2", {"version": 1}))
+    write_logs(tmp_path, ("s1", {"version": 2}))
+
+    log = make_log(tmp_path)
+    result = log.compact()
+    assert result["segments_in"] == 2
+    assert result["records_kept"] == 2
+    assert result["records_dropped"] == 1
+
+    reopened = make_log(tmp_path)
+    assert reopened.get("s1") == {"version": 2}
+    assert reopened.get("s2") == {"version": 1}
+    assert sorted(data["version"] for data in reopened.iter_logs()) == [1, 2]
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".log")]) == 1
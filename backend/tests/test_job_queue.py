@@ -0,0 +1,110 @@
+﻿"""Job queue leases: renewal while a handler runs, takeover of an expired
+lease, and dropping the outcome of a worker that lost its lease."""
+import time
+import pytest
+from fastapi import HTTPException
+from app.models.job_queue import JobQueue, JobQueueFull
+
+def make_queue(tmp_path, **overrides) -> JobQueue:
+    options = dict(busy_timeout_ms=1000, max_queued=10, lease_seconds=0.3, max_attempts=2,
+                   dedup_seconds=60, retention_seconds=3600, poll_interval=0.02)
+    options.update(overrides)
+    return JobQueue(str(tmp_path / "jobs.db"), **options)
+
+@pytest.fixture
+def queues():
+    created = []
+    yield created
+    for job_queue in created:
+        job_queue.close()
+
+def wait_until_finished(job_queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = job_queue.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_lease_is_renewed_while_the_handler_runs(tmp_path, queues):
+    job_queue = make_queue(tmp_path, lease_seconds=0.3)
+    other_process = make_queue(tmp_path, lease_seconds=0.3)
+    queues.extend([job_queue, other_process])
+    job_queue.register("slow", lambda payload: time.sleep(1.0) or {"done": payload["n"]}, concurrency=1)
+    job_queue.start()
+
+    job, created = job_queue.submit("slow", {"n": 1})
+    assert created
+    while job_queue.get(job["job_id"])["status"] == "queued":
+        time.sleep(0.01)
+    # Well past the lease, another process still cannot claim the running job
+    deadline = time.monotonic() + 0.8
+    while time.monotonic() < deadline:
+        assert other_process._claim("slow", "other-worker") is None
+        time.sleep(0.05)
+
+    finished = wait_until_finished(job_queue, job["job_id"])
+    assert finished["status"] == "succeeded"
+    assert finished["attempts"] == 1
+    assert job_queue.result(job["job_id"])[1] == {"done": 1}
+    assert job_queue.stats()["lease_lost"] == 0
+
+def test_expired_lease_is_taken_over_and_the_old_outcome_dropped(tmp_path, queues):
+    job_queue = make_queue(tmp_path, lease_seconds=0.1)
+    queues.append(job_queue)
+    job_queue.register("work", lambda payload: {}, concurrency=1)
+    job, _ = job_queue.submit("work", {"n": 1})
+
+    assert job_queue._claim("work", "worker-1")[0] == job["job_id"]
+    time.sleep(0.15)  # worker-1 stopped renewing, e.g. its process died
+    assert job_queue._claim("work", "worker-2")[0] == job["job_id"]
+
+    job_queue._finish(job["job_id"], "worker-1", {"by": "worker-1"})
+    assert job_queue.get(job["job_id"])["status"] == "running"
+    assert job_queue.stats()["lease_lost"] == 1
+
+    job_queue._finish(job["job_id"], "worker-2", {"by": "worker-2"})
+    finished, result = job_queue.result(job["job_id"])
+    assert finished["status"] == "succeeded"
+    assert finished["attempts"] == 2
+    assert result == {"by": "worker-2"}
+
+def test_expired_lease_on_the_last_attempt_fails_the_job(tmp_path, queues):
+    job_queue = make_queue(tmp_path, lease_seconds=0.1, max_attempts=1)
+    queues.append(job_queue)
+    job_queue.register("work", lambda payload: {}, concurrency=1)
+    job, _ = job_queue.submit("work", {})
+
+    assert job_queue._claim("work", "worker-1") is not None
+    time.sleep(0.15)
+    assert job_queue._claim("work", "worker-2") is None
+    failed = job_queue.get(job["job_id"])
+    assert failed["status"] == "failed"
+    assert failed["error"]["status"] == 500
+
+def test_handler_errors_keep_their_status(tmp_path, queues):
+    job_queue = make_queue(tmp_path)
+    queues.append(job_queue)
+
+    def handler(payload):
+        raise HTTPException(404, "Session not found")
+
+    job_queue.register("work", handler, concurrency=1)
+    job_queue.start()
+    job, _ = job_queue.submit("work", {})
+    finished = wait_until_finished(job_queue, job["job_id"])
+    assert finished["status"] == "failed"
+    assert finished["error"] == {"status": 404, "detail": "Session not found"}
+
+def test_submissions_are_deduplicated_and_bounded(tmp_path, queues):
+    job_queue = make_queue(tmp_path, max_queued=1)
+    queues.append(job_queue)
+    job_queue.register("work", lambda payload: {}, concurrency=1)
+
+    job, created = job_queue.submit("work", {}, dedup_key="same")
+    duplicate, duplicate_created = job_queue.submit("work", {}, dedup_key="same")
+    assert created and not duplicate_created
+    assert duplicate["job_id"] == job["job_id"]
+    with pytest.raises(JobQueueFull):
+        job_queue.submit("work", {}, dedup_key="other")
@@ -0,0 +1,149 @@
+﻿"""LLM resilience: circuit breaker transitions and half-open probing, and
+hedged requests releasing their slot."""
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from app.utils import llm_client as llm_client_module
+from app.utils.llm_client import LLMClient
+from app.utils.llm_resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, HedgeStats, LatencyWindow
+)
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(window_seconds=60, min_calls=4, failure_rate=0.5, slow_seconds=1.0, open_seconds=0.1)
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+def trip(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        breaker.acquire()
+        breaker.record(0.01, error=True)
+    assert breaker.state == OPEN
+
+def test_breaker_opens_on_failure_rate_and_rejects_calls():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.acquire()
+        breaker.record(0.01)
+    breaker.acquire()
+    breaker.record(0.01, error=True)
+    assert breaker.state == CLOSED  # below min_calls
+
+    breaker.acquire()
+    breaker.record(5.0)  # slow calls count as failures
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    stats = breaker.stats()
+    assert stats["trips"] == 1
+    assert stats["rejected"] == 1
+    assert stats["errors"] == 1
+    assert stats["slow"] == 1
+
+def test_half_open_lets_one_probe_through_and_closes_on_success():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.12)
+    assert not breaker.is_open()
+
+    breaker.acquire()  # the probe
+    assert breaker.state == HALF_OPEN
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+    breaker.record(0.01)
+    assert breaker.state == CLOSED
+    breaker.acquire()
+    assert breaker.stats()["calls_in_window"] == 0
+
+def test_failed_probe_reopens_for_another_period():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.12)
+    breaker.acquire()
+    breaker.record(0.01, error=True)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+    time.sleep(0.12)
+    breaker.acquire()
+    assert breaker.state == HALF_OPEN
+
+def test_released_probe_lets_the_next_call_probe():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.12)
+    breaker.acquire()
+    breaker.release()  # e.g. a client error, which says nothing about the backend
+    breaker.acquire()
+    assert breaker.state == HALF_OPEN
+
+class FakeClient:
+    """OpenAI-style client whose nth request takes delays[n] seconds"""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.started = []
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        with self.lock:
+            index = len(self.started)
+            self.started.append(index)
+        time.sleep(self.delays[index])
+        return SimpleNamespace(usage=None, request=index)
+
+@pytest.fixture
+def hedging(monkeypatch):
+    latency = LatencyWindow(size=10, percentile=50, min_samples=1, min_delay=0.05)
+    latency.observe("target", 0.05)
+    hedges = HedgeStats()
+    monkeypatch.setattr(llm_client_module, "llm_latency", latency)
+    monkeypatch.setattr(llm_client_module, "llm_hedges", hedges)
+    client = LLMClient()
+    client._hedge_slots = threading.BoundedSemaphore(1)
+    return client, hedges
+
+def wait_for_slot(slots, timeout=2.0) -> bool:
+    if not slots.acquire(timeout=timeout):
+        return False
+    slots.release()
+    return True
+
+def test_hedge_wins_and_releases_its_slot_after_both_finish(hedging):
+    client, hedges = hedging
+    upstream = FakeClient(0.4, 0.01)
+
+    response = client._hedged_request(upstream, {}, "target", hedge=True)
+    assert response.request == 1
+    assert hedges.stats()["won"] == 1
+    # The primary is still running, so the slot is still held
+    assert not client._hedge_slots.acquire(blocking=False)
+    assert wait_for_slot(client._hedge_slots)
+
+def test_hedge_is_skipped_without_a_free_slot(hedging):
+    client, hedges = hedging
+    client._hedge_slots.acquire()
+    upstream = FakeClient(0.15)
+
+    response = client._hedged_request(upstream, {}, "target", hedge=True)
+    assert response.request == 0
+    assert upstream.started == [0]
+    assert hedges.stats()["skipped"] == 1
+    client._hedge_slots.release()
+
+def test_no_hedge_before_the_latency_window_has_samples(hedging, monkeypatch):
+    client, hedges = hedging
+    monkeypatch.setattr(llm_client_module, "llm_latency",
+                        LatencyWindow(size=10, percentile=50, min_samples=5, min_delay=0.05))
+    upstream = FakeClient(0.1)
+
+    assert client._hedged_request(upstream, {}, "target", hedge=True).request == 0
+    assert upstream.started == [0]
+    stats = hedges.stats()
+    assert stats["won"] == stats["lost"] == stats["skipped"] == 0
@@ -0,0 +1,66 @@
+﻿"""Startup stays cheap: importing the app and serving /health must not build
+the heavy services (see the Startup section of the README)."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+# Same budget as `python -m app.core.container --budget-ms 800`
+STARTUP_BUDGET_MS = 800
+
+HEAVY_MODULES = ["openai", "chromadb", "pdfplumber", "PyPDF2", "pandas", "pyarrow"]
+HEAVY_SERVICES = ["llm_client", "vector_db", "pdf_libraries", "analytics_store"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+import_ms = (time.perf_counter() - started) * 1000
+
+from fastapi.testclient import TestClient
+from app.core.container import services
+with TestClient(app.main.app) as client:
+    health = client.get("/health")
+
+print(json.dumps({
+    "import_ms": import_ms,
+    "health_status": health.status_code,
+    "modules": [name for name in %r if name in sys.modules],
+    "services": [name for name in %r if services.initialized(name)]
+}))
+""" % (HEAVY_MODULES, HEAVY_SERVICES)
+
+@pytest.fixture(scope="module")
+def probe(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("startup")
+    data = tmp_path / "data"
+    env = {
+        "PATH": "",
+        "OPENAI_API_KEY": "",
+        "WARM_UP_ON_STARTUP": "False",
+        "VECTOR_DB_PATH": str(data / "vectorstore"),
+        "RESUME_UPLOAD_PATH": str(data / "resumes"),
+        "INTERVIEW_LOGS_PATH": str(data / "interviews"),
+        "JOBS_DB_PATH": str(data / "jobs.db"),
+        "COHORT_SKETCH_PATH": str(data / "cohort"),
+        "REGRADE_PATH": str(data / "regrade"),
+        "SQLITE_PATH": str(data / "career_twin.db")
+    }
+    # A fresh interpreter, so modules imported by other tests do not count
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=tmp_path, env={**env, "PYTHONPATH": str(BACKEND)},
+        capture_output=True, text=True, timeout=60
+    )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def test_import_within_budget(probe):
+    assert probe["import_ms"] <= STARTUP_BUDGET_MS
+
+def test_health_does_not_create_heavy_services(probe):
+    assert probe["health_status"] == 200
+    assert probe["modules"] == []
+    assert probe["services"] == []
@@ -0,0 +1,93 @@
+﻿"""Structured output: local repair of truncated JSON and re-requests of only
+the fields or items that are missing."""
+import json
+from typing import List
+import httpx
+import openai
+import pytest
+from pydantic import BaseModel
+from app.utils.structured_output import StructuredOutput, StructuredOutputError, parse_json
+
+class Scores(BaseModel):
+    clarity: int
+    accuracy: int
+    notes: List[str] = []
+
+class Item(BaseModel):
+    question: str
+
+def test_parse_json_closes_a_truncated_reply():
+    value, repaired = parse_json('```json\n{"clarity": 80, "notes": ["clear", "conc')
+    assert repaired
+    assert value == {"clarity": 80, "notes": ["clear", "conc"]}
+
+def test_parse_json_drops_an_incomplete_trailing_value():
+    value, repaired = parse_json('Here you go: {"clarity": 80, "accuracy": 7')
+    assert repaired
+    assert value["clarity"] == 80
+
+def test_parse_json_removes_trailing_commas():
+    assert parse_json('{"notes": ["a", "b",],}') == ({"notes": ["a", "b"]}, True)
+
+def test_parse_json_rejects_prose():
+    with pytest.raises(StructuredOutputError):
+        parse_json("I cannot answer that")
+
+def test_truncated_reply_rerequests_only_the_missing_field(fake_llm):
+    replies = iter(['{"clarity": 80, "notes": ["clear"], "accur', '{"accuracy": 70}'])
+    fake_llm.reply = lambda prompt, **kwargs: next(replies)
+    output = StructuredOutput(repair_requests=2)
+
+    scores = output.generate_object("scores", Scores, prompt="Score this answer")
+    assert scores == Scores(clarity=80, accuracy=70, notes=["clear"])
+    assert len(fake_llm.calls) == 2
+    follow_up = fake_llm.calls[1]
+    assert follow_up.endswith("Return a JSON object with ONLY these fields: accuracy")
+    assert '"clarity":80' in follow_up
+    assert output.stats()["scores"]["rerequested"] == 1
+
+def test_required_fields_are_rerequested_even_with_defaults(fake_llm):
+    replies = iter(['{"clarity": 80, "accuracy": 70}', '{"notes": []}'])
+    fake_llm.reply = lambda prompt, **kwargs: next(replies)
+    output = StructuredOutput(repair_requests=1)
+
+    scores = output.generate_object("scores", Scores, prompt="Score this answer", required=("notes",))
+    assert "notes" in scores.model_fields_set
+    assert fake_llm.calls[1].endswith("ONLY these fields: notes")
+
+def test_invalid_output_fails_after_the_repair_budget(fake_llm):
+    fake_llm.reply = lambda prompt, **kwargs: '{"clarity": "high"}'
+    output = StructuredOutput(repair_requests=1)
+
+    with pytest.raises(StructuredOutputError):
+        output.generate_object("scores", Scores, prompt="Score this answer")
+    assert len(fake_llm.calls) == 2
+    assert output.stats()["scores"]["failed"] == 1
+
+def test_provider_rejected_json_is_repaired_from_the_error(fake_llm):
+    def reply(prompt, **kwargs):
+        raise openai.BadRequestError(
+            "json_validate_failed",
+            response=httpx.Response(400, request=httpx.Request("POST", "http://llm.test")),
+            body={"code": "json_validate_failed", "failed_generation": '{"clarity": 80, "accuracy": 70,'}
+        )
+
+    fake_llm.reply = reply
+    output = StructuredOutput(repair_requests=0)
+    assert output.generate_object("scores", Scores, prompt="Score this answer") == Scores(clarity=80, accuracy=70)
+    assert output.stats()["scores"]["repaired"] == 1
+
+def test_list_rerequests_the_missing_items(fake_llm):
+    replies = iter([
+        json.dumps({"questions": [{"question": "Q1"}, {"text": "no question"}]}),
+        json.dumps({"questions": [{"question": "Q2"}]})
+    ])
+    fake_llm.reply = lambda prompt, **kwargs: next(replies)
+    output = StructuredOutput(repair_requests=1)
+
+    items = output.generate_list("questions", Item, prompt="Generate questions", count=2, items_key="questions")
+    assert [item.question for item in items] == ["Q1", "Q2"]
+    assert "with 1 more, different items" in fake_llm.calls[1]
+    stats = output.stats()["questions"]
+    assert stats["rerequested"] == 1
+    assert stats["invalid_items"] == 1
@@ -0,0 +1,112 @@
+﻿"""Vector write-behind: coalescing, retries with back-off, dropping and flush()."""
+import threading
+import time
+import pytest
+from app.models import vector_writer as vector_writer_module
+from app.models.vector_writer import VectorQueueFull, VectorWriteBehind
+
+class FakeVectorDB:
+    """Records upserts; a candidate in failures fails that many upsert calls"""
+
+    def __init__(self, failures=None, gate=None):
+        self.failures = dict(failures or {})
+        self.gate = gate
+        self.calls = []
+        self.profiles = {}
+
+    def upsert_profiles(self, ids, embeddings, metadatas):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.calls.append(list(ids))
+        for cid in ids:
+            if self.failures.get(cid):
+                self.failures[cid] -= 1
+                raise RuntimeError(f"cannot write {cid}")
+        for cid, embedding, metadata in zip(ids, embeddings, metadatas):
+            self.profiles[cid] = (embedding, metadata)
+
+    def get_profile(self, candidate_id):
+        embedding, metadata = self.profiles[candidate_id]
+        return {"ids": [candidate_id], "embeddings": [embedding], "metadatas": [metadata]}
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    def install(**kwargs):
+        db = FakeVectorDB(**kwargs)
+        monkeypatch.setattr(vector_writer_module, "vector_db", db)
+        return db
+    return install
+
+def make_writer(**overrides) -> VectorWriteBehind:
+    options = dict(batch_size=10, flush_interval=0.02, queue_size=100,
+                   enqueue_timeout=0.1, max_attempts=3, retry_backoff=0.05)
+    options.update(overrides)
+    return VectorWriteBehind(**options)
+
+def test_queued_writes_are_coalesced_and_readable(fake_db):
+    db = fake_db()
+    writer = make_writer()
+    writer.add_profile("a", [0.1], {"v": 1})
+    writer.add_profile("b", [0.2], {"v": 1})
+    writer.update_profile("a", [0.3], {"v": 2})
+    assert writer.get_profile("a")["metadatas"] == [{"v": 2}]
+
+    writer.flush()
+    assert db.profiles == {"a": ([0.3], {"v": 2}), "b": ([0.2], {"v": 1})}
+    stats = writer.stats()
+    assert stats["pending"] == 0
+    assert stats["written"] == 2
+    assert stats["coalesced"] == 1
+    writer.close()
+
+def test_failed_candidate_is_retried_after_backoff(fake_db):
+    # The batch and the one-by-one attempt fail; the retry after the back-off succeeds
+    db = fake_db(failures={"bad": 2})
+    writer = make_writer(retry_backoff=0.1)
+    writer.add_profile("good", [0.1], {})
+    writer.add_profile("bad", [0.2], {})
+
+    started = time.monotonic()
+    writer.flush()
+    assert time.monotonic() - started >= 0.1
+    assert set(db.profiles) == {"good", "bad"}
+    assert db.calls[-1] == ["bad"]
+    stats = writer.stats()
+    assert stats["written"] == 2
+    assert stats["retried"] == 1
+    assert stats["failed"] == 0
+    assert stats["retrying"] == 0
+    writer.close()
+
+def test_candidate_is_dropped_after_max_attempts(fake_db):
+    db = fake_db(failures={"bad": 100})
+    writer = make_writer(max_attempts=2, retry_backoff=0.01)
+    writer.add_profile("good", [0.1], {})
+    writer.add_profile("bad", [0.2], {})
+
+    writer.flush()
+    assert set(db.profiles) == {"good"}
+    stats = writer.stats()
+    assert stats["failed"] == 1
+    assert stats["retried"] == 1
+    assert stats["pending"] == 0
+    assert stats["retrying"] == 0
+    writer.close()
+
+def test_full_queue_rejects_new_writes(fake_db):
+    gate = threading.Event()
+    db = fake_db(gate=gate)
+    writer = make_writer(batch_size=1, queue_size=1, enqueue_timeout=0.05)
+    writer.add_profile("a", [0.1], {})
+    deadline = time.monotonic() + 5
+    while writer.stats()["queue_depth"] and time.monotonic() < deadline:
+        time.sleep(0.01)  # the writer took "a" and is blocked writing it
+    writer.add_profile("b", [0.2], {})
+
+    with pytest.raises(VectorQueueFull):
+        writer.add_profile("c", [0.3], {})
+    assert writer.stats()["rejected"] == 1
+
+    gate.set()
+    writer.close()
+    assert set(db.profiles) == {"a", "b"}